@@ -0,0 +1,298 @@
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+from main import StreamDroppedError, lichessAccount, loadToken
+
+#--------------------------------------------------------------#
+#A columnar archive of one user's finished games, on disk
+#Games are streamed from /api/games/user oldest first and appended
+#a chunk at a time to one raw numpy file per column, so exporting
+#any number of games takes the same memory. meta.json records the
+#complete rows and where the export got to (the newest createdAt),
+#so the next export only fetches the games played since.
+#Moves are SAN (as lichess exports them), stored as uint16 indexes
+#into a vocabulary of every SAN seen. Clocks are in centiseconds.
+#Run with: python archive.py <directory> [user] (exports, then prints win rates)
+#--------------------------------------------------------------#
+
+columns = {"id": "S8","createdAt": "<i8","lastMoveAt": "<i8","variant": "u1","speed": "u1","status": "u1","rated": "?","color": "u1","result": "i1", #* one value per game
+    "rating": "<u2","opponentRating": "<u2","ratingDiff": "<i2","initial": "<u4","increment": "<u2","days": "u1","plies": "<u2","opponent": "S20","clockPlies": "<u2"}
+streams = {"moves": "<u2","clocks": "<u4"} #* every game's moves and clocks, one after another (plies and clockPlies long)
+dictionaries = {"variant": "u1","speed": "u1","status": "u1","san": "<u2"} #* columns stored as codes into a vocabulary
+colors = ["white","black"]
+unplayed = ("created","started","aborted","noStart","unknownFinish") #* statuses of games that were never played out, so have no result
+
+class gameArchive:
+    def __init__(self, directory: str, *, chunkRows: int=4096) -> None:
+        """Opens (or creates) an archive, cutting off anything a crash left after the last complete chunk
+
+        Args:
+            directory (str): The directory (created if missing)
+            chunkRows (int, optional): How many games are buffered before they are written. Defaults to 4096.
+
+        Raises:
+            ValueError: Raises if the directory holds something else's meta.json
+        """
+        self.directory = directory
+        self.chunkRows = chunkRows
+        os.makedirs(directory,exist_ok=True)
+        meta = {}
+        if os.path.exists(self._path("meta.json")):
+            with open(self._path("meta.json"),"r") as file:
+                meta = json.load(file)
+            if meta.get("version") != 1:
+                raise ValueError(f"{directory} is not a game archive")
+        self.user = meta.get("user")
+        self.rows = meta.get("rows",0)
+        self.totals = {name: meta.get("totals",{}).get(name,0) for name in streams} #* how many moves and clocks are stored
+        self.since = meta.get("since") #* the createdAt of the newest game
+        self.lastIds = set(meta.get("lastIds",[])) #* the games created at since, which the next export gets again
+        self.vocabularies = {name: list(meta.get("vocabularies",{}).get(name,[])) for name in dictionaries}
+        self._codes = {name: {value: code for code, value in enumerate(values)} for name, values in self.vocabularies.items()}
+        self._files = {}
+        for name, dtype in columns.items() | streams.items():
+            count = self.totals[name] if name in streams else self.rows
+            self._files[name] = open(self._path(f"{name}.bin"),"ab")
+            self._files[name].truncate(count*np.dtype(dtype).itemsize) #? rows past the last meta.json were never complete
+        self._rows = {name: [] for name in columns} #* buffered games
+        self._streams = {name: [] for name in streams}
+        self._offsets = {}
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory,name)
+    def __len__(self) -> int:
+        return self.rows
+    def _code(self, name: str, value: str) -> int:
+        code = self._codes[name].get(value)
+        if code is None:
+            code = len(self.vocabularies[name])
+            if code > np.iinfo(dictionaries[name]).max:
+                raise ValueError(f"Too many distinct values of {name}")
+            self._codes[name][value] = code
+            self.vocabularies[name].append(value)
+        return code
+    def append(self, game: dict) -> bool:
+        """Buffers a game, as /api/games/user exports it. Games must come oldest first (sort="dateAsc")
+
+        Args:
+            game (dict): The game
+
+        Raises:
+            ValueError: Raises if the archive's user did not play the game
+
+        Returns:
+            bool: False if the game was already archived
+        """
+        if self.since is not None and (game["createdAt"] < self.since or (game["createdAt"] == self.since and game["id"] in self.lastIds)):
+            return False
+        players = game["players"]
+        ids = [players[color].get("user",{}).get("id") for color in colors]
+        if self.user is None or self.user.lower() not in ids:
+            raise ValueError(f"{self.user} did not play {game['id']}")
+        color = ids.index(self.user.lower())
+        us, them = players[colors[color]], players[colors[1-color]]
+        winner = game.get("winner")
+        sans = game.get("moves","").split()
+        clocks = game.get("clocks",[])
+        clock = game.get("clock") or {}
+        opponent = them["user"].get("name","") if "user" in them else (f"AI level {them['aiLevel']}" if "aiLevel" in them else "")
+        opponent = opponent.encode()[:20].decode("utf-8","ignore") #? cut to 20 bytes on a character boundary, so it always decodes
+        row = {"id": game["id"].encode(),"createdAt": game["createdAt"],"lastMoveAt": game.get("lastMoveAt",game["createdAt"]),
+            "variant": self._code("variant",game["variant"]),"speed": self._code("speed",game["speed"]),"status": self._code("status",game["status"]),
+            "rated": game.get("rated",False),"color": color,"result": 0 if winner is None else (1 if winner == colors[color] else -1),
+            "rating": us.get("rating",0),"opponentRating": them.get("rating",0),"ratingDiff": us.get("ratingDiff",0),
+            "initial": clock.get("initial",0),"increment": clock.get("increment",0),"days": game.get("daysPerTurn",0),
+            "plies": len(sans),"opponent": opponent.encode(),"clockPlies": len(clocks)}
+        for name, value in row.items():
+            self._rows[name].append(value)
+        self._streams["moves"].extend([self._code("san",san) for san in sans])
+        self._streams["clocks"].extend(clocks)
+        if game["createdAt"] != self.since:
+            self.since, self.lastIds = game["createdAt"], set()
+        self.lastIds.add(game["id"])
+        if len(self._rows["id"]) >= self.chunkRows:
+            self.flush()
+        return True
+    def flush(self) -> None:
+        """Writes the buffered games, then meta.json (so a crash in between loses the chunk rather than corrupting the archive)
+        """
+        count = len(self._rows["id"])
+        if count:
+            for name, dtype in columns.items():
+                np.array(self._rows[name],dtype=dtype).tofile(self._files[name])
+                self._rows[name].clear()
+            for name, dtype in streams.items():
+                values = np.array(self._streams[name],dtype=dtype)
+                values.tofile(self._files[name])
+                self.totals[name] += len(values)
+                self._streams[name].clear()
+            for file in self._files.values():
+                file.flush()
+            self.rows += count
+            self._offsets.clear()
+        meta = {"version": 1,"user": self.user,"rows": self.rows,"totals": self.totals,"since": self.since,"lastIds": sorted(self.lastIds),"vocabularies": self.vocabularies}
+        with open(self._path("meta.json.tmp"),"w") as file:
+            json.dump(meta,file)
+        os.replace(self._path("meta.json.tmp"),self._path("meta.json")) #* atomic, so meta.json is always whole
+    def export(self, account: lichessAccount, user: str="", *, until: int|None=None, limit: int|None=None, retries: int=3, stop=None) -> int:
+        """Fetches the user's games played since the last export (every game the first time) and archives them
+
+        Args:
+            account (lichessAccount): The account to export with
+            user (str, optional): The username. Defaults to the archive's user, or the account's for a new archive.
+            until (int, optional): Only games created at or before this time, in ms since the epoch. Defaults to now.
+            limit (int, optional): The most games to add. Defaults to all of them.
+            retries (int, optional): How many times in a row to pick the export back up from the last archived game when the connection drops. Defaults to 3.
+            stop (threading.Event, optional): Ends the export once set, even while waiting to pick it back up. Defaults to None.
+
+        Raises:
+            ValueError: Raises if the archive is another user's
+            ConnectionError: Raises if the user is not found
+            StreamDroppedError: Raises if the connection keeps dropping (what was fetched is kept)
+            RateLimitedException: Raises if the account is rate-limited
+            TokenError: Raises if the token is invalid
+
+        Returns:
+            int: How many games were added
+        """
+        user = user or self.user or account.accountinfo["username"]
+        if self.user is not None and self.user.lower() != user.lower():
+            raise ValueError(f"This archive holds {self.user}'s games")
+        previous, self.user = self.user, user
+        added, attempts = 0, 0
+        try:
+            while limit is None or added < limit:
+                games = account.exportGames(user,since=self.since,until=until,sort="dateAsc",clocks=True,stop=stop)
+                try:
+                    for game in games:
+                        if self.append(game):
+                            added += 1
+                            attempts = 0
+                            if limit is not None and added >= limit:
+                                break
+                    break
+                except StreamDroppedError: #? only a dropped stream is picked back up (not i.e. an unknown user)
+                    attempts += 1
+                    if attempts > retries: #! give up
+                        raise
+                    delay = min(0.5*2**(attempts-1),10) #* back off, then resume after the last game appended
+                    if stop is not None and stop.wait(delay):
+                        break
+                    elif stop is None:
+                        time.sleep(delay)
+                finally:
+                    games.close()
+        finally:
+            if not self.rows and not added: #? an export that archived nothing (i.e. a mistyped user) doesn't claim the archive
+                self.user = previous
+            self.flush()
+        return added
+    def column(self, name: str) -> np.ndarray:
+        """Maps a column (or the moves or clocks stream) from disk, read-only. Only games flushed so far are in it
+
+        Args:
+            name (str): The column (see columns and streams)
+
+        Raises:
+            ValueError: Raises if there is no such column
+
+        Returns:
+            np.ndarray: The column. Dictionary columns hold codes (see labels)
+        """
+        if name not in columns and name not in streams:
+            raise ValueError(f"No column {name}")
+        count = self.totals[name] if name in streams else self.rows
+        if count == 0: #? memmap can't map an empty file
+            return np.empty(0,dtype=columns.get(name,streams.get(name)))
+        return np.memmap(self._path(f"{name}.bin"),dtype=columns.get(name,streams.get(name)),mode="r",shape=(count,))
+    def labels(self, name: str) -> np.ndarray:
+        """Decodes a dictionary column (variant, speed or status) into its strings
+        """
+        return np.array(self.vocabularies[name],dtype=object)[self.column(name)]
+    def _span(self, index: int, stream: str, counts: str) -> slice:
+        if counts not in self._offsets: #* where each game starts in the stream, worked out once per flush
+            self._offsets[counts] = np.concatenate(([0],np.cumsum(self.column(counts),dtype=np.int64)))
+        if not -self.rows <= index < self.rows:
+            raise IndexError(f"No game {index}")
+        index %= self.rows
+        return slice(int(self._offsets[counts][index]),int(self._offsets[counts][index+1]))
+    def movesOf(self, index: int) -> list:
+        """Gets a game's moves
+
+        Args:
+            index (int): The game's row
+
+        Raises:
+            IndexError: Raises if there is no such row
+
+        Returns:
+            list: The moves, in SAN
+        """
+        san = self.vocabularies["san"]
+        return [san[code] for code in self.column("moves")[self._span(index,"moves","plies")]]
+    def clocksOf(self, index: int) -> list:
+        """Gets the clock after each of a game's moves, in centiseconds (empty if it was exported without clocks)
+        """
+        return self.column("clocks")[self._span(index,"clocks","clockPlies")].tolist()
+    def winRate(self, by: tuple=("variant","speed"), *, where: np.ndarray|None=None, played: bool=True) -> dict:
+        """Counts wins, draws and losses per group of games, over whole columns at once
+
+        Args:
+            by (tuple, optional): The columns to group by. Defaults to ("variant","speed").
+            where (np.ndarray, optional): A mask of the games to count (i.e. archive.column("rated")). Defaults to every game.
+            played (bool, optional): If only games that were played out are counted. Aborted and noStart games are stored with no winner, so they would count as draws. Defaults to True.
+
+        Returns:
+            dict: {key: {"games", "wins", "draws", "losses", "winRate", "score"}}, most played first, where key is a tuple of each by column's value (decoded for dictionary columns)
+        """
+        results = self.column("result")
+        keys = [self.column(name) for name in by]
+        if played:
+            finished = ~np.isin(self.column("status"),[self._codes["status"][status] for status in unplayed if status in self._codes["status"]])
+            where = finished if where is None else where & finished
+        if where is not None:
+            results, keys = results[where], [key[where] for key in keys]
+        code, uniques = np.zeros(len(results),dtype=np.int64), []
+        for key in keys: #* one number per combination of keys
+            unique, inverse = np.unique(key,return_inverse=True)
+            code = code*len(unique)+inverse
+            uniques.append(unique)
+        groups, inverse = np.unique(code,return_inverse=True)
+        games = np.bincount(inverse,minlength=len(groups))
+        wins = np.bincount(inverse,weights=results == 1,minlength=len(groups)).astype(np.int64)
+        losses = np.bincount(inverse,weights=results == -1,minlength=len(groups)).astype(np.int64)
+        values, rest = [], groups
+        for name, unique in reversed(list(zip(by,uniques))): #* split each group's number back into its keys
+            value = unique[rest % len(unique)]
+            rest = rest // len(unique)
+            values.insert(0,[self.vocabularies[name][item] for item in value] if name in dictionaries else [item.decode() if isinstance(item,bytes) else item.item() for item in value])
+        report = {}
+        for group in np.argsort(-games,kind="stable"):
+            draws = int(games[group]-wins[group]-losses[group])
+            report[tuple([value[group] for value in values])] = {"games": int(games[group]),"wins": int(wins[group]),"draws": draws,"losses": int(losses[group]),
+                "winRate": float(wins[group]/games[group]),"score": float((wins[group]+draws/2)/games[group])}
+        return report
+    def close(self) -> None:
+        self.flush()
+        for file in self._files.values():
+            file.close()
+    def __enter__(self) -> "gameArchive":
+        return self
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python archive.py <directory> [user]")
+        sys.exit(1)
+    account = lichessAccount(loadToken())
+    try:
+        with gameArchive(sys.argv[1]) as games:
+            print(f"Added {games.export(account,sys.argv[2] if len(sys.argv) > 2 else '')} games ({len(games)} archived)")
+            for (variant, speed), stats in games.winRate().items():
+                print(f"{variant:>14} {speed:>14} {stats['games']:>7} games  {stats['winRate']:.1%} won  {stats['score']:.1%} score")
+    finally:
+        account.close()
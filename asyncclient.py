@@ -0,0 +1,410 @@
+import asyncio
+import json
+import ssl
+from typing import Literal
+from urllib.parse import quote, urlencode, urlsplit
+
+from main import RateLimitedException, StreamDroppedError, TokenError, declineReasons, formFields, gameSetup, requestScheduler
+
+#--------------------------------------------------------------#
+#asyncio counterpart of lichessAccount
+#Every open stream and request shares one event loop, so hundreds of
+#games can run in one process without a thread per game.
+#Only the standard library is used (HTTP/1.1 over asyncio streams).
+#--------------------------------------------------------------#
+
+class asyncResponse:
+    def __init__(self, status_code: int, headers: dict, content: bytes) -> None:
+        """A finished HTTP response
+
+        Args:
+            status_code (int): The status code
+            headers (dict): The headers, with lowercase names
+            content (bytes): The body
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8","replace")
+    def json(self):
+        return json.loads(self.content)
+
+class _staleConnection(ConnectionError): #? the server closed the connection before any of its answer arrived
+    pass
+
+_transportErrors = (ConnectionError,asyncio.IncompleteReadError,asyncio.TimeoutError) #! only ever caught around socket work: _raiseFor raises a ConnectionError for a 404, which is an answer and must not be retried
+
+def _encodeParams(params: dict|None) -> str:
+    """Encodes query parameters the way the lichess api expects them (booleans as true/false)
+    """
+    if not params:
+        return ""
+    return urlencode(formFields(params))
+
+def _raiseFor(response: asyncResponse, error: type=ValueError) -> None:
+    """Raises the exception matching a failed response
+
+    Args:
+        response (asyncResponse): The response to check
+        error (type, optional): The exception to raise for any other error. Defaults to ValueError.
+
+    Raises:
+        RateLimitedException: Raises if the account is rate-limited
+        ConnectionError: Raises if the resource is not found
+        TokenError: Raises if the token is invalid
+    """
+    if response.status_code == 200:
+        return
+    elif response.status_code == 429: #! if rate limited
+        raise RateLimitedException("You are being rate limited.")
+    elif response.status_code == 404: #! if not found
+        raise ConnectionError("Not found")
+    elif response.status_code == 401: #! if token is invalid
+        raise TokenError("Invalid token")
+    try:
+        message = response.json()["error"]
+    except (ValueError,KeyError,TypeError):
+        message = response.text
+    raise error(message)
+
+class asyncLichessAccount:
+    def __init__(self, token: str, endpoint: str="https://lichess.org", *, poolSize: int=10, timeout: float=30, retries: int=3, scheduler: requestScheduler|None=None) -> None:
+        """A bot account whose api calls are coroutines. Call (and await) connect() before anything else, or use "async with"
+
+        Args:
+            token (str): The token of the bot account
+            endpoint (str, optional): The endpoint of the lichess api. Defaults to "https://lichess.org".
+            poolSize (int, optional): How many requests can be in flight at once (streams have their own connections). Defaults to 10.
+            timeout (float, optional): The request timeout in seconds. For streams, the longest wait between two lines. Defaults to 30.
+            retries (int, optional): How many times to retry a request if the connection is reset. Defaults to 3.
+            scheduler (requestScheduler, optional): The token bucket challenges are sent within. Pass a sync lichessAccount's scheduler to share its budget. Defaults to a new requestScheduler.
+
+        Raises:
+            ConnectionError: Raises if the endpoint is invalid
+        """
+        if not endpoint.startswith(("https://","http://localhost","http://127.0.0.1")): #! check if endpoint is valid (plain http is only allowed for local servers)
+            raise ConnectionError("Endpoint must start with https://")
+        self.endpoint = endpoint.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        url = urlsplit(self.endpoint)
+        self._host = url.hostname
+        self._port = url.port or (443 if url.scheme == "https" else 80)
+        self._ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self._slots = asyncio.Semaphore(poolSize) #* limits requests in flight
+        self._idle = [] #* idle keep-alive connections
+        self.scheduler = scheduler if scheduler is not None else requestScheduler(workers=1)
+        self._ownScheduler = scheduler is None
+        self.accountinfo = None
+    async def __aenter__(self) -> "asyncLichessAccount":
+        await self.connect()
+        return self
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+    async def connect(self) -> None:
+        """Checks the token and upgrades the account to a bot account
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            TokenError: Raises if the token is invalid or is not a bot token
+        """
+        #* the upgrade does not depend on the account info, so both are sent at once
+        response, upgrade = await asyncio.gather(self._request("GET","/api/account"),self._request("POST","/api/bot/account/upgrade"))
+        if response.status_code == 429:
+            raise RateLimitedException("You are being rate limited.")
+        elif response.status_code != 200:
+            raise TokenError("Invalid token")
+        self.accountinfo = response.json()
+        if not self.accountinfo.get("title") == "BOT" and upgrade.status_code != 200: #? upgrading a bot account again may fail
+            raise TokenError("This token is not a bot token.")
+    async def close(self) -> None:
+        """Closes every idle pooled connection
+        """
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+        if self._ownScheduler:
+            await asyncio.to_thread(self.scheduler.close)
+
+    #* HTTP/1.1 transport
+    async def _open(self) -> tuple:
+        return await asyncio.wait_for(asyncio.open_connection(self._host,self._port,ssl=self._ssl),self.timeout)
+    async def _send(self, writer: asyncio.StreamWriter, method: str, path: str, params: dict|None, data: dict|None) -> None:
+        target = path + (f"?{_encodeParams(params)}" if params else "")
+        body = _encodeParams(data).encode() if data else b""
+        head = f"{method} {target} HTTP/1.1\r\nHost: {self._host}\r\nAuthorization: Bearer {self.token}\r\nAccept: application/json, application/x-ndjson\r\nConnection: keep-alive\r\nContent-Length: {len(body)}\r\n"
+        if data:
+            head += "Content-Type: application/x-www-form-urlencoded\r\n"
+        writer.write(head.encode()+b"\r\n"+body)
+        await writer.drain()
+    async def _readHead(self, reader: asyncio.StreamReader) -> tuple:
+        statusline = await reader.readline()
+        if not statusline:
+            raise _staleConnection("Connection closed by the server before answering")
+        status = int(statusline.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n",b"\n",b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+    async def _readBody(self, reader: asyncio.StreamReader, headers: dict):
+        """Yields the body as it arrives, decoding chunked transfer encoding
+        """
+        if headers.get("transfer-encoding","").lower() == "chunked":
+            while True:
+                line = await reader.readline()
+                if not line: #! closed between chunks
+                    raise asyncio.IncompleteReadError(b"",None)
+                size = int(line.split(b";")[0],16)
+                if size == 0:
+                    while (await reader.readline()) not in (b"\r\n",b"\n",b""): #? skip trailers
+                        pass
+                    return
+                chunk = await reader.readexactly(size+2)
+                yield chunk[:-2]
+        elif "content-length" in headers:
+            remaining = int(headers["content-length"])
+            while remaining > 0:
+                chunk = await reader.read(min(remaining,65536))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b"",remaining)
+                remaining -= len(chunk)
+                yield chunk
+        else: #? read until the server closes the connection
+            while chunk := await reader.read(65536):
+                yield chunk
+    async def _exchange(self, connection: tuple, method: str, path: str, params: dict|None, data: dict|None) -> tuple:
+        reader, writer = connection
+        try:
+            await self._send(writer,method,path,params,data)
+        except OSError as error: #? the server closed the connection before reading the request
+            raise _staleConnection(f"Connection closed by the server: {error!r}")
+        status, headers = await self._readHead(reader)
+        content = b"".join([chunk async for chunk in self._readBody(reader,headers)])
+        reusable = headers.get("connection","").lower() != "close" and ("content-length" in headers or "transfer-encoding" in headers)
+        return asyncResponse(status,headers,content), reusable
+    async def _request(self, method: str, path: str, *, params: dict|None=None, data: dict|None=None) -> asyncResponse:
+        """Sends a request over a pooled keep-alive connection
+
+        Args:
+            method (str): The HTTP method (i.e. "GET")
+            path (str): The path of the API call (i.e. "/api/account")
+            params (dict, optional): The query parameters. Defaults to None.
+            data (dict, optional): The form body. Defaults to None.
+
+        Raises:
+            ConnectionError: Raises if the connection keeps failing
+
+        Returns:
+            asyncResponse: The response
+        """
+        async with self._slots:
+            for attempt in range(self.retries+1):
+                reused = bool(self._idle)
+                connection = self._idle.pop() if reused else await self._open()
+                try:
+                    response, reusable = await asyncio.wait_for(self._exchange(connection,method,path,params,data),self.timeout)
+                except _transportErrors as error: #? _exchange returns every answer, whatever its status
+                    connection[1].close()
+                    #? anything else may have reached the server, so it is only resent if a reused connection was closed (i.e. while idle) before any of the answer arrived. A move is never sent twice
+                    if attempt >= self.retries or (method != "GET" and not (reused and isinstance(error,_staleConnection))):
+                        raise ConnectionError(f"{method} {path} failed: {error!r}")
+                    continue
+                if reusable:
+                    self._idle.append(connection)
+                else:
+                    connection[1].close()
+                return response
+    async def _streamNDJSON(self, path: str, *, params: dict|None=None, reconnect: bool=True, maxReconnects: int=5, maxLineBytes: int=1048576):
+        """Reads a newline-delimited json stream on its own connection, yielding each object as soon as its line arrives
+
+        Args:
+            path (str): The path of the API call (i.e. "/api/stream/event")
+            params (dict, optional): The query parameters. Defaults to None.
+            reconnect (bool, optional): If the stream should be reopened when the connection drops. Defaults to True.
+            maxReconnects (int, optional): How many times in a row to try reconnecting. Defaults to 5.
+            maxLineBytes (int, optional): The longest line that will be buffered. Defaults to 1048576 (1 MiB).
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ConnectionError: Raises if the stream is not found or keeps dropping
+            ValueError: Raises if a line is longer than maxLineBytes
+            TokenError: Raises if the token is invalid
+
+        Yields:
+            dict: Each object in the stream. Keep-alive (empty) lines are skipped.
+        """
+        attempts = 0
+        while True:
+            writer = None
+            try:
+                reader, writer = await self._open()
+                await self._send(writer,"GET",path,params,None)
+                status, headers = await asyncio.wait_for(self._readHead(reader),self.timeout)
+                if status != 200:
+                    failed = asyncResponse(status,headers,b"".join([chunk async for chunk in self._readBody(reader,headers)]))
+                    break #! raised below, outside the reconnect loop, so a 404 or 401 fails at once
+                attempts = 0
+                buffer = b""
+                body = self._readBody(reader,headers)
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(anext(body),self.timeout)
+                    except StopAsyncIteration:
+                        break
+                    buffer += chunk
+                    *lines, buffer = buffer.split(b"\n")
+                    if len(buffer) > maxLineBytes: #! never buffer an unbounded line
+                        raise ValueError(f"Stream line is longer than {maxLineBytes} bytes")
+                    for line in lines:
+                        if line.strip(): #? skip keep-alive newlines
+                            yield json.loads(line)
+                if buffer.strip():
+                    yield json.loads(buffer)
+                return #* the server closed the stream
+            except _transportErrors as error:
+                attempts += 1
+                if not reconnect or attempts > maxReconnects: #! give up
+                    raise StreamDroppedError(f"Stream {path} dropped: {error!r}")
+                await asyncio.sleep(min(0.5*2**(attempts-1),10)) #* back off before reconnecting
+            finally:
+                if writer is not None:
+                    writer.close()
+        _raiseFor(failed)
+
+    #* Streams
+    async def streamEvents(self, *, reconnect: bool=True):
+        """Streams incoming events (challenge, gameStart, gameFinish, ...). See https://lichess.org/api#tag/Bot/operation/apiStreamEvent for more info
+
+        Yields:
+            dict: Each event, as soon as it arrives
+        """
+        async for event in self._streamNDJSON("/api/stream/event",reconnect=reconnect):
+            yield event
+    async def streamGame(self, gameid: str, *, reconnect: bool=True, maxLineBytes: int=1048576):
+        """Streams a game the bot is playing. See https://lichess.org/api#tag/Bot/operation/botGameStream for more info
+
+        Args:
+            gameid (str): The ID of the game to stream
+            reconnect (bool, optional): If the stream should be reopened when the connection drops. A reopened stream starts again with gameFull. Defaults to True.
+            maxLineBytes (int, optional): The longest line that will be buffered. Defaults to 1048576 (1 MiB).
+
+        Yields:
+            dict: Each gameFull, gameState, chatLine or opponentGone event, as soon as it arrives
+        """
+        async for event in self._streamNDJSON(f"/api/bot/game/stream/{gameid}",reconnect=reconnect,maxLineBytes=maxLineBytes):
+            yield event
+            state = event["state"] if event.get("type") == "gameFull" else event
+            if state.get("type") == "gameState" and state.get("status") not in (None,"created","started"):
+                return #* the game is over
+
+    #* Account
+    async def getAccountInfo(self) -> dict:
+        response = await self._request("GET","/api/account")
+        _raiseFor(response)
+        self.accountinfo = response.json()
+        return self.accountinfo
+    async def getEmail(self) -> str:
+        response = await self._request("GET","/api/account/email")
+        _raiseFor(response)
+        return response.json()["email"]
+
+    #* Games
+    async def makeMoveInGame(self, gameid: str, move: str, offerDraw: bool=False) -> None:
+        """Makes a move in a game
+
+        Args:
+            gameid (str): The game to make the move in
+            move (str): The move in UCI format (i.e. e2e4)
+            offerDraw (bool, optional): Whether to offer (or agree to) a draw. Defaults to False.
+        """
+        _raiseFor(await self._request("POST",f"/api/bot/game/{gameid}/move/{move}",params={"offeringDraw": offerDraw}))
+    async def abortGame(self, gameid: str) -> None:
+        _raiseFor(await self._request("POST",f"/api/bot/game/{gameid}/abort"))
+    async def resignGame(self, gameid: str) -> None:
+        _raiseFor(await self._request("POST",f"/api/bot/game/{gameid}/resign"))
+    async def getGameChat(self, gameid: str) -> list:
+        response = await self._request("GET",f"/api/bot/game/{gameid}/chat")
+        _raiseFor(response)
+        return response.json()
+    async def writeInChat(self, gameid: str, text: str, room: Literal["player","spectator"]="player") -> None:
+        _raiseFor(await self._request("POST",f"/api/bot/game/{gameid}/chat",data={"room": room,"text": text}))
+
+    #* Challenges
+    async def getChallenges(self) -> tuple:
+        response = await self._request("GET","/api/challenge")
+        _raiseFor(response)
+        challenges = response.json()
+        return tuple([challenges["in"],challenges["out"]])
+    async def _challenge(self, path: str, params: dict) -> dict:
+        """Sends a challenge once the scheduler's token bucket allows it (lichess rate-limits challenges hardest)
+        """
+        await asyncio.wrap_future(self.scheduler.permit("low"))
+        response = await self._request("POST",path,data=params)
+        if response.status_code == 429: #! everything sent through the scheduler waits
+            try:
+                self.scheduler.coolDown(float(response.headers["retry-after"]))
+            except (KeyError,ValueError):
+                self.scheduler.coolDown()
+        _raiseFor(response,ConnectionError)
+        return response.json()
+    async def challengeUser(self, user: str, *, rated: bool=False, persistant: bool=True, acceptToken: str="", message: str="", rules: gameSetup=gameSetup()) -> dict:
+        params = rules.getParams() | {"rated": rated,"keepAliveStream": persistant}
+        if acceptToken != "":
+            params["acceptByToken"] = acceptToken
+            params["message"] = message if message != "" else "Your game with {opponent} is ready: {game}."
+        return await self._challenge(f"/api/challenge/{quote(user)}",params)
+    async def acceptChallenge(self, challengeid: str) -> None:
+        _raiseFor(await self._request("POST",f"/api/challenge/{challengeid}/accept"),ConnectionError)
+    async def declineChallenge(self, challengeid: str, reason: str="declineGeneric") -> None:
+        if reason not in declineReasons: #! check if reason is valid
+            raise ValueError("Invalid reason")
+        _raiseFor(await self._request("POST",f"/api/challenge/{challengeid}/decline",data={"reason": reason}),ConnectionError)
+    async def cancelChallenge(self, challengeid: str, opponentToken: str="") -> None:
+        _raiseFor(await self._request("POST",f"/api/challenge/{challengeid}/cancel",params=({"opponentToken": opponentToken} if opponentToken != "" else None)),ConnectionError)
+    async def challengeAI(self, AIlevel: int=8, rules: gameSetup=gameSetup()) -> dict:
+        if not AIlevel in range(1,9):
+            raise ValueError("Invalid AI level")
+        params = rules.getParams() | {"level": AIlevel}
+        params.pop("rules",None)
+        return await self._challenge("/api/challenge/ai",params)
+    async def openEndedChallenge(self, rated: bool=False, rules: gameSetup=gameSetup(), users: list=[], name: str="") -> dict:
+        params = rules.getParams() | {"rated": rated}
+        params.pop("color",None)
+        if name != "":
+            params["name"] = name
+        if users != []:
+            params["users"] = ",".join(users)
+        return await self._challenge("/api/challenge/open",params)
+    async def challengeMany(self, targets: list, rules: gameSetup|list=gameSetup(), *, rated: bool=False):
+        """Sends many challenges at once (i.e. for a gauntlet), within the scheduler's rate budget. One failed challenge never stops the others
+
+        Args:
+            targets (list): Who to challenge: a username for challengeUser, an AI level (1 to 8) for challengeAI, or None for openEndedChallenge
+            rules (gameSetup | list, optional): The rules to challenge every target with, or a list of them to send one challenge per target and rules. Defaults to gameSetup().
+            rated (bool, optional): Whether the games should be rated (ignored for AI challenges). Defaults to False.
+
+        Yields:
+            dict: A progress report as each challenge is answered: "target", "rules", "done" and "total", and either "result" or "error"
+        """
+        async def send(target, setup: gameSetup) -> dict:
+            report = {"target": target,"rules": setup}
+            try:
+                if target is None:
+                    report["result"] = await self.openEndedChallenge(rated=rated,rules=setup)
+                elif isinstance(target,int):
+                    report["result"] = await self.challengeAI(target,rules=setup)
+                else:
+                    report["result"] = await self.challengeUser(target,rated=rated,persistant=False,rules=setup) #? a kept-alive challenge would hold its request open until it is answered
+            except Exception as error:
+                report["error"] = error
+            return report
+        tasks = [send(target,setup) for target in targets for setup in (rules if isinstance(rules,list) else [rules])]
+        for done, task in enumerate(asyncio.as_completed(tasks),1):
+            yield (await task) | {"done": done,"total": len(tasks)}
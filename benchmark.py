@@ -0,0 +1,591 @@
+import asyncio
+import random
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import requests
+
+import archive
+import book
+import engine
+import fakeserver
+import fleet
+import gamelog
+import metrics
+import parallel
+import timemanager
+from asyncclient import asyncLichessAccount
+from main import boardState, botRuntime, challengeRules, gameHandler, gameSetup, lichessAccount, requestScheduler
+
+#--------------------------------------------------------------#
+#End-to-end benchmarks against a local fake lichess (see fakeserver.py, no lichess.org calls)
+#Run with: python benchmark.py
+#--------------------------------------------------------------#
+
+def percentile(latencies: list, p: float) -> float:
+    """Gets a percentile of a list of latencies (nearest rank)
+    """
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered)-1,int(len(ordered)*p/100))]
+
+def timeCalls(function, calls: int) -> list:
+    """Times a function
+
+    Args:
+        function (callable): The function to call
+        calls (int): How many times to call it
+
+    Returns:
+        list: The latency of each call, in milliseconds
+    """
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter()-start)*1000)
+    return latencies
+
+def report(name: str, latencies: list) -> None:
+    print(f"{name:<28} mean {statistics.mean(latencies):7.3f} ms   p50 {percentile(latencies,50):7.3f} ms   p99 {percentile(latencies,99):7.3f} ms   max {max(latencies):7.3f} ms")
+
+def unthrottled(workers: int=4) -> requestScheduler:
+    return requestScheduler(rate=1e6,burst=1000,workers=workers) #? no rate limit against the fake server
+
+def randomMove(board: engine.position) -> str:
+    return board.toUci(random.choice(board.legalMoves()))
+
+class randomHandler(gameHandler): #* plays random legal moves, timing each move from the opponent's move arriving to ours being acknowledged
+    latencies = []
+    def onGameState(self, state: dict) -> None:
+        if state.get("status") in ("created","started") and self.isMyTurn(state):
+            start = time.perf_counter()
+            move = randomMove(self.board.position)
+            self.account.makeMoveInGame(self.gameid,move)
+            self.latencies.append((time.perf_counter()-start)*1000)
+            self.moved(move)
+
+def benchColdStart(runs: int=10, latency: float=0.05) -> None:
+    """Times importing main in a fresh interpreter (with no accounts.json, so it must not prompt) and constructing an account over a slow link
+    """
+    def interpreter(code: str) -> list:
+        latencies = []
+        with tempfile.TemporaryDirectory() as empty: #? no accounts.json, and stdin is closed, so a prompt would fail
+            environment = {name: value for name, value in os.environ.items() if name != "LICHESS_TOKEN"} | {"PYTHONPATH": os.path.dirname(os.path.abspath(__file__))}
+            for _ in range(runs):
+                start = time.perf_counter()
+                subprocess.run([sys.executable,"-c",code],cwd=empty,env=environment,stdin=subprocess.DEVNULL,check=True)
+                latencies.append((time.perf_counter()-start)*1000)
+        return latencies
+    report("interpreter startup",interpreter("pass"))
+    report("import main",interpreter("import main"))
+    with fakeserver.spawn(latency=latency) as endpoint:
+        headers = {"Authorization": "Bearer bench"}
+        def serial() -> None: #* what the constructor used to do
+            requests.get(f"{endpoint}/api/account",headers=headers)
+            requests.post(f"{endpoint}/api/bot/account/upgrade",headers=headers)
+        def lazyFirstCall() -> None:
+            with lichessAccount("bench",endpoint,lazy=True) as account:
+                account.getAccountInfo()
+        report(f"serial check+upgrade ({latency*1000:.0f} ms link)",timeCalls(serial,runs))
+        report("lichessAccount()",timeCalls(lambda: lichessAccount("bench",endpoint).close(),runs))
+        report("lichessAccount(lazy=True)",timeCalls(lambda: lichessAccount("bench",endpoint,lazy=True).close(),runs))
+        report("lazy, up to first call",timeCalls(lazyFirstCall,runs))
+
+def benchPooling(calls: int=500) -> None:
+    """Compares a fresh connection per call with the account's pooled session
+    """
+    with fakeserver.spawn() as endpoint:
+        account = lichessAccount("bench",endpoint,scheduler=unthrottled())
+        headers = {"Authorization": "Bearer bench"}
+        report("unpooled (requests.get)",timeCalls(lambda: requests.get(f"{endpoint}/api/account",headers=headers),calls))
+        report("pooled (updateAccountInfo)",timeCalls(account.updateAccountInfo,calls)) #? getAccountInfo would be served from the cache
+        account.close()
+
+def benchEndpoints(calls: int=100, games: int=10) -> None:
+    """Reports p50/p99 latency of every endpoint through lichessAccount
+    """
+    def emailUncached() -> str:
+        account.cache.invalidate("email")
+        return account.getEmail()
+    def gameWith(action) -> callable: #* times an action on a fresh game, not the game's creation
+        def timed() -> None:
+            gameid = fakeserver.remoteGame(endpoint,color="white",limit=180)
+            start = time.perf_counter()
+            action(gameid)
+            latencies.append((time.perf_counter()-start)*1000)
+        return timed
+    def challengeWith(action) -> callable:
+        def timed() -> None:
+            challengeid = fakeserver.remoteChallenge(endpoint,limit=180)
+            start = time.perf_counter()
+            action(challengeid)
+            latencies.append((time.perf_counter()-start)*1000)
+        return timed
+    def firstEvent(stream) -> callable: #* times opening a stream until its first event arrives
+        def timed() -> None:
+            events = stream()
+            next(events)
+            events.close()
+        return timed
+    rules = gameSetup(correspondence=False,initTime=180)
+    with fakeserver.spawn(maxPlies=40) as endpoint:
+        account = lichessAccount("bench",endpoint,scheduler=unthrottled())
+        gameid = fakeserver.remoteGame(endpoint)
+        for name, function in [
+            ("account",account.updateAccountInfo),
+            ("email",emailUncached),
+            ("challenges",account.getChallenges),
+            ("upgrade",lambda: account._request("POST","/api/bot/account/upgrade")), #? what connect() sends, which lichess answers again for a bot
+            ("challengeUser",lambda: account.challengeUser("opponent",rules=rules)),
+            ("challengeAI",lambda: account.challengeAI(rules=rules)),
+            ("challengeOpen",lambda: account.openEndedChallenge(rules=rules)),
+            ("getChat",lambda: account.getGameChat(gameid)),
+            ("writeChat",lambda: account.writeInChat(gameid,"gg")),
+            ("eventStream (first event)",firstEvent(lambda: account.streamEvents(reconnect=False))), #? the ongoing game is announced on connect
+            ("gameStream (first event)",firstEvent(lambda: account.streamGame(gameid,reconnect=False))),
+        ]:
+            report(name,timeCalls(function,calls))
+        for name, function in [
+            ("accept",challengeWith(account.acceptChallenge)),
+            ("decline",challengeWith(account.declineChallenge)),
+            ("cancel",challengeWith(account.cancelChallenge)),
+            ("abort",gameWith(account.abortGame)),
+            ("resign",gameWith(account.resignGame)),
+        ]:
+            latencies = []
+            for _ in range(calls):
+                function()
+            report(name,latencies)
+        randomHandler.latencies = []
+        stop = threading.Event()
+        for _ in range(games):
+            randomHandler(account,fakeserver.remoteGame(endpoint,color="white",limit=180),stop).play()
+        report("move (opponent move to ack)",randomHandler.latencies)
+        account.close()
+
+async def playGame(account: asyncLichessAccount, gameid: str, latencies: list) -> None:
+    """Plays random legal moves in a game from an event loop, timing each move from the opponent's move arriving to ours being acknowledged
+    """
+    board, color = None, None
+    async for event in account.streamGame(gameid):
+        if event["type"] == "gameFull":
+            color = "white" if event["white"].get("id") == account.accountinfo["id"] else "black"
+            board = boardState(event.get("initialFen","startpos"),event.get("variant",{}).get("key","standard"))
+            state = event["state"]
+        elif event["type"] == "gameState":
+            state = event
+        else:
+            continue
+        start = time.perf_counter()
+        board.update(state) #* only applies the new moves
+        if state["status"] == "started" and (board.position.turn == engine.WHITE) == (color == "white"):
+            await account.makeMoveInGame(gameid,randomMove(board.position))
+            latencies.append((time.perf_counter()-start)*1000)
+
+async def _playGames(endpoint: str, games: int) -> tuple:
+    async with asyncLichessAccount("bench",endpoint,poolSize=max(50,games//4),timeout=60) as account:
+        gameids = [fakeserver.remoteGame(endpoint,color=random.choice(["white","black"]),limit=180) for _ in range(games)]
+        latencies = []
+        start = time.perf_counter()
+        results = await asyncio.gather(*[playGame(account,gameid,latencies) for gameid in gameids],return_exceptions=True)
+        elapsed = time.perf_counter()-start
+    errors = [result for result in results if isinstance(result,BaseException)]
+    return latencies, elapsed, errors
+
+def benchMetrics(calls: int=500, games: int=10) -> None:
+    """Measures the overhead of request metrics, then prints what they recorded over a few games
+    """
+    with fakeserver.spawn(maxPlies=20) as endpoint:
+        with lichessAccount("bench",endpoint,scheduler=unthrottled()) as account:
+            report("without metrics",timeCalls(account.updateAccountInfo,calls))
+        recorder = metrics.requestMetrics()
+        with lichessAccount("bench",endpoint,scheduler=unthrottled(),metrics=recorder) as account:
+            report("with metrics",timeCalls(account.updateAccountInfo,calls))
+            stop = threading.Event()
+            for _ in range(games):
+                randomHandler(account,fakeserver.remoteGame(endpoint,color="white",limit=180),stop).play()
+    for name, endpoint in recorder.snapshot()["endpoints"].items():
+        print(f"{name:<40} {endpoint['latency']['count']:5} calls   p50 <= {endpoint['latency']['p50']*1000:5.1f} ms   p99 <= {endpoint['latency']['p99']*1000:5.1f} ms   {endpoint['bytesIn']:8} bytes in")
+    moves = recorder.moveLatency
+    print(f"opponent move to ack: {moves.count} moves, p50 <= {moves.quantile(0.5)*1000:.1f} ms, p99 <= {moves.quantile(0.99)*1000:.1f} ms")
+    print(f"prometheus snapshot: {len(recorder.toPrometheus().splitlines())} lines")
+
+def benchAsyncGames(games: int=200) -> None:
+    """Plays many streamed games at once from one event loop
+    """
+    with fakeserver.spawn(maxPlies=40) as endpoint:
+        latencies, elapsed, errors = asyncio.run(_playGames(endpoint,games))
+    print(f"{games} concurrent games, {len(latencies)} moves in {elapsed:.2f} s ({len(latencies)/elapsed:.0f} moves/s, {len(errors)} errors)")
+    report("async move (to ack)",latencies)
+
+def benchDroppedMoves() -> None:
+    """Checks a move reaches the server exactly once when its keep-alive connection is closed after the request is read, and when its answer times out
+    """
+    async def move(fake: fakeserver.fakeLichess, timeout: float) -> tuple:
+        async with asyncLichessAccount("bench",fake.endpoint,timeout=timeout) as account: #? connecting leaves pooled connections, so the move goes out on a reused one
+            game = fake.startGame("white",limit=None,days=3)
+            try:
+                await account.makeMoveInGame(game.id,"e2e4")
+            except ConnectionError as error:
+                return game, error
+            return game, None
+    with fakeserver.fakeLichess(dropMoves=1) as fake:
+        game, error = asyncio.run(move(fake,5))
+        assert error is None and game.moves[:1] == ["e2e4"] and fake.requests["move"] == 1, "a dropped move was not resent exactly once"
+    with fakeserver.fakeLichess(stallMoves=1,stall=1) as fake:
+        game, error = asyncio.run(move(fake,0.3))
+        assert error is not None and game.moves[:1] == ["e2e4"] and fake.requests["move"] == 1, "a timed out move was resent"
+    print("dropped moves: resent once after the connection closed unanswered, never after a timeout")
+
+def benchMaxGames(levels: list=[50,100,200,400,800], p99Limit: float=250) -> int:
+    """Finds how many concurrent games one process can play from one event loop while the p99 move latency stays under p99Limit
+
+    Returns:
+        int: The most concurrent games that stayed under the limit without errors
+    """
+    best = 0
+    with fakeserver.spawn(maxPlies=20) as endpoint:
+        for games in levels:
+            latencies, elapsed, errors = asyncio.run(_playGames(endpoint,games))
+            p99 = percentile(latencies,99) if latencies else float("inf")
+            print(f"{games:>5} games: {len(latencies)/elapsed:6.0f} moves/s   p99 {p99:8.2f} ms   {len(errors)} errors")
+            if errors or p99 > p99Limit:
+                break
+            best = games
+    print(f"max concurrent games per process (p99 under {p99Limit:.0f} ms): {best}")
+    return best
+
+def benchRuntime(games: int=100, maxGames: int=32) -> None:
+    """Plays games started by the fake server's event stream through botRuntime
+    """
+    class countingHandler(randomHandler):
+        def play(self) -> None:
+            super().play()
+            with lock:
+                finished.append(self.gameid)
+                if len(finished) == games:
+                    runtime.stop()
+    finished, lock = [], threading.Lock()
+    with fakeserver.spawn(maxPlies=20,keepAlive=0.2) as endpoint: #? short keep-alives so the runtime notices stop() quickly
+        account = lichessAccount("bench",endpoint,poolSize=maxGames+4,scheduler=unthrottled(maxGames+4))
+        runtime = botRuntime(account,countingHandler,maxGames=maxGames)
+        for _ in range(games):
+            fakeserver.remoteGame(endpoint,color=random.choice(["white","black"]),limit=180)
+        start = time.perf_counter()
+        runtime.run()
+        elapsed = time.perf_counter()-start
+        account.close()
+    print(f"botRuntime: {len(finished)} games on {maxGames} workers in {elapsed:.2f} s ({len(finished)/elapsed:.1f} games/s)")
+
+def benchBoardState(games: int=5, plies: int=320, takebacks: int=20) -> None:
+    """Compares replaying every move of each gameState with boardState's incremental updates, on long games
+    """
+    def longGame() -> list:
+        while True: #? random games that end early in mate are thrown away
+            board, moves = engine.position(), []
+            while len(moves) < plies and (legal := board.legalMoves()):
+                move = board.toUci(random.choice(legal))
+                board = board.push(board.parseUci(move))
+                moves.append(move)
+            if len(moves) == plies:
+                return moves
+    def replayed(text: str) -> engine.position: #* what handlers used to do on every event
+        board = engine.position()
+        for uci in text.split():
+            board = board.push(board.parseUci(uci))
+        return board
+    replay, incremental, totals = [], [], {"replay": 0.0,"incremental": 0.0}
+    for _ in range(games):
+        moves = longGame()
+        states = [{"moves": " ".join(moves[:ply])} for ply in range(1,plies+1)]
+        for name, latencies, apply in [("replay",replay,lambda state: replayed(state["moves"])),("incremental",incremental,boardState().update)]:
+            start = time.perf_counter()
+            for state in states:
+                begin = time.perf_counter()
+                apply(state)
+                latencies.append((time.perf_counter()-begin)*1000)
+            totals[name] += time.perf_counter()-start
+    report(f"replay every move ({plies} plies)",replay)
+    report("boardState.update",incremental)
+    print(f"per game: replay {totals['replay']/games*1000:.0f} ms, incremental {totals['incremental']/games*1000:.1f} ms ({totals['replay']/totals['incremental']:.0f}x)")
+    board, moves, latencies = boardState(), longGame(), []
+    board.update({"moves": " ".join(moves)})
+    for _ in range(takebacks): #* a takeback then a different move, which rewinds instead of replaying
+        ply = random.randint(board.ply-10,board.ply-2)
+        position = board._positions[ply]
+        moves = moves[:ply]+[position.toUci(random.choice(position.legalMoves()))]
+        start = time.perf_counter()
+        board.update({"moves": " ".join(moves)})
+        latencies.append((time.perf_counter()-start)*1000)
+        assert board.position.key() == replayed(" ".join(moves)).key()
+    report("takeback",latencies)
+    print(f"boardState: {board.resyncs} resyncs after {takebacks} takebacks")
+
+def benchGameLog(games: int=20, plies: int=300, resumed: int=16) -> None:
+    """Times logging and reading back long games, then crashes a botRuntime mid-game and checks the next one resumes from its logs
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        store = gamelog.gameStore(directory)
+        appends, reads = [], []
+        for index in range(games):
+            board, moves = engine.position(), []
+            with store.open(f"game{index}") as log:
+                log.record({"type": "gameFull","id": f"game{index}","white": {"id": "bench"},"black": {"id": "opponent"},"variant": {"key": "standard"},"initialFen": "startpos","state": {"type": "gameState","moves": "","wtime": 180000,"btime": 180000,"winc": 0,"binc": 0,"status": "started"}})
+                for ply in range(plies):
+                    legal = board.legalMoves()
+                    if not legal:
+                        break
+                    move = board.toUci(random.choice(legal))
+                    board = board.push(board.parseUci(move))
+                    moves.append(move)
+                    state = {"type": "gameState","moves": " ".join(moves),"wtime": 180000-ply*100,"btime": 180000-ply*100,"winc": 0,"binc": 0,"status": "started"} #? lichess resends every move each time
+                    start = time.perf_counter()
+                    log.record(state)
+                    appends.append((time.perf_counter()-start)*1000)
+            start = time.perf_counter()
+            assert store.read(f"game{index}").moves == moves
+            reads.append((time.perf_counter()-start)*1000)
+        size = sum([os.path.getsize(store.path(f"game{index}")) for index in range(games)])
+        report(f"append gameState ({plies} plies)",appends)
+        report("read back a game (mmap)",reads)
+        print(f"game log: {size/games/1024:.1f} KiB per {plies}-ply game")
+    with tempfile.TemporaryDirectory() as directory, fakeserver.spawn(maxPlies=60,keepAlive=0.2,opponentDelay=0.02) as endpoint:
+        store = gamelog.gameStore(directory)
+        def runFor(condition) -> float:
+            account = lichessAccount("bench",endpoint,poolSize=resumed+4,scheduler=unthrottled(resumed+4))
+            runtime = botRuntime(account,randomHandler,maxGames=resumed,store=store)
+            thread = threading.Thread(target=runtime.run)
+            start = time.perf_counter()
+            thread.start()
+            while not condition() and time.perf_counter()-start < 60:
+                time.sleep(0.01)
+            elapsed = time.perf_counter()-start
+            runtime.stop() #! the games are left unfinished, as if the bot had crashed
+            thread.join()
+            account.close()
+            return elapsed
+        for _ in range(resumed):
+            fakeserver.remoteGame(endpoint,color=random.choice(["white","black"]),limit=180)
+        runFor(lambda: len(os.listdir(os.path.join(directory,"finished"))) >= resumed//4)
+        unfinished = store.openGames()
+        plies = sum([store.read(gameid).ply for gameid in unfinished])
+        elapsed = runFor(lambda: not fakeserver.remoteStats(endpoint)["activeGames"] and not store.openGames())
+    print(f"resume: {len(unfinished)} games ({plies} plies) left open by a crash were finished from their logs in {elapsed:.2f} s")
+
+def benchFleet(accounts: int=8, gamesEach: int=5, workers: int|None=None, handler: type=randomHandler) -> None:
+    """Plays games for a fleet of accounts sharded across worker processes, killing one worker halfway to check it is restarted
+    """
+    tokens = [f"bot{index}" for index in range(accounts)]
+    with fakeserver.spawn(tokenUsers=True,maxPlies=20,keepAlive=0.2) as endpoint:
+        supervisor = fleet.fleetSupervisor(tokens,endpoint,workers=workers,handler=handler,maxGames=gamesEach,reportInterval=0.2,restartDelay=0.1)
+        thread = threading.Thread(target=supervisor.run)
+        thread.start()
+        start = time.perf_counter()
+        for token in tokens:
+            for _ in range(gamesEach):
+                fakeserver.remoteGame(endpoint,user=token,color=random.choice(["white","black"]),limit=180)
+        killed = False
+        while (active := fakeserver.remoteStats(endpoint)["activeGames"]) and time.perf_counter()-start < 120: #? the server's count, as games a killed worker finished but never reported are lost to its stats
+            reported = supervisor.stats()["accounts"]
+            if not killed and active <= accounts*gamesEach//2 and reported:
+                os.kill(next(iter(reported.values()))["pid"],signal.SIGKILL) #! simulate a crash
+                killed = True
+            time.sleep(0.05)
+        elapsed = time.perf_counter()-start
+        finished = accounts*gamesEach-active
+        supervisor.stop()
+        thread.join()
+    stats = supervisor.stats()
+    total = stats["total"]
+    print(f"fleet: {total['accounts']} accounts on {len(supervisor.shards)} workers finished {finished} games ({total['played']} reported, {total['moves']} moves, {total['requests']} requests) in {elapsed:.2f} s ({finished/elapsed:.1f} games/s), restarts {stats['restarts']}")
+
+def benchTriage(challenges: int=200, maxGames: int=16) -> None:
+    """Floods the bot with mixed challenges and reports how fast botRuntime's triage answers them
+    """
+    rules = challengeRules(variants=["standard","chess960"],speeds=["bullet","blitz","rapid"],minRating=1000,maxRating=2500)
+    with fakeserver.spawn(maxPlies=20,keepAlive=0.2) as endpoint:
+        account = lichessAccount("bench",endpoint,poolSize=maxGames+8,scheduler=requestScheduler(rate=50,burst=50,workers=maxGames+8)) #? a generous but real rate budget
+        runtime = botRuntime(account,randomHandler,maxGames=maxGames,acceptChallenge=rules)
+        thread = threading.Thread(target=runtime.run)
+        thread.start()
+        start = time.perf_counter()
+        for _ in range(challenges):
+            fakeserver.remoteChallenge(endpoint,variant=random.choice(["standard","standard","chess960","atomic"]),limit=random.choice([15,60,180,600,3600]),rating=random.randint(800,2800))
+        while sum([runtime.triage.counts[name] for name in ("accepted","declined","failed")]) < challenges:
+            time.sleep(0.01)
+        elapsed = time.perf_counter()-start
+        stats = runtime.triage.stats()
+        runtime.stop()
+        thread.join()
+        account.close()
+    print(f"triage: {challenges} challenges answered in {elapsed:.2f} s ({challenges/elapsed:.0f}/s): {stats['accepted']} accepted, {stats['declined']} declined, {stats['failed']} failed")
+    print(f"triage latency: decision p50 {stats['decisionP50']:.2f} ms p99 {stats['decisionP99']:.2f} ms   answer p50 {stats['answerP50']:.2f} ms p99 {stats['answerP99']:.2f} ms")
+
+def benchRateLimited(calls: int=300, rateLimit: float=0.05) -> None:
+    """Checks that injected 429s are retried by the scheduler instead of surfacing, and what they cost
+    """
+    with fakeserver.spawn(rateLimit=rateLimit,retryAfter=0.05,seed=1) as endpoint:
+        account = lichessAccount("bench",endpoint,scheduler=requestScheduler(rate=1e6,burst=1000,cooldown=0.05,maxRetries=10))
+        report(f"account with {rateLimit:.0%} 429s",timeCalls(account.updateAccountInfo,calls))
+        stats = fakeserver.remoteStats(endpoint)
+        account.close()
+    print(f"{sum(stats['rateLimited'].values())} injected 429s over {sum(stats['requests'].values())} requests, none surfaced")
+
+#* perft positions with known node counts (from the chess programming wiki and the chess960 perft suite)
+perftSuite = [
+    ("startpos",False,[20,400,8902,197281]),
+    ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",False,[48,2039,97862]),
+    ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",False,[14,191,2812,43238]),
+    ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",False,[6,264,9467]),
+    ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",False,[44,1486,62379]),
+    ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",False,[46,2079,89890]),
+    ("bqnb1rkr/pp3ppp/3ppn2/2p5/5P2/P2P4/NPP1P1PP/BQ1BNRKR w HFhf - 2 9",True,[21,528,12189]),
+    ("2nnrbkr/p1qppppp/8/1ppb4/6PP/3PP3/PPP2P2/BQNNRBKR w HEhe - 1 9",True,[21,807,18002]),
+]
+
+polyglotReference = [ #* (moves, key) from the Polyglot book format specification
+    ([],0x463B96181691FC9C),
+    (["e2e4"],0x823C9B50FD114196),
+    (["e2e4","d7d5"],0x0756B94461C50FB0),
+    (["e2e4","d7d5","e4e5"],0x662FAFB965DB29D4),
+    (["e2e4","d7d5","e4e5","f7f5"],0x22A48B5A8E47FF78),
+    (["e2e4","d7d5","e4e5","f7f5","e1e2"],0x652A607CA3F242C1),
+    (["e2e4","d7d5","e4e5","f7f5","e1e2","e8f7"],0x00FDD303C946BDD9),
+    (["a2a4","b7b5","h2h4","b5b4","c2c4"],0x3C8123EA7B067637),
+    (["a2a4","b7b5","h2h4","b5b4","c2c4","b4c3","a1a3"],0x5C3F9B829B279560),
+]
+
+def benchBook(games: int=20000, plies: int=16, calls: int=2000) -> None:
+    """Checks the Polyglot keys against the specification, then times book lookups in a book built from random openings
+    """
+    for moves, expected in polyglotReference:
+        board = engine.position()
+        for move in moves:
+            board = board.push(board.parseUci(move))
+        assert book.polyglotKey(board) == expected, f"wrong Polyglot key after {' '.join(moves) or 'the start'}"
+    generator, entries, positions = random.Random(0), {}, []
+    for _ in range(games):
+        board = engine.position()
+        for _ in range(plies):
+            legal = board.legalMoves()
+            if not legal:
+                break
+            move = generator.choice(legal)
+            raw = (move >> 6) & 63 | (move & 63) << 6 | (move >> 12 & 7) << 12 #* polyglot moves are to | from << 6 | promotion << 12
+            entries[(book.polyglotKey(board),raw)] = generator.randint(1,100)
+            positions.append(board)
+            board = board.push(move)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory,"book.bin")
+        with open(path,"wb") as file:
+            for (key, raw), weight in sorted(entries.items()):
+                file.write(book.entry.pack(key,raw,weight,0))
+        with book.openingBook(path) as opening:
+            sample = [generator.choice(positions) for _ in range(calls)]
+            keys = [book.polyglotKey(board) for board in sample]
+            assert all([opening.choose(board) is not None for board in sample[:100]])
+            report("polyglotKey",timeCalls(lambda: book.polyglotKey(generator.choice(sample)),calls))
+            report("book lookup (key given)",timeCalls(lambda: opening.lookup(generator.choice(keys)),calls))
+            report("book choose (hit)",timeCalls(lambda: opening.choose(generator.choice(sample)),calls))
+            miss = engine.position("8/8/8/4k3/8/8/3K4/8 w - - 0 1")
+            report("book covers (miss)",timeCalls(lambda: opening.covers("standard",miss),calls))
+            print(f"book: {opening.entries} entries ({os.path.getsize(path)/1024/1024:.1f} MiB), Polyglot keys match the specification")
+
+def benchPerft() -> None:
+    """Checks the move generator against known perft counts and reports nodes per second
+    """
+    total, elapsed = 0, 0.0
+    for fen, chess960, counts in perftSuite:
+        board = engine.position(fen,chess960)
+        for depth, expected in enumerate(counts,1):
+            start = time.perf_counter()
+            nodes = engine.perft(board,depth)
+            elapsed += time.perf_counter()-start
+            total += nodes
+            if nodes != expected: #! the move generator is wrong
+                raise AssertionError(f"perft({fen}, {depth}) = {nodes}, expected {expected}")
+    print(f"perft: {total} nodes in {elapsed:.2f} s ({total/elapsed:.0f} nodes/s)")
+    searcher = engine.searchEngine()
+    result = searcher.search(engine.position(),movetime=2)
+    print(f"search: depth {result['depth']}, {result['nodes']} nodes in {result['time']:.2f} s ({result['nodes']/result['time']:.0f} nodes/s)")
+    stats = searcher.table.stats()
+    print(f"transposition table: {stats['hitRate']:.1%} hit rate, {stats['occupancy']:.2%} occupied")
+
+def benchParallel(depth: int=5, workers: int|None=None) -> None:
+    """Reports the Lazy SMP speedup curve: time to reach a depth and nodes per second, from 1 to every worker
+    """
+    workers = workers or max(2,os.cpu_count() or 1)
+    positions = [engine.position(fen,chess960) for fen, chess960, _ in perftSuite[:6]]
+    with parallel.parallelSearch(workers,tableMB=32) as searcher:
+        searcher.warm() #? don't time starting the helpers
+        baseline = None
+        for count in range(1,workers+1):
+            elapsed, nodes = 0.0, 0
+            for board in positions:
+                searcher.table.clear() #* every count starts cold
+                start = time.perf_counter()
+                result = searcher.search(board,depth=depth,workers=count)
+                elapsed += time.perf_counter()-start
+                nodes += result["nodes"]
+            baseline = baseline or elapsed
+            print(f"{count:>2} workers: depth {depth} in {elapsed/len(positions)*1000:7.1f} ms   {nodes/elapsed:9.0f} nodes/s   speedup {baseline/elapsed:.2f}x")
+    print(f"workers per move on {os.cpu_count()} cores: "+", ".join([f"{speed} {timemanager.workersFor(speed,os.cpu_count() or 1)}" for speed in timemanager.speeds]))
+
+def benchArchive(history: int=100000, partial: int=10000) -> None:
+    """Exports a long synthetic game history into a columnar archive: in one go, then as a partial export picked back up later, checking the memory used doesn't grow with the history
+    """
+    with tempfile.TemporaryDirectory() as directory, fakeserver.spawn(history=history,seed=1) as endpoint:
+        account = lichessAccount("bench",endpoint,scheduler=unthrottled())
+        with archive.gameArchive(os.path.join(directory,"full")) as games:
+            start = time.perf_counter()
+            games.export(account)
+            elapsed = time.perf_counter()-start
+            size = sum([os.path.getsize(os.path.join(games.directory,name)) for name in os.listdir(games.directory)])
+            print(f"export: {len(games)} games in {elapsed:.1f} s ({len(games)/elapsed:.0f} games/s), {size/len(games):.0f} bytes per game with moves and clocks ({games.totals['moves']/len(games):.0f} plies)")
+            report("winRate by variant, speed",timeCalls(games.winRate,20))
+            report("winRate rated, by speed",timeCalls(lambda: games.winRate(("speed",),where=games.column("rated")),20))
+            aborted = int((games.column("status") == games.vocabularies["status"].index("aborted")).sum())
+            assert sum([stats["games"] for stats in games.winRate().values()]) == len(games)-aborted, "aborted games were counted"
+            best = max(games.winRate(("speed",)).items(),key=lambda item: item[1]["winRate"])
+            print(f"best time control: {best[0][0]} ({best[1]['games']} games, {best[1]['winRate']:.1%} won)")
+        peaks = []
+        for limit in (partial,None): #* a first export stops early, the second picks it back up
+            tracemalloc.start()
+            with archive.gameArchive(os.path.join(directory,"resumed")) as games:
+                games.export(account,limit=limit)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        account.close()
+        games = archive.gameArchive(os.path.join(directory,"resumed"))
+        ids = games.column("id")
+        assert len(games) == history and len(np.unique(ids)) == history, "the resumed export lost or repeated games"
+        assert (np.diff(games.column("createdAt")) >= 0).all()
+        games.close()
+    print(f"resume: {partial} then {history-partial} games, peak memory {peaks[0]/1024/1024:.1f} MiB then {peaks[1]/1024/1024:.1f} MiB")
+
+if __name__ == "__main__":
+    benchColdStart()
+    benchPooling()
+    benchEndpoints()
+    benchMetrics()
+    benchRateLimited()
+    benchAsyncGames()
+    benchDroppedMoves()
+    benchMaxGames()
+    benchRuntime()
+    benchBoardState()
+    benchGameLog()
+    benchTriage()
+    benchFleet()
+    benchBook()
+    benchPerft()
+    benchParallel()
+    benchArchive()
@@ -0,0 +1,816 @@
+import random
+import threading
+import time
+from array import array
+
+#--------------------------------------------------------------#
+#Bitboard move generator and alpha-beta search
+#Squares are numbered a1=0, b1=1, ..., h8=63
+#A move is an int: from | to << 6 | promotion << 12
+#Castling is encoded as the king moving onto its own rook, so
+#standard and chess960 castling share one code path
+#--------------------------------------------------------------#
+
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = range(6)
+WHITE, BLACK = 0, 1
+variants = ["standard","chess960","fromPosition"] #* the gameSetup variants the engine can play
+startFen = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+pieceLetters = "pnbrqk"
+squareNames = [f"{file}{rank}" for rank in "12345678" for file in "abcdefgh"]
+fileA = 0x0101010101010101
+fileH = fileA << 7
+rank1 = 0xFF
+rank8 = rank1 << 56
+full = (1 << 64)-1
+
+#* attack tables, built once at import
+def _stepAttacks(steps: list) -> list:
+    table = []
+    for square in range(64):
+        rank, file = divmod(square,8)
+        attacks = 0
+        for rankStep, fileStep in steps:
+            if 0 <= rank+rankStep < 8 and 0 <= file+fileStep < 8:
+                attacks |= 1 << ((rank+rankStep)*8+file+fileStep)
+        table.append(attacks)
+    return table
+knightAttacks = _stepAttacks([(1,2),(2,1),(2,-1),(1,-2),(-1,-2),(-2,-1),(-2,1),(-1,2)])
+kingAttacks = _stepAttacks([(1,0),(1,1),(0,1),(-1,1),(-1,0),(-1,-1),(0,-1),(1,-1)])
+pawnAttacks = [_stepAttacks([(1,-1),(1,1)]),_stepAttacks([(-1,-1),(-1,1)])] #* [color][square]: squares a pawn of that color attacks
+
+#? rays[direction][square] excludes the square itself. Directions 0-3 go up the board (the nearest blocker is the lowest bit), 4-7 go down
+_directions = [(1,0),(0,1),(1,1),(1,-1),(-1,0),(0,-1),(-1,-1),(-1,1)] #* N, E, NE, NW, S, W, SW, SE
+rays = [[0]*64 for _ in range(8)]
+between = [[0]*64 for _ in range(64)] #* squares strictly between two aligned squares
+for _direction, (_rankStep, _fileStep) in enumerate(_directions):
+    for _square in range(64):
+        _rank, _file = divmod(_square,8)
+        _ray = 0
+        _rank, _file = _rank+_rankStep, _file+_fileStep
+        while 0 <= _rank < 8 and 0 <= _file < 8:
+            _target = _rank*8+_file
+            between[_square][_target] = _ray
+            _ray |= 1 << _target
+            _rank, _file = _rank+_rankStep, _file+_fileStep
+        rays[_direction][_square] = _ray
+north, east, northEast, northWest, south, west, southWest, southEast = rays
+rookRays = [north[s] | east[s] | south[s] | west[s] for s in range(64)]
+bishopRays = [northEast[s] | northWest[s] | southWest[s] | southEast[s] for s in range(64)]
+
+def rookAttacks(square: int, occupied: int) -> int:
+    attacks = 0
+    for ray in (north,east):
+        attack = ray[square]
+        blockers = attack & occupied
+        if blockers:
+            attack ^= ray[(blockers & -blockers).bit_length()-1]
+        attacks |= attack
+    for ray in (south,west):
+        attack = ray[square]
+        blockers = attack & occupied
+        if blockers:
+            attack ^= ray[blockers.bit_length()-1]
+        attacks |= attack
+    return attacks
+
+def bishopAttacks(square: int, occupied: int) -> int:
+    attacks = 0
+    for ray in (northEast,northWest):
+        attack = ray[square]
+        blockers = attack & occupied
+        if blockers:
+            attack ^= ray[(blockers & -blockers).bit_length()-1]
+        attacks |= attack
+    for ray in (southWest,southEast):
+        attack = ray[square]
+        blockers = attack & occupied
+        if blockers:
+            attack ^= ray[blockers.bit_length()-1]
+        attacks |= attack
+    return attacks
+
+#* Zobrist keys (fixed seed, so keys are the same in every process)
+_random = random.Random(0x5EED)
+zobristPieces = [[[_random.getrandbits(64) for square in range(64)] for piece in range(6)] for color in range(2)] #* [color][piece][square]
+zobristCastling = [_random.getrandbits(64) for square in range(64)] #* by castling rook square
+zobristEp = [_random.getrandbits(64) for file in range(8)]
+zobristTurn = _random.getrandbits(64)
+
+def squares(bitboard: int):
+    """Yields the square of every set bit, lowest first
+    """
+    while bitboard:
+        yield (bitboard & -bitboard).bit_length()-1
+        bitboard &= bitboard-1
+
+class position:
+    __slots__ = ("pieces","colors","turn","castling","ep","halfmove","fullmove","chess960","hash")
+    def __init__(self, fen: str="startpos", chess960: bool=False) -> None:
+        """A chess position
+
+        Args:
+            fen (str, optional): The position in FEN notation. Castling rights can be KQkq or file letters (Shredder-FEN/X-FEN). Defaults to "startpos".
+            chess960 (bool, optional): If castling moves should be written king-takes-rook (i.e. e1h1). Defaults to False.
+
+        Raises:
+            ValueError: Raises if the FEN is invalid
+        """
+        if fen == "startpos":
+            fen = startFen
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("Invalid FEN")
+        self.pieces = [0]*6 #* [piece type]
+        self.colors = [0,0] #* [color]
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError("Invalid FEN")
+        for row, text in enumerate(rows):
+            file = 0
+            for char in text:
+                if char.isdigit():
+                    file += int(char)
+                elif char.lower() in pieceLetters and file < 8:
+                    square = (7-row)*8+file
+                    self.pieces[pieceLetters.index(char.lower())] |= 1 << square
+                    self.colors[WHITE if char.isupper() else BLACK] |= 1 << square
+                    file += 1
+                else:
+                    raise ValueError("Invalid FEN")
+            if file != 8:
+                raise ValueError("Invalid FEN")
+        if fields[1] not in ("w","b"):
+            raise ValueError("Invalid FEN")
+        self.turn = WHITE if fields[1] == "w" else BLACK
+        self.castling = 0 #* bitboard of the rooks that can still castle
+        for char in fields[2] if fields[2] != "-" else "":
+            color = WHITE if char.isupper() else BLACK
+            backRank = rank1 if color == WHITE else rank8
+            rooks = self.pieces[ROOK] & self.colors[color] & backRank
+            king = self.pieces[KING] & self.colors[color] & backRank
+            if not king:
+                continue
+            kingSquare = king.bit_length()-1
+            if char in "Kk": #? the outermost rook on the king side
+                candidates = [square for square in squares(rooks) if square > kingSquare]
+                rook = candidates[-1] if candidates else None
+            elif char in "Qq":
+                candidates = [square for square in squares(rooks) if square < kingSquare]
+                rook = candidates[0] if candidates else None
+            else:
+                rook = (0 if color == WHITE else 56)+"abcdefgh".index(char.lower())
+            if rook is not None and rooks & (1 << rook):
+                self.castling |= 1 << rook
+        self.ep = squareNames.index(fields[3]) if fields[3] != "-" else -1
+        self.halfmove = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self.chess960 = chess960
+        self.hash = self.zobrist()
+    def zobrist(self) -> int:
+        """Computes the Zobrist hash of the position from scratch (push() keeps it up to date incrementally)
+        """
+        key = zobristTurn if self.turn == BLACK else 0
+        for color in (WHITE,BLACK):
+            for piece in range(6):
+                for square in squares(self.pieces[piece] & self.colors[color]):
+                    key ^= zobristPieces[color][piece][square]
+        for square in squares(self.castling):
+            key ^= zobristCastling[square]
+        if self.ep >= 0:
+            key ^= zobristEp[self.ep % 8]
+        return key
+    def copy(self) -> "position":
+        new = position.__new__(position)
+        new.pieces = self.pieces[:]
+        new.colors = self.colors[:]
+        new.turn = self.turn
+        new.castling = self.castling
+        new.ep = self.ep
+        new.halfmove = self.halfmove
+        new.fullmove = self.fullmove
+        new.chess960 = self.chess960
+        new.hash = self.hash
+        return new
+    def pieceAt(self, square: int) -> int:
+        """Gets the type of the piece on a square, or -1 if it is empty
+        """
+        bit = 1 << square
+        for piece in range(6):
+            if self.pieces[piece] & bit:
+                return piece
+        return -1
+    def king(self, color: int) -> int:
+        return (self.pieces[KING] & self.colors[color]).bit_length()-1
+    def attackers(self, square: int, color: int, occupied: int|None=None) -> int:
+        """Gets the pieces of a color that attack a square
+
+        Args:
+            square (int): The square
+            color (int): The attacking color
+            occupied (int, optional): The occupancy to use for sliding pieces. Defaults to the current board.
+
+        Returns:
+            int: A bitboard of the attackers
+        """
+        if occupied is None:
+            occupied = self.colors[WHITE] | self.colors[BLACK]
+        pieces = self.pieces
+        return self.colors[color] & ((pawnAttacks[color ^ 1][square] & pieces[PAWN])
+            | (knightAttacks[square] & pieces[KNIGHT])
+            | (kingAttacks[square] & pieces[KING])
+            | (bishopAttacks(square,occupied) & (pieces[BISHOP] | pieces[QUEEN]))
+            | (rookAttacks(square,occupied) & (pieces[ROOK] | pieces[QUEEN])))
+    def inCheck(self) -> bool:
+        return bool(self.attackers(self.king(self.turn),self.turn ^ 1,self.colors[WHITE] | self.colors[BLACK]))
+    def _pinned(self, kingSquare: int) -> int:
+        """Gets our pieces that are pinned to our king
+        """
+        us, them = self.colors[self.turn], self.colors[self.turn ^ 1]
+        occupied = us | them
+        snipers = them & ((rookRays[kingSquare] & (self.pieces[ROOK] | self.pieces[QUEEN])) | (bishopRays[kingSquare] & (self.pieces[BISHOP] | self.pieces[QUEEN])))
+        pinned = 0
+        for sniper in squares(snipers):
+            blockers = between[kingSquare][sniper] & occupied
+            if blockers and not blockers & (blockers-1) and blockers & us:
+                pinned |= blockers
+        return pinned
+    def pseudoLegalMoves(self, capturesOnly: bool=False) -> list:
+        """Generates every move that follows the piece movement rules, ignoring checks to our own king
+
+        Args:
+            capturesOnly (bool, optional): Only generate captures and queen promotions. Defaults to False.
+
+        Returns:
+            list: The moves
+        """
+        moves = []
+        append = moves.append
+        pieces = self.pieces
+        turn = self.turn
+        us, them = self.colors[turn], self.colors[turn ^ 1]
+        occupied = us | them
+        targets = them if capturesOnly else full & ~us
+        #* pawns
+        pawns = pieces[PAWN] & us
+        empty = full & ~occupied
+        epBit = (1 << self.ep) if self.ep >= 0 else 0
+        if turn == WHITE:
+            single = (pawns << 8) & empty
+            double = ((single & (rank1 << 16)) << 8) & empty
+            left = ((pawns & ~fileA) << 7) & (them | epBit)
+            right = ((pawns & ~fileH) << 9) & (them | epBit)
+            forward, promotionRank = 8, rank8
+        else:
+            single = (pawns >> 8) & empty
+            double = ((single & (rank1 << 40)) >> 8) & empty
+            left = ((pawns & ~fileA) >> 9) & (them | epBit)
+            right = ((pawns & ~fileH) >> 7) & (them | epBit)
+            forward, promotionRank = -8, rank1
+        leftStep, rightStep = (7,9) if turn == WHITE else (-9,-7)
+        for targetSet, step in ((left,leftStep),(right,rightStep),(single,forward)):
+            if capturesOnly and step == forward:
+                targetSet &= promotionRank
+            for to in squares(targetSet & promotionRank):
+                for promotion in ((QUEEN,) if capturesOnly else (QUEEN,KNIGHT,ROOK,BISHOP)):
+                    append((to-step) | (to << 6) | (promotion << 12))
+            for to in squares(targetSet & ~promotionRank):
+                append((to-step) | (to << 6))
+        if not capturesOnly:
+            for to in squares(double):
+                append((to-2*forward) | (to << 6))
+        #* pieces
+        for frm in squares(pieces[KNIGHT] & us):
+            for to in squares(knightAttacks[frm] & targets):
+                append(frm | (to << 6))
+        for frm in squares((pieces[BISHOP] | pieces[QUEEN]) & us):
+            for to in squares(bishopAttacks(frm,occupied) & targets):
+                append(frm | (to << 6))
+        for frm in squares((pieces[ROOK] | pieces[QUEEN]) & us):
+            for to in squares(rookAttacks(frm,occupied) & targets):
+                append(frm | (to << 6))
+        kingSquare = (pieces[KING] & us).bit_length()-1
+        for to in squares(kingAttacks[kingSquare] & targets):
+            append(kingSquare | (to << 6))
+        #* castling
+        if not capturesOnly and self.castling & us:
+            backRank = 0 if turn == WHITE else 56
+            for rook in squares(self.castling & us):
+                kingside = rook > kingSquare
+                kingTo = backRank+(6 if kingside else 2)
+                rookTo = backRank+(5 if kingside else 3)
+                low, high = min(kingSquare,kingTo,rook,rookTo), max(kingSquare,kingTo,rook,rookTo)
+                span = ((1 << (high+1))-1) ^ ((1 << low)-1)
+                if span & occupied & ~((1 << kingSquare) | (1 << rook)):
+                    continue
+                #? the king may not start in, pass through or land on an attacked square
+                without = occupied ^ (1 << kingSquare) ^ (1 << rook)
+                path = between[kingSquare][kingTo] | (1 << kingSquare) | (1 << kingTo)
+                if any(self.attackers(square,turn ^ 1,without) for square in squares(path)):
+                    continue
+                append(kingSquare | (rook << 6))
+        return moves
+    def legalMoves(self, capturesOnly: bool=False) -> list:
+        """Generates every legal move
+
+        Args:
+            capturesOnly (bool, optional): Only generate captures and queen promotions. Defaults to False.
+
+        Returns:
+            list: The moves
+        """
+        turn = self.turn
+        kingSquare = self.king(turn)
+        occupied = self.colors[WHITE] | self.colors[BLACK]
+        checkers = self.attackers(kingSquare,turn ^ 1,occupied)
+        pinned = self._pinned(kingSquare)
+        legal = []
+        for move in self.pseudoLegalMoves(capturesOnly):
+            frm = move & 63
+            if frm == kingSquare:
+                to = (move >> 6) & 63
+                if (1 << to) & self.colors[turn]: #? castling was fully checked while generating
+                    if not checkers:
+                        legal.append(move)
+                elif not self.attackers(to,turn ^ 1,occupied ^ (1 << frm)):
+                    legal.append(move)
+            elif checkers or (pinned >> frm) & 1 or (((move >> 6) & 63) == self.ep and self.pieces[PAWN] >> frm & 1):
+                if not self.push(move).attackers(kingSquare,turn ^ 1):
+                    legal.append(move)
+            else:
+                legal.append(move)
+        return legal
+    def push(self, move: int) -> "position":
+        """Makes a move
+
+        Args:
+            move (int): The move. It is not checked for legality.
+
+        Returns:
+            position: The new position (this one is not changed)
+        """
+        new = self.copy()
+        frm, to, promotion = move & 63, (move >> 6) & 63, move >> 12
+        turn = self.turn
+        pieces, colors = new.pieces, new.colors
+        fromBit, toBit = 1 << frm, 1 << to
+        piece = self.pieceAt(frm)
+        ours, theirs = zobristPieces[turn], zobristPieces[turn ^ 1]
+        key = self.hash ^ zobristTurn
+        if self.ep >= 0:
+            key ^= zobristEp[self.ep % 8]
+        new.ep = -1
+        new.halfmove += 1
+        if piece == KING and colors[turn] & toBit: #* castling (king takes own rook)
+            backRank = 0 if turn == WHITE else 56
+            kingTo, rookTo = (backRank+6,backRank+5) if to > frm else (backRank+2,backRank+3)
+            #? lift both pieces before placing them, as in chess960 the squares can overlap
+            pieces[KING] &= ~fromBit
+            pieces[ROOK] &= ~toBit
+            colors[turn] &= ~(fromBit | toBit)
+            pieces[KING] |= 1 << kingTo
+            pieces[ROOK] |= 1 << rookTo
+            colors[turn] |= (1 << kingTo) | (1 << rookTo)
+            key ^= ours[KING][frm] ^ ours[ROOK][to] ^ ours[KING][kingTo] ^ ours[ROOK][rookTo]
+            new.castling &= ~(rank1 << backRank)
+        else:
+            if colors[turn ^ 1] & toBit: #* capture
+                captured = self.pieceAt(to)
+                pieces[captured] ^= toBit
+                key ^= theirs[captured][to]
+                colors[turn ^ 1] ^= toBit
+                new.halfmove = 0
+                new.castling &= ~toBit
+            if piece == PAWN:
+                new.halfmove = 0
+                if to == self.ep: #* en passant
+                    square = to-8 if turn == WHITE else to+8
+                    pieces[PAWN] ^= 1 << square
+                    colors[turn ^ 1] ^= 1 << square
+                    key ^= theirs[PAWN][square]
+                elif abs(to-frm) == 16:
+                    new.ep = (frm+to) // 2
+                    key ^= zobristEp[new.ep % 8]
+            key ^= ours[piece][frm] ^ ours[promotion or piece][to]
+            pieces[piece] ^= fromBit
+            pieces[promotion or piece] |= toBit
+            colors[turn] ^= fromBit | toBit
+            if piece == KING:
+                new.castling &= ~(rank1 << (0 if turn == WHITE else 56))
+            new.castling &= ~fromBit
+        for square in squares(self.castling ^ new.castling): #* lost castling rights
+            key ^= zobristCastling[square]
+        new.hash = key
+        new.turn = turn ^ 1
+        if turn == BLACK:
+            new.fullmove += 1
+        return new
+    def isCapture(self, move: int) -> bool:
+        to = (move >> 6) & 63
+        return bool(self.colors[self.turn ^ 1] >> to & 1) or (to == self.ep and self.pieces[PAWN] >> (move & 63) & 1 == 1)
+    def toUci(self, move: int) -> str:
+        """Writes a move in UCI format (i.e. e2e4, e7e8q)
+        """
+        frm, to, promotion = move & 63, (move >> 6) & 63, move >> 12
+        if not self.chess960 and self.pieces[KING] >> frm & 1 and self.colors[self.turn] >> to & 1: #? standard castling is written as a king move
+            to = frm+2 if to > frm else frm-2
+        return squareNames[frm]+squareNames[to]+(pieceLetters[promotion] if promotion else "")
+    def toSan(self, move: int) -> str:
+        """Writes a legal move in standard algebraic notation (i.e. Nf3, exd5, O-O, e8=Q+), as lichess exports games
+        """
+        frm, to, promotion = move & 63, (move >> 6) & 63, move >> 12
+        piece = self.pieceAt(frm)
+        if piece == KING and self.colors[self.turn] >> to & 1: #* castling (king takes own rook)
+            san = "O-O" if to > frm else "O-O-O"
+        else:
+            capture = self.isCapture(move)
+            if piece == PAWN:
+                san = (squareNames[frm][0]+"x" if capture else "")+squareNames[to]+("="+pieceLetters[promotion].upper() if promotion else "")
+            else:
+                others = [other & 63 for other in self.legalMoves() if other != move and (other >> 6) & 63 == to and self.pieceAt(other & 63) == piece and not (piece == KING and self.colors[self.turn] >> to & 1)]
+                disambiguation = ""
+                if others: #? the file if it is enough, else the rank, else both
+                    if all([other % 8 != frm % 8 for other in others]):
+                        disambiguation = squareNames[frm][0]
+                    elif all([other // 8 != frm // 8 for other in others]):
+                        disambiguation = squareNames[frm][1]
+                    else:
+                        disambiguation = squareNames[frm]
+                san = pieceLetters[piece].upper()+disambiguation+("x" if capture else "")+squareNames[to]
+        after = self.push(move)
+        if after.inCheck():
+            san += "#" if not after.legalMoves() else "+"
+        return san
+    def parseUci(self, uci: str) -> int:
+        """Reads a move in UCI format. Castling can be written as a king move (e1g1) or as king-takes-rook (e1h1)
+
+        Args:
+            uci (str): The move
+
+        Raises:
+            ValueError: Raises if the move is not legal in this position
+
+        Returns:
+            int: The move
+        """
+        try:
+            frm, to = squareNames.index(uci[0:2]), squareNames.index(uci[2:4])
+            promotion = pieceLetters.index(uci[4]) if len(uci) > 4 else 0
+        except (ValueError,IndexError):
+            raise ValueError(f"Invalid move {uci}")
+        if self.pieces[KING] >> frm & 1 and abs(to-frm) == 2 and not self.colors[self.turn] >> to & 1: #? king move notation for castling
+            candidates = [rook for rook in squares(self.castling & self.colors[self.turn]) if (rook > frm) == (to > frm)]
+            if candidates:
+                to = candidates[0]
+        move = frm | (to << 6) | (promotion << 12)
+        if move not in self.legalMoves():
+            raise ValueError(f"Illegal move {uci}")
+        return move
+    def fen(self) -> str:
+        """Writes the position in FEN notation
+        """
+        rows = []
+        for rank in range(7,-1,-1):
+            row, empty = "", 0
+            for file in range(8):
+                square = rank*8+file
+                piece = self.pieceAt(square)
+                if piece < 0:
+                    empty += 1
+                    continue
+                row += (str(empty) if empty else "")+(pieceLetters[piece].upper() if self.colors[WHITE] >> square & 1 else pieceLetters[piece])
+                empty = 0
+            rows.append(row+(str(empty) if empty else ""))
+        castling = ""
+        for color in (WHITE,BLACK):
+            king = self.king(color)
+            rooks = list(squares(self.pieces[ROOK] & self.colors[color] & (rank1 << (0 if color == WHITE else 56))))
+            for rook in sorted(squares(self.castling & self.colors[color]),reverse=True):
+                outermost = max(rooks) if rook > king else min(rooks)
+                letter = ("k" if rook > king else "q") if rook == outermost else "abcdefgh"[rook % 8] #? Shredder-FEN letter for an inner rook
+                castling += letter.upper() if color == WHITE else letter
+        return f"{'/'.join(rows)} {'w' if self.turn == WHITE else 'b'} {castling or '-'} {squareNames[self.ep] if self.ep >= 0 else '-'} {self.halfmove} {self.fullmove}"
+    def key(self) -> int:
+        """Gets the Zobrist hash of the position (pieces, side to move, castling and en passant)
+        """
+        return self.hash
+
+def perft(board: position, depth: int) -> int:
+    """Counts the leaf nodes of the legal move tree (used to check and benchmark the move generator)
+
+    Args:
+        board (position): The position to start from
+        depth (int): How many plies to search
+
+    Returns:
+        int: The number of leaf nodes
+    """
+    moves = board.legalMoves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    return sum([perft(board.push(move),depth-1) for move in moves])
+
+#* evaluation: material plus piece-square tables (from white's point of view, a1 first)
+pieceValues = [100,320,330,500,900,0]
+_tables = [
+    [0,0,0,0,0,0,0,0, 5,10,10,-20,-20,10,10,5, 5,-5,-10,0,0,-10,-5,5, 0,0,0,20,20,0,0,0, 5,5,10,25,25,10,5,5, 10,10,20,30,30,20,10,10, 50,50,50,50,50,50,50,50, 0,0,0,0,0,0,0,0],
+    [-50,-40,-30,-30,-30,-30,-40,-50, -40,-20,0,5,5,0,-20,-40, -30,5,10,15,15,10,5,-30, -30,0,15,20,20,15,0,-30, -30,5,15,20,20,15,5,-30, -30,0,10,15,15,10,0,-30, -40,-20,0,0,0,0,-20,-40, -50,-40,-30,-30,-30,-30,-40,-50],
+    [-20,-10,-10,-10,-10,-10,-10,-20, -10,5,0,0,0,0,5,-10, -10,10,10,10,10,10,10,-10, -10,0,10,10,10,10,0,-10, -10,5,5,10,10,5,5,-10, -10,0,5,10,10,5,0,-10, -10,0,0,0,0,0,0,-10, -20,-10,-10,-10,-10,-10,-10,-20],
+    [0,0,0,5,5,0,0,0, -5,0,0,0,0,0,0,-5, -5,0,0,0,0,0,0,-5, -5,0,0,0,0,0,0,-5, -5,0,0,0,0,0,0,-5, -5,0,0,0,0,0,0,-5, 5,10,10,10,10,10,10,5, 0,0,0,0,0,0,0,0],
+    [-20,-10,-10,-5,-5,-10,-10,-20, -10,0,5,0,0,0,0,-10, -10,5,5,5,5,5,0,-10, 0,0,5,5,5,5,0,-5, -5,0,5,5,5,5,0,-5, -10,0,5,5,5,5,0,-10, -10,0,0,0,0,0,0,-10, -20,-10,-10,-5,-5,-10,-10,-20],
+    [20,30,10,0,0,10,30,20, 20,20,0,0,0,0,20,20, -10,-20,-20,-20,-20,-20,-20,-10, -20,-30,-30,-40,-40,-30,-30,-20, -30,-40,-40,-50,-50,-40,-40,-30, -30,-40,-40,-50,-50,-40,-40,-30, -30,-40,-40,-50,-50,-40,-40,-30, -30,-40,-40,-50,-50,-40,-40,-30],
+]
+pieceSquare = [[[pieceValues[piece]+_tables[piece][square if color == WHITE else square ^ 56] for square in range(64)] for piece in range(6)] for color in range(2)] #* [color][piece][square]
+
+def evaluate(board: position) -> int:
+    """Scores a position in centipawns for the side to move
+    """
+    score = 0
+    for color, sign in ((WHITE,1),(BLACK,-1)):
+        ours = board.colors[color]
+        tables = pieceSquare[color]
+        for piece in range(6):
+            table = tables[piece]
+            for square in squares(board.pieces[piece] & ours):
+                score += sign*table[square]
+    return score if board.turn == WHITE else -score
+
+MATE = 100000
+INFINITY = 1000000
+
+class _timeUp(Exception):
+    pass
+
+class transpositionTable:
+    exact, lower, upper = 0, 1, 2 #* bound types
+    entryBytes = 16 #* an 8 byte key and 8 bytes of packed data
+    def __init__(self, sizeMB: float=64) -> None:
+        """A fixed-size table of search results keyed by Zobrist hash. One table can be shared by every search in a process
+
+        Entries live in two flat arrays, grouped in buckets of two. A new entry replaces the entry with the same key, else an empty
+        slot, else the slot whose depth (minus 4 per search it has aged) is lowest. The stored key is XORed with the data, so a
+        half-written entry from another thread fails the key check instead of being read.
+
+        Args:
+            sizeMB (float, optional): The memory budget in MiB. Defaults to 64.
+
+        Raises:
+            ValueError: Raises if the size is too small
+        """
+        entries = int(sizeMB*1024*1024) // self.entryBytes // 2*2
+        if entries < 2:
+            raise ValueError("Invalid table size")
+        self.sizeMB = sizeMB
+        self.buckets = entries // 2
+        self.keys = array("Q",bytes(8*entries))
+        self.data = array("Q",bytes(8*entries)) #* move:16 | score+2^23:24 | depth:8 | bound:2 | generation:6 | used:1
+        self.generation = 0
+        self.probes = self.hits = self.stores = self.replacements = 0
+    def newSearch(self) -> None:
+        """Ages every entry by one search
+        """
+        self.generation = (self.generation+1) & 63
+    def probe(self, key: int) -> tuple|None:
+        """Looks up a position
+
+        Args:
+            key (int): The Zobrist hash
+
+        Returns:
+            tuple | None: (move, score, depth, bound), or None if the position is not stored
+        """
+        self.probes += 1
+        index = (key % self.buckets)*2
+        for slot in (index,index+1):
+            data = self.data[slot]
+            if data and self.keys[slot] ^ data == key:
+                self.hits += 1
+                return (data & 0xFFFF,((data >> 16) & 0xFFFFFF)-(1 << 23),(data >> 40) & 0xFF,(data >> 48) & 3)
+        return None
+    def store(self, key: int, move: int, score: int, depth: int, bound: int) -> None:
+        """Stores a search result
+
+        Args:
+            key (int): The Zobrist hash
+            move (int): The best move (0 if none)
+            score (int): The score
+            depth (int): The depth searched
+            bound (int): exact, lower or upper
+        """
+        index = (key % self.buckets)*2
+        keys, table, generation = self.keys, self.data, self.generation
+        victim, victimWorth = index, None
+        for slot in (index,index+1):
+            data = table[slot]
+            if not data or keys[slot] ^ data == key: #* empty, or the same position
+                victim = slot
+                if data and not move: #? keep the old best move
+                    move = data & 0xFFFF
+                break
+            worth = ((data >> 40) & 0xFF)-4*((generation-((data >> 50) & 63)) & 63)
+            if victimWorth is None or worth < victimWorth:
+                victim, victimWorth = slot, worth
+        else:
+            self.replacements += 1
+        data = move | ((max(-(1 << 23),min(score,(1 << 23)-1))+(1 << 23)) << 16) | (max(0,min(depth,255)) << 40) | (bound << 48) | (generation << 50) | (1 << 56)
+        table[victim] = data
+        keys[victim] = key ^ data
+        self.stores += 1
+    def clear(self) -> None:
+        entries = self.buckets*2
+        self.keys = array("Q",bytes(8*entries))
+        self.data = array("Q",bytes(8*entries))
+        self.probes = self.hits = self.stores = self.replacements = 0
+    def occupancy(self, sample: int=4000) -> float:
+        """Gets the share of used entries, estimated from the first entries of the table
+
+        Args:
+            sample (int, optional): How many entries to look at. Defaults to 4000.
+
+        Returns:
+            float: The share of used entries, from 0 to 1
+        """
+        sample = min(sample,len(self.data))
+        return sum([1 for data in self.data[:sample] if data]) / sample
+    def stats(self) -> dict:
+        """Gets the size and usage of the table
+
+        Returns:
+            dict: {"sizeMB", "entries", "probes", "hits", "hitRate", "stores", "replacements", "occupancy"}
+        """
+        return {"sizeMB": self.sizeMB,"entries": self.buckets*2,"probes": self.probes,"hits": self.hits,"hitRate": self.hits/self.probes if self.probes else 0.0,"stores": self.stores,"replacements": self.replacements,"occupancy": self.occupancy()}
+    def seed(self, board: position, depth: int=4) -> None:
+        """Fills the table with a shallow search of a position (i.e. a game's starting position)
+
+        Args:
+            board (position): The position
+            depth (int, optional): How deep to search. Defaults to 4.
+        """
+        searchEngine(self).search(board,depth=depth)
+
+class searchEngine:
+    def __init__(self, table: transpositionTable|None=None) -> None:
+        """An alpha-beta search with iterative deepening, a transposition table, quiescence search and move ordering (best move first, MVV-LVA, killers, history)
+
+        Args:
+            table (transpositionTable, optional): The transposition table to use. Pass the same table to share results between searches. Defaults to a new 16 MiB table.
+        """
+        self.table = table if table is not None else transpositionTable(16)
+        self.nodes = 0
+        self._rootMove = 0
+        self._killers = [[0,0] for _ in range(128)]
+        self._history = {}
+        self._deadline = None
+        self._maxNodes = None
+        self._stop = None
+        self._path = []
+    def search(self, board: position, *, depth: int=64, movetime: float|None=None, nodes: int|None=None, history: list=[], stop: threading.Event|None=None, startDepth: int=1) -> dict:
+        """Finds the best move
+
+        Args:
+            board (position): The position to search
+            depth (int, optional): The deepest iteration to search. Defaults to 64.
+            movetime (float, optional): How long to search, in seconds. Defaults to no limit.
+            nodes (int, optional): How many nodes to search. Defaults to no limit.
+            history (list, optional): The keys of the positions before this one in the game, to detect repetitions. Defaults to [].
+            stop (threading.Event, optional): Ends the search (keeping the last finished iteration) once set. Anything with an is_set method works. Defaults to None.
+            startDepth (int, optional): The first iteration to search. Parallel helpers start deeper, so they fill the table ahead of the main search. Defaults to 1.
+
+        Raises:
+            ValueError: Raises if there is no legal move
+
+        Returns:
+            dict: {"move": best move (UCI), "score": centipawns for the side to move, "depth": last finished depth, "nodes": nodes searched, "time": seconds, "pv": principal variation (UCI)}
+        """
+        moves = board.legalMoves()
+        if not moves:
+            raise ValueError("There is no legal move")
+        start = time.perf_counter()
+        self.nodes = 0
+        self._deadline = start+movetime if movetime is not None else None
+        self._maxNodes = nodes
+        self._stop = stop
+        self._path = list(history)
+        self._killers = [[0,0] for _ in range(128)]
+        self.table.newSearch()
+        result = {"move": board.toUci(moves[0]),"score": 0,"depth": 0,"nodes": 0,"time": 0.0,"pv": [board.toUci(moves[0])]}
+        for iteration in range(min(startDepth,depth),depth+1):
+            try:
+                score = self._negamax(board,iteration,-INFINITY,INFINITY,0)
+            except _timeUp:
+                break
+            pv = [board.toUci(self._rootMove)]+self.principalVariation(board.push(self._rootMove),iteration-1)
+            result = {"move": pv[0],"score": score,"depth": iteration,"nodes": self.nodes,"time": time.perf_counter()-start,"pv": pv}
+            if abs(score) >= MATE-iteration or len(moves) == 1: #? a forced mate was found, or there is nothing to choose
+                break
+            if self._deadline is not None and time.perf_counter() > start+(self._deadline-start)/2: #? the next iteration would not finish
+                break
+        result["nodes"] = self.nodes
+        result["time"] = time.perf_counter()-start
+        return result
+    def principalVariation(self, board: position, length: int) -> list:
+        """Follows the best moves stored in the transposition table
+
+        Args:
+            board (position): The position to start from
+            length (int): The most moves to follow
+
+        Returns:
+            list: The moves (UCI)
+        """
+        pv = []
+        seen = set()
+        while len(pv) < length:
+            entry = self.table.probe(board.key())
+            move = entry[0] if entry is not None else 0
+            if not move or board.key() in seen or move not in board.legalMoves():
+                break
+            seen.add(board.key())
+            pv.append(board.toUci(move))
+            board = board.push(move)
+        return pv
+    def _checkLimits(self) -> None:
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise _timeUp
+        if self._maxNodes is not None and self.nodes >= self._maxNodes:
+            raise _timeUp
+        if self._stop is not None and self._stop.is_set():
+            raise _timeUp
+    def _order(self, board: position, moves: list, best: int, ply: int) -> list:
+        killers = self._killers[ply] if ply < 128 else (0,0)
+        history = self._history
+        scored = []
+        for move in moves:
+            if move == best:
+                score = 1 << 30
+            elif board.isCapture(move):
+                victim = board.pieceAt((move >> 6) & 63)
+                score = (1 << 20)+pieceValues[victim if victim >= 0 else PAWN]*10-pieceValues[board.pieceAt(move & 63)]//10
+            elif move >> 12:
+                score = 1 << 19
+            elif move in killers:
+                score = 1 << 18
+            else:
+                score = history.get(move,0)
+            scored.append((score,move))
+        scored.sort(reverse=True)
+        return [move for _, move in scored]
+    def _negamax(self, board: position, depth: int, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self._checkLimits()
+        key = board.key()
+        if ply and (board.halfmove >= 100 or key in self._path[-board.halfmove-1:]): #* fifty-move rule or repetition
+            return 0
+        inCheck = board.inCheck()
+        if inCheck:
+            depth += 1 #* check extension
+        if depth <= 0:
+            return self._quiesce(board,alpha,beta,ply)
+        entry = self.table.probe(key)
+        tableMove = 0
+        if entry is not None:
+            tableMove, score, entryDepth, bound = entry
+            if ply and entryDepth >= depth:
+                score = score-ply if score > MATE-1000 else score+ply if score < -MATE+1000 else score #? mate scores are stored relative to the node
+                if bound == transpositionTable.exact or (bound == transpositionTable.lower and score >= beta) or (bound == transpositionTable.upper and score <= alpha):
+                    return score
+        moves = board.legalMoves()
+        if not moves:
+            return -MATE+ply if inCheck else 0
+        best, bestMove, alphaStart = -INFINITY, 0, alpha
+        self._path.append(key)
+        try:
+            for move in self._order(board,moves,tableMove,ply):
+                score = -self._negamax(board.push(move),depth-1,-beta,-alpha,ply+1)
+                if score > best:
+                    best, bestMove = score, move
+                    if score > alpha:
+                        alpha = score
+                        if alpha >= beta:
+                            if not board.isCapture(move) and ply < 128:
+                                killers = self._killers[ply]
+                                if killers[0] != move:
+                                    killers[0], killers[1] = move, killers[0]
+                                self._history[move] = self._history.get(move,0)+depth*depth
+                            break
+        finally:
+            self._path.pop()
+        bound = transpositionTable.upper if best <= alphaStart else transpositionTable.lower if best >= beta else transpositionTable.exact
+        self.table.store(key,bestMove,best+ply if best > MATE-1000 else best-ply if best < -MATE+1000 else best,depth,bound)
+        if ply == 0:
+            self._rootMove = bestMove
+        return best
+    def _quiesce(self, board: position, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if self.nodes & 1023 == 0:
+            self._checkLimits()
+        standPat = evaluate(board)
+        if standPat >= beta:
+            return standPat
+        alpha = max(alpha,standPat)
+        for move in self._order(board,board.legalMoves(capturesOnly=True),0,ply):
+            score = -self._quiesce(board.push(move),-beta,-alpha,ply+1)
+            if score >= beta:
+                return score
+            alpha = max(alpha,score)
+        return alpha
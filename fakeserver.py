@@ -0,0 +1,753 @@
+import heapq
+import itertools
+import json
+import multiprocessing
+import queue
+import random
+import re
+import string
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+from urllib.request import urlopen
+
+import engine
+import timemanager
+
+#--------------------------------------------------------------#
+#A local stand-in for lichess.org
+#Implements every endpoint main.py uses, with configurable latency,
+#429 injection and NDJSON streams. The opponent plays random legal
+#moves. /fake/... endpoints let a benchmark drive the server:
+#   POST /fake/game       start a game (color, fen, variant, limit, increment)
+#   POST /fake/challenge  send the bot a challenge (variant, rated, limit, increment, challenger)
+#   GET  /fake/stats      request and 429 counts per endpoint
+#Each account can also have a synthetic history of finished games
+#(history=...), exported with the real ones by /api/games/user
+#Run with: python fakeserver.py [port]
+#--------------------------------------------------------------#
+
+correspondenceClock = 2147483647 #* what lichess sends as the clock of a correspondence game
+
+def _newId() -> str:
+    return "".join(random.choices(string.ascii_letters+string.digits,k=8))
+
+class _fakeGame:
+    def __init__(self, server: "fakeLichess", botColor: str, fen: str, variant: str, limit: int|None, increment: int, days: int|None, gameid: str|None=None, username: str|None=None) -> None:
+        self.id = gameid or _newId()
+        self.server = server
+        self.username = username or server.username #* the bot playing this game
+        self.botColor = botColor
+        self.variant = variant
+        self.initialFen = fen
+        self.board = engine.position(fen,chess960=variant == "chess960")
+        self.moves = []
+        self.status = "started"
+        self.winner = None
+        self.limit, self.increment, self.days = limit, increment, days
+        self.clocks = [limit*1000 if limit is not None else correspondenceClock]*2 #* [white, black], in ms
+        self.turnStarted = time.monotonic()
+        self.createdAt = self.lastMoveAt = int(time.time()*1000)
+        self.clockHistory = [] #* the mover's clock after every move, in centiseconds (as the export sends it)
+        self.events = [] #* gameState and chatLine events, in order
+        self.chat = []
+        self.condition = threading.Condition()
+    def speed(self) -> str:
+        return timemanager.speedOf(self.limit or 0,self.increment,self.limit is None)
+    def botToMove(self) -> bool:
+        return (self.board.turn == engine.WHITE) == (self.botColor == "white")
+    def state(self) -> dict:
+        return {"type": "gameState","moves": " ".join(self.moves),"wtime": self.clocks[0],"btime": self.clocks[1],"winc": self.increment*1000,"binc": self.increment*1000,"status": self.status,**({"winner": self.winner} if self.winner else {})}
+    def full(self) -> dict:
+        bot = {"id": self.username.lower(),"name": self.username,"title": "BOT","rating": 2000}
+        opponent = {"id": "opponent","name": "Opponent","rating": 1500}
+        return {"type": "gameFull","id": self.id,"variant": {"key": self.variant},"speed": self.speed(),"rated": False,
+            "clock": {"initial": self.limit*1000,"increment": self.increment*1000} if self.limit is not None else None,
+            "daysPerTurn": self.days,"white": bot if self.botColor == "white" else opponent,"black": opponent if self.botColor == "white" else bot,
+            "initialFen": "startpos" if self.initialFen in ("startpos",engine.startFen) else self.initialFen,"state": self.state()}
+    def gameInfo(self) -> dict:
+        return {"gameId": self.id,"id": self.id,"color": self.botColor,"fen": self.board.fen(),"variant": {"key": self.variant},"speed": self.speed(),"isMyTurn": self.botToMove()}
+    def exported(self, clocks: bool=False) -> dict:
+        """Gets the game as /api/games/user exports it (moves in SAN)
+        """
+        board, sans = engine.position(self.initialFen,chess960=self.variant == "chess960"), []
+        for uci in self.moves:
+            move = board.parseUci(uci)
+            sans.append(board.toSan(move))
+            board = board.push(move)
+        bot = {"user": {"name": self.username,"id": self.username.lower(),"title": "BOT"},"rating": 2000,"ratingDiff": 0}
+        opponent = {"user": {"name": "Opponent","id": "opponent"},"rating": 1500,"ratingDiff": 0}
+        game = {"id": self.id,"rated": False,"variant": self.variant,"speed": self.speed(),"perf": self.speed(),"createdAt": self.createdAt,"lastMoveAt": self.lastMoveAt,"status": self.status,
+            "players": {"white": bot if self.botColor == "white" else opponent,"black": opponent if self.botColor == "white" else bot},"moves": " ".join(sans)}
+        if self.winner:
+            game["winner"] = self.winner
+        if self.limit is not None:
+            game["clock"] = {"initial": self.limit,"increment": self.increment,"totalTime": self.limit+40*self.increment}
+            if clocks:
+                game["clocks"] = list(self.clockHistory)
+        else:
+            game["daysPerTurn"] = self.days
+        return game
+    def _publish(self, event: dict) -> None: #? call with the condition held
+        self.events.append(event)
+        self.condition.notify_all()
+    def play(self, uci: str, byBot: bool) -> str|None:
+        """Plays a move, returning an error message if it is not allowed
+        """
+        with self.condition:
+            if self.status != "started":
+                return "This game is already over"
+            if byBot != self.botToMove():
+                return "Not your turn, or game already over"
+            try:
+                move = self.board.parseUci(uci)
+            except ValueError:
+                return f"Illegal move {uci}"
+            now = time.monotonic()
+            if self.limit is not None:
+                side = self.board.turn
+                self.clocks[side] = max(0,self.clocks[side]-int((now-self.turnStarted)*1000))+self.increment*1000
+            self.turnStarted = now
+            self.lastMoveAt = int(time.time()*1000)
+            self.clockHistory.append(self.clocks[self.board.turn]//10)
+            self.moves.append(self.board.toUci(move))
+            self.board = self.board.push(move)
+            if not self.board.legalMoves():
+                self.status = "mate" if self.board.inCheck() else "stalemate"
+                self.winner = ("black" if self.board.turn == engine.WHITE else "white") if self.status == "mate" else None
+            elif len(self.moves) >= self.server.maxPlies:
+                self.status = "draw"
+            self._publish(self.state())
+            over = self.status != "started"
+        if over:
+            self.server._finish(self)
+        elif byBot:
+            self.server._scheduleOpponent(self)
+        return None
+    def end(self, status: str, winner: str|None=None) -> None:
+        with self.condition:
+            if self.status != "started":
+                return
+            self.status, self.winner = status, winner
+            self._publish(self.state())
+        self.server._finish(self)
+    def say(self, room: str, username: str, text: str) -> None:
+        with self.condition:
+            line = {"type": "chatLine","room": room,"username": username,"text": text}
+            self.chat.append({"user": username,"text": text})
+            self._publish(line)
+
+class _fakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" #* keep-alive
+    disable_nagle_algorithm = True
+    server: "_fakeHTTPServer"
+    routes = [ #* (method, pattern, handler name, endpoint name for stats)
+        ("GET",r"/api/account","account","account"),
+        ("GET",r"/api/account/email","email","email"),
+        ("POST",r"/api/bot/account/upgrade","upgrade","upgrade"),
+        ("GET",r"/api/stream/event","eventStream","eventStream"),
+        ("GET",r"/api/bot/game/stream/(\w+)","gameStream","gameStream"),
+        ("POST",r"/api/bot/game/(\w+)/move/(\w+)","move","move"),
+        ("POST",r"/api/bot/game/(\w+)/abort","abort","abort"),
+        ("POST",r"/api/bot/game/(\w+)/resign","resign","resign"),
+        ("GET",r"/api/bot/game/(\w+)/chat","getChat","getChat"),
+        ("POST",r"/api/bot/game/(\w+)/chat","writeChat","writeChat"),
+        ("GET",r"/api/challenge","challenges","challenges"),
+        ("POST",r"/api/challenge/ai","challengeAI","challengeAI"),
+        ("POST",r"/api/challenge/open","challengeOpen","challengeOpen"),
+        ("POST",r"/api/challenge/(\w+)/accept","accept","accept"),
+        ("POST",r"/api/challenge/(\w+)/decline","decline","decline"),
+        ("POST",r"/api/challenge/(\w+)/cancel","cancel","cancel"),
+        ("POST",r"/api/challenge/([\w-]+)","challengeUser","challengeUser"),
+        ("GET",r"/api/games/user/([\w-]+)","exportGames","exportGames"),
+        ("POST",r"/fake/game","fakeGame",None),
+        ("POST",r"/fake/challenge","fakeChallenge",None),
+        ("GET",r"/fake/stats","fakeStats",None),
+    ]
+    def log_message(self, *args) -> None: #? silence request logging
+        pass
+    #* plumbing
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length).decode() if length else ""
+        self.params = {key: values[-1] for key, values in (parse_qs(url.query) | parse_qs(body)).items()}
+        fake = self.server.fake
+        for routeMethod, pattern, name, endpoint in self.routes:
+            match = re.fullmatch(pattern,url.path)
+            if routeMethod == method and match:
+                if endpoint is not None:
+                    if not self.headers.get("Authorization","").startswith("Bearer ") or self.headers["Authorization"][7:] in fake.badTokens:
+                        return self._error(401,"No such token")
+                    self.user = fake.userOf(self.headers["Authorization"][7:])
+                    if endpoint == "move" and fake._fault("dropMoves"): #! read, then closed without being played or answered
+                        self.close_connection = True
+                        return
+                    if fake.latency:
+                        time.sleep(fake.latency)
+                    limited = fake.rateLimit and fake._random.random() < fake.rateLimit
+                    fake._count(endpoint,limited)
+                    if limited: #! injected 429
+                        return self._json(429,{"error": "Too many requests. Try again later."},{"Retry-After": str(fake.retryAfter)})
+                return getattr(self,f"_{name}")(*match.groups())
+        self._error(404,"Not found")
+    def do_GET(self) -> None:
+        self._dispatch("GET")
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+    def _json(self, status: int, data, headers: dict={}) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type","application/json")
+        self.send_header("Content-Length",str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name,value)
+        self.end_headers()
+        self.wfile.write(body)
+    def _error(self, status: int, message: str) -> None:
+        self._json(status,{"error": message})
+    def _ok(self) -> None:
+        self._json(200,{"ok": True})
+    def _startStream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type","application/x-ndjson")
+        self.send_header("Transfer-Encoding","chunked")
+        self.end_headers()
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data),data))
+        self.wfile.flush()
+    def _line(self, event: dict|None) -> None:
+        self._chunk(json.dumps(event).encode()+b"\n" if event is not None else b"\n")
+    def _game(self, gameid: str) -> _fakeGame|None:
+        game = self.server.fake.games.get(gameid)
+        return game if game is not None and game.username.lower() == self.user.lower() else None #? another account's game does not exist for this one
+    #* account
+    def _account(self) -> None:
+        fake = self.server.fake
+        playing = [game for game in list(fake.games.values()) if game.status == "started" and game.username.lower() == self.user.lower()]
+        self._json(200,{"id": self.user.lower(),"username": self.user,"title": "BOT",**({"playing": f"{fake.endpoint}/{playing[0].id}/{playing[0].botColor}"} if playing else {})})
+    def _email(self) -> None:
+        self._json(200,{"email": f"{self.user.lower()}@example.com"})
+    def _upgrade(self) -> None:
+        self._ok()
+    #* streams
+    def _eventStream(self) -> None:
+        fake = self.server.fake
+        events, pending = fake._subscribe(self.user)
+        self._startStream()
+        try:
+            for challenge in pending: #? so are challenges still waiting for an answer
+                self._line({"type": "challenge","challenge": challenge})
+            for game in list(fake.games.values()): #? ongoing games are announced on connect, like on lichess
+                if game.status == "started" and game.username.lower() == self.user.lower():
+                    self._line({"type": "gameStart","game": game.gameInfo()})
+            while not fake.stopping.is_set():
+                try:
+                    event = events.get(timeout=fake.keepAlive)
+                except queue.Empty:
+                    event = None #* keep-alive newline
+                if event is fake._closeStream:
+                    break
+                self._line(event)
+            self._chunk(b"")
+        except (BrokenPipeError,ConnectionResetError):
+            pass
+        finally:
+            fake._unsubscribe(events)
+    def _gameStream(self, gameid: str) -> None:
+        game = self._game(gameid)
+        if game is None:
+            return self._error(404,"No such game")
+        fake = self.server.fake
+        try:
+            with game.condition:
+                full, seen = game.full(), len(game.events)
+            self._startStream()
+            self._line(full)
+            if fake._fault("dropStreams"): #! cut off mid-stream
+                self.close_connection = True
+                return
+            over = full["state"]["status"] != "started"
+            while not over and not fake.stopping.is_set():
+                with game.condition:
+                    if len(game.events) == seen:
+                        game.condition.wait(fake.keepAlive)
+                    new = game.events[seen:]
+                    seen += len(new)
+                if not new:
+                    self._line(None) #* keep-alive newline
+                for event in new:
+                    self._line(event)
+                    over = over or (event["type"] == "gameState" and event["status"] != "started")
+            self._chunk(b"")
+        except (BrokenPipeError,ConnectionResetError):
+            pass
+    #* games
+    def _move(self, gameid: str, move: str) -> None:
+        fake = self.server.fake
+        game = self._game(gameid)
+        if game is None:
+            return self._error(404,"No such game")
+        error = game.play(move,byBot=True)
+        if fake._fault("stallMoves"): #! played, but answered late
+            time.sleep(fake.stall)
+            try:
+                self._error(400,error) if error else self._ok()
+            except (BrokenPipeError,ConnectionResetError): #? the client gave up waiting
+                self.close_connection = True
+            return
+        self._error(400,error) if error else self._ok()
+    def _abort(self, gameid: str) -> None:
+        game = self._game(gameid)
+        if game is None:
+            return self._error(404,"No such game")
+        if len(game.moves) >= 2 or game.status != "started":
+            return self._error(400,"This game can no longer be aborted")
+        game.end("aborted")
+        self._ok()
+    def _resign(self, gameid: str) -> None:
+        game = self._game(gameid)
+        if game is None:
+            return self._error(404,"No such game")
+        if game.status != "started":
+            return self._error(400,"This game is already over")
+        game.end("resign","black" if game.botColor == "white" else "white")
+        self._ok()
+    def _getChat(self, gameid: str) -> None:
+        game = self._game(gameid)
+        if game is None:
+            return self._error(404,"No such game")
+        self._json(200,game.chat)
+    def _writeChat(self, gameid: str) -> None:
+        game = self._game(gameid)
+        if game is None:
+            return self._error(404,"No such game")
+        game.say(self.params.get("room","player"),self.user,self.params.get("text",""))
+        self._ok()
+    def _exportGames(self, user: str) -> None:
+        """Streams a user's finished games (synthetic history first, then the ones played here) as NDJSON, batching lines into chunks
+        """
+        fake, params = self.server.fake, self.params
+        since, until = int(params.get("since",0)), int(params.get("until",1 << 62))
+        limit = int(params["max"]) if params.get("max") else None
+        perfs = set(params["perfType"].split(",")) if params.get("perfType") else None
+        rated = None if params.get("rated") is None else params["rated"] == "true"
+        clocks, moves = params.get("clocks") == "true", params.get("moves","true") == "true"
+        drop = fake._fault("dropExports")
+        self._startStream()
+        buffer, sent = b"", 0
+        try:
+            for game in fake._exportedGames(user,since,until,params.get("sort","dateDesc") == "dateAsc",clocks):
+                if (perfs is not None and game["perf"] not in perfs and game["variant"] not in perfs) or (rated is not None and game["rated"] != rated):
+                    continue
+                if not moves:
+                    game.pop("moves",None)
+                buffer += json.dumps(game).encode()+b"\n"
+                sent += 1
+                if len(buffer) >= 65536:
+                    self._chunk(buffer)
+                    buffer = b""
+                    if drop: #! cut off mid-export
+                        self.close_connection = True
+                        return
+                if limit is not None and sent >= limit:
+                    break
+            if buffer:
+                self._chunk(buffer)
+            self._chunk(b"")
+        except (BrokenPipeError,ConnectionResetError):
+            pass
+    #* challenges
+    def _challenges(self) -> None:
+        fake = self.server.fake
+        with fake.lock:
+            challenges = list(fake.challenges.values())
+        self._json(200,{"in": [challenge for challenge in challenges if challenge["direction"] == "in"],"out": [challenge for challenge in challenges if challenge["direction"] == "out"]})
+    def _clockParams(self) -> tuple:
+        params = self.params
+        if params.get("days"):
+            return None, 0, int(params["days"])
+        return int(params.get("clock.limit",180)), int(params.get("clock.increment",0)), None
+    def _challengeUser(self, user: str) -> None:
+        fake = self.server.fake
+        status = fake.refuseChallenges.get(user.lower())
+        if status is not None: #! i.e. a closed account, or one being challenged too often
+            return self._json(status,{"error": f"{user} can't be challenged"},{"Retry-After": str(fake.retryAfter)} if status == 429 else {})
+        limit, increment, days = self._clockParams()
+        challenge = fake._newChallenge("out",self.user.lower(),user.lower(),self.params.get("variant","standard"),self.params.get("rated","false") == "true",limit,increment,days,self.params.get("color","random"),self.params.get("fen","startpos"))
+        if fake.autoAccept: #* the opponent accepts straight away
+            fake._acceptChallenge(challenge["id"])
+        self._json(200,{"challenge": challenge})
+    def _challengeAI(self) -> None:
+        fake = self.server.fake
+        limit, increment, days = self._clockParams()
+        color = self.params.get("color","random")
+        game = fake.startGame(color if color != "random" else random.choice(["white","black"]),self.params.get("fen") or "startpos",self.params.get("variant","standard"),limit,increment,days,username=self.user)
+        self._json(200,{"id": game.id,"variant": {"key": game.variant},"speed": game.speed(),"status": {"name": "started"}})
+    def _challengeOpen(self) -> None:
+        fake = self.server.fake
+        limit, increment, days = self._clockParams()
+        challenge = fake._newChallenge("open",self.user.lower(),None,self.params.get("variant","standard"),self.params.get("rated","false") == "true",limit,increment,days,"random",self.params.get("fen","startpos"))
+        self._json(200,{"challenge": challenge,"urlWhite": f"{challenge['url']}?color=white","urlBlack": f"{challenge['url']}?color=black"})
+    def _accept(self, challengeid: str) -> None:
+        if self.server.fake._acceptChallenge(challengeid) is None:
+            return self._error(404,"No such challenge")
+        self._ok()
+    def _decline(self, challengeid: str) -> None:
+        fake = self.server.fake
+        with fake.lock:
+            challenge = fake.challenges.pop(challengeid,None)
+        if challenge is None:
+            return self._error(404,"No such challenge")
+        fake._publish({"type": "challengeDeclined","challenge": challenge | {"status": "declined","declineReason": self.params.get("reason","declineGeneric")}},fake._challengeUsers(challenge))
+        self._ok()
+    def _cancel(self, challengeid: str) -> None:
+        fake = self.server.fake
+        with fake.lock:
+            challenge = fake.challenges.pop(challengeid,None)
+        if challenge is None:
+            return self._error(404,"No such challenge")
+        fake._publish({"type": "challengeCanceled","challenge": challenge | {"status": "canceled"}},fake._challengeUsers(challenge))
+        self._ok()
+    #* admin
+    def _fakeGame(self) -> None:
+        params = self.params
+        limit = int(params["limit"]) if params.get("limit") else None
+        days = int(params["days"]) if params.get("days") else (None if limit is not None else 3)
+        game = self.server.fake.startGame(params.get("color","white"),params.get("fen","startpos"),params.get("variant","standard"),limit,int(params.get("increment",0)),days,username=params.get("user"))
+        self._json(200,{"id": game.id})
+    def _fakeChallenge(self) -> None:
+        params = self.params
+        fake = self.server.fake
+        limit = int(params["limit"]) if params.get("limit") else None
+        days = int(params["days"]) if params.get("days") else (None if limit is not None else 3)
+        challenge = fake._newChallenge("in",params.get("challenger","opponent"),params.get("user",fake.username).lower(),params.get("variant","standard"),params.get("rated","false") == "true",limit,int(params.get("increment",0)),days,params.get("color","random"),params.get("fen","startpos"),int(params.get("rating",1500)),params.get("title"))
+        self._json(200,{"id": challenge["id"]})
+    def _fakeStats(self) -> None:
+        fake = self.server.fake
+        with fake.lock:
+            self._json(200,{"requests": dict(fake.requests),"rateLimited": dict(fake.rateLimited),"games": len(fake.games),"activeGames": sum([1 for game in fake.games.values() if game.status == "started"])})
+
+class _fakeHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 4096 #? the default backlog of 5 drops connections under load
+    def handle_error(self, request, client_address) -> None:
+        if not isinstance(sys.exc_info()[1],(ConnectionResetError,BrokenPipeError)): #? a client that went away (i.e. a killed worker) is not an error
+            super().handle_error(request,client_address)
+
+class fakeLichess:
+    _closeStream = object()
+    def __init__(self, host: str="127.0.0.1", port: int=0, *, username: str="FakeBot", latency: float=0.0, rateLimit: float=0.0, retryAfter: float=1, opponentDelay: float=0.0, maxPlies: int=60, keepAlive: float=6.0, autoAccept: bool=True, refuseChallenges: dict={}, badTokens: list=[], tokenUsers: bool=False, dropMoves: int=0, dropStreams: int=0, dropExports: int=0, stallMoves: int=0, stall: float=2.0, history: int=0, seed: int|None=None) -> None:
+        """A local stand-in for lichess.org, served on a background thread
+
+        Args:
+            host (str, optional): The address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): The port to listen on, 0 for any free port. Defaults to 0.
+            username (str, optional): The bot's username. Defaults to "FakeBot".
+            latency (float, optional): Added to every API request, in seconds. Defaults to 0.
+            rateLimit (float, optional): The chance of answering an API request with a 429. Defaults to 0.
+            retryAfter (float, optional): The Retry-After of injected 429s, in seconds. Defaults to 1.
+            opponentDelay (float, optional): How long the opponent thinks, in seconds. Defaults to 0.
+            maxPlies (int, optional): Games are drawn after this many plies. Defaults to 60.
+            keepAlive (float, optional): How often idle streams get a keep-alive newline, in seconds. Defaults to 6.
+            autoAccept (bool, optional): If challenges sent by the bot are accepted straight away. Defaults to True.
+            refuseChallenges (dict, optional): Users whose challenges are answered with this status instead (i.e. {"closed": 400,"busy": 429}). Defaults to {}.
+            badTokens (list, optional): Tokens answered with 401. Defaults to [].
+            tokenUsers (bool, optional): If every token is its own bot account, named after the token (i.e. to test several accounts at once). Defaults to False.
+            dropMoves (int, optional): How many moves have their connection closed once the request is read, without being played or answered. Defaults to 0.
+            dropStreams (int, optional): How many game streams have their connection closed right after the gameFull, without ending the stream. Defaults to 0.
+            dropExports (int, optional): How many game exports have their connection closed after their first chunk, without ending the stream. Defaults to 0.
+            stallMoves (int, optional): How many moves are played but only answered after stall seconds. Defaults to 0.
+            stall (float, optional): How long stalled moves wait for their answer, in seconds. Defaults to 2.
+            history (int, optional): How many finished games every account has already played, one a minute up to when the server started. They are generated as they are exported, so any number costs no memory. Defaults to 0.
+            seed (int, optional): Seeds the opponent's moves, the injected 429s and the history. Defaults to None.
+        """
+        self.username = username
+        self.latency = latency
+        self.rateLimit = rateLimit
+        self.retryAfter = retryAfter
+        self.opponentDelay = opponentDelay
+        self.maxPlies = maxPlies
+        self.keepAlive = keepAlive
+        self.autoAccept = autoAccept
+        self.refuseChallenges = {user.lower(): status for user, status in refuseChallenges.items()}
+        self.badTokens = badTokens
+        self.tokenUsers = tokenUsers
+        self.faults = {"dropMoves": dropMoves,"dropStreams": dropStreams,"dropExports": dropExports,"stallMoves": stallMoves} #* how many of each fault are left to inject
+        self.stall = stall
+        self.history = history
+        self.seed = seed
+        self.historyEnd = int(time.time()*1000) #* when the last history game was created, in ms
+        self._openings = None #* SAN move lists the history games are cut from
+        self.games = {}
+        self.challenges = {}
+        self.requests = {}
+        self.rateLimited = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self._random = random.Random(seed)
+        self._subscribers = []
+        self._replies = [] #* heap of (time, order, game) for the opponent
+        self._order = itertools.count()
+        self._opponentWake = threading.Condition()
+        self.server = _fakeHTTPServer((host,port),_fakeHandler)
+        self.server.fake = self
+        self.endpoint = f"http://{host}:{self.server.server_address[1]}"
+        self._threads = [threading.Thread(target=self.server.serve_forever,daemon=True),threading.Thread(target=self._opponent,daemon=True)]
+    def start(self) -> "fakeLichess":
+        for thread in self._threads:
+            thread.start()
+        return self
+    def stop(self) -> None:
+        self.stopping.set()
+        with self.lock:
+            for _, events in self._subscribers:
+                events.put(self._closeStream)
+        with self._opponentWake:
+            self._opponentWake.notify_all()
+        for game in list(self.games.values()):
+            with game.condition:
+                game.condition.notify_all()
+        self.server.shutdown()
+        self.server.server_close()
+    def __enter__(self) -> "fakeLichess":
+        return self.start()
+    def __exit__(self, *exc) -> None:
+        self.stop()
+    def startGame(self, color: str="white", fen: str="startpos", variant: str="standard", limit: int|None=180, increment: int=0, days: int|None=None, gameid: str|None=None, username: str|None=None) -> _fakeGame:
+        """Starts a game and announces it on the event stream
+
+        Args:
+            color (str, optional): The bot's color. Defaults to "white".
+            fen (str, optional): The starting position. Defaults to "startpos".
+            variant (str, optional): The variant (standard, chess960 or fromPosition). Defaults to "standard".
+            limit (int, optional): The initial clock in seconds, or None for correspondence. Defaults to 180.
+            increment (int, optional): The increment in seconds. Defaults to 0.
+            days (int, optional): Days per move of a correspondence game. Defaults to None.
+            gameid (str, optional): The ID of the game (a game started from a challenge has the challenge's ID). Defaults to a random ID.
+            username (str, optional): The bot playing the game. Defaults to the server's username.
+
+        Returns:
+            _fakeGame: The game
+        """
+        game = _fakeGame(self,color,fen,variant,limit,increment,days,gameid,username)
+        with self.lock:
+            self.games[game.id] = game
+        self._publish({"type": "gameStart","game": game.gameInfo()},[game.username])
+        if not game.botToMove():
+            self._scheduleOpponent(game)
+        return game
+    #* internals
+    def _count(self, endpoint: str, limited: bool) -> None:
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint,0)+1
+            if limited:
+                self.rateLimited[endpoint] = self.rateLimited.get(endpoint,0)+1
+    def _fault(self, name: str) -> bool:
+        with self.lock:
+            if self.faults[name] <= 0:
+                return False
+            self.faults[name] -= 1
+            return True
+    def userOf(self, token: str) -> str:
+        return token if self.tokenUsers else self.username
+    def _subscribe(self, user: str) -> tuple:
+        """Subscribes to a user's events, returning the queue and the challenges already pending for them (taken under the same lock, so none slip between the two)
+        """
+        events = queue.Queue()
+        with self.lock:
+            self._subscribers.append((user.lower(),events))
+            pending = [challenge for challenge in self.challenges.values() if challenge["direction"] != "open" and user.lower() in [other.lower() for other in self._challengeUsers(challenge) if other]]
+        return events, pending
+    def _unsubscribe(self, events: queue.Queue) -> None:
+        with self.lock:
+            self._subscribers = [(user, subscribed) for user, subscribed in self._subscribers if subscribed is not events]
+    def _publish(self, event: dict, users: list) -> None:
+        users = {user.lower() for user in users if user}
+        with self.lock:
+            for user, events in self._subscribers:
+                if user in users:
+                    events.put(event)
+    def _finish(self, game: _fakeGame) -> None:
+        self._publish({"type": "gameFinish","game": game.gameInfo() | {"status": {"name": game.status},"winner": game.winner}},[game.username])
+    def _exportedGames(self, user: str, since: int, until: int, ascending: bool, clocks: bool):
+        """Yields a user's finished games created between since and until (inclusive, in ms), as /api/games/user exports them
+        """
+        spacing = 60000
+        first = max(0,self.history-(self.historyEnd-since)//spacing) #? history game i was created at historyEnd-(history-i)*spacing
+        last = min(self.history-1,self.history+(until-self.historyEnd)//spacing)
+        with self.lock:
+            played = sorted([game for game in self.games.values() if game.username.lower() == user.lower() and game.status != "started" and since <= game.createdAt <= until],key=lambda game: game.createdAt)
+        history = range(first,last+1) if ascending else range(last,first-1,-1)
+        if not ascending:
+            for game in reversed(played):
+                yield game.exported(clocks)
+        for index in history:
+            yield self._historyGame(user,index,clocks)
+        if ascending:
+            for game in played:
+                yield game.exported(clocks)
+    def _historyGame(self, user: str, index: int, clocks: bool) -> dict:
+        """Makes up a user's index-th finished game (the same one every time)
+        """
+        if self._openings is None:
+            generator, openings = random.Random(0), []
+            for _ in range(24):
+                board, sans = engine.position(), []
+                while len(sans) < 120 and (moves := board.legalMoves()):
+                    move = generator.choice(moves)
+                    sans.append(board.toSan(move))
+                    board = board.push(move)
+                openings.append(sans)
+            self._openings = openings
+        generator = random.Random(f"{user.lower()}/{index}/{self.seed}")
+        limit, increment = generator.choice([(60,0),(180,0),(180,2),(300,3),(600,0),(900,10),(1800,0),(None,None)])
+        speed = timemanager.speedOf(limit or 0,increment or 0,limit is None)
+        variant = generator.choices(["standard","chess960","fromPosition"],weights=[8,1,1])[0]
+        status = generator.choices(["mate","resign","outoftime","draw","stalemate","timeout","aborted"],weights=[3,5,2,3,1,1,1])[0]
+        moves = generator.choice(self._openings)[:generator.randint(10,120) if status != "aborted" else generator.randint(0,1)] #? an aborted game ends before both sides moved
+        winner = None if status in ("draw","stalemate","aborted") else generator.choice(["white","black"])
+        botColor = generator.choice(["white","black"])
+        rating, opponentRating = generator.randint(1800,2200), generator.randint(1200,2600)
+        diff = 0 if winner is None else (generator.randint(3,12) if winner == botColor else -generator.randint(3,12))
+        bot = {"user": {"name": user,"id": user.lower(),"title": "BOT"},"rating": rating,"ratingDiff": diff}
+        opponentName = f"opponent{generator.randrange(500)}"
+        opponent = {"user": {"name": opponentName,"id": opponentName},"rating": opponentRating,"ratingDiff": -diff}
+        createdAt = self.historyEnd-(self.history-index)*60000
+        game = {"id": f"h{index:07d}","rated": generator.random() < 0.7,"variant": variant,"speed": speed,"perf": variant if variant == "chess960" else speed,"createdAt": createdAt,"lastMoveAt": createdAt+len(moves)*1500,"status": status,
+            "players": {"white": bot if botColor == "white" else opponent,"black": opponent if botColor == "white" else bot},"moves": " ".join(moves)}
+        if winner is not None:
+            game["winner"] = winner
+        if limit is not None:
+            game["clock"] = {"initial": limit,"increment": increment,"totalTime": limit+40*increment}
+            if clocks:
+                remaining = [limit*100,limit*100]
+                game["clocks"] = []
+                for ply in range(len(moves)):
+                    remaining[ply % 2] = max(0,remaining[ply % 2]-generator.randint(0,limit*5)+increment*100)
+                    game["clocks"].append(remaining[ply % 2])
+        else:
+            game["daysPerTurn"] = generator.choice([1,2,3,5,7,14])
+        return game
+    def _challengeUsers(self, challenge: dict) -> list:
+        return [(challenge["challenger"] or {}).get("id"),(challenge["destUser"] or {}).get("id")]
+    def _newChallenge(self, direction: str, challenger: str|None, dest: str|None, variant: str, rated: bool, limit: int|None, increment: int, days: int|None, color: str, fen: str, rating: int=1500, title: str|None=None) -> dict:
+        challengeid = _newId()
+        challenge = {"id": challengeid,"url": f"{self.endpoint}/{challengeid}","status": "created","direction": direction,
+            "challenger": {"id": challenger,"name": challenger,"rating": rating,"title": title} if challenger else None,
+            "destUser": {"id": dest,"name": dest} if dest else None,"variant": {"key": variant},"rated": rated,
+            "speed": timemanager.speedOf(limit or 0,increment,limit is None),
+            "timeControl": {"type": "clock","limit": limit,"increment": increment} if limit is not None else {"type": "correspondence","daysPerTurn": days},
+            "color": color,"initialFen": fen}
+        with self.lock:
+            self.challenges[challengeid] = challenge
+        if direction != "open":
+            self._publish({"type": "challenge","challenge": challenge},self._challengeUsers(challenge))
+        return challenge
+    def _acceptChallenge(self, challengeid: str) -> _fakeGame|None:
+        with self.lock:
+            challenge = self.challenges.pop(challengeid,None)
+        if challenge is None:
+            return None
+        color = challenge["color"] if challenge["color"] != "random" else random.choice(["white","black"])
+        if challenge["direction"] == "in": #? the challenge's color is the challenger's
+            color = "black" if color == "white" else "white"
+        control = challenge["timeControl"]
+        bot = challenge["destUser"]["id"] if challenge["direction"] == "in" else challenge["challenger"]["id"]
+        return self.startGame(color,challenge["initialFen"] or "startpos",challenge["variant"]["key"],control.get("limit"),control.get("increment",0),control.get("daysPerTurn"),challengeid,bot)
+    def _scheduleOpponent(self, game: _fakeGame) -> None:
+        with self._opponentWake:
+            heapq.heappush(self._replies,(time.monotonic()+self.opponentDelay,next(self._order),game))
+            self._opponentWake.notify()
+    def _opponent(self) -> None:
+        """Plays a random legal move for the opponent of every game, opponentDelay after the bot moves
+        """
+        while not self.stopping.is_set():
+            with self._opponentWake:
+                while not self._replies and not self.stopping.is_set():
+                    self._opponentWake.wait()
+                if self.stopping.is_set():
+                    return
+                due, _, game = self._replies[0]
+                wait = due-time.monotonic()
+                if wait > 0:
+                    self._opponentWake.wait(wait)
+                    continue
+                heapq.heappop(self._replies)
+            with game.condition:
+                moves = game.board.legalMoves() if game.status == "started" and not game.botToMove() else []
+                uci = game.board.toUci(self._random.choice(moves)) if moves else None
+            if uci is not None:
+                game.play(uci,byBot=False)
+
+#* driving a running server (i.e. one started with spawn) over HTTP
+def _admin(endpoint: str, path: str, params: dict|None=None) -> dict:
+    with urlopen(f"{endpoint}{path}",data=urlencode(params).encode() if params is not None else None) as response:
+        return json.loads(response.read())
+
+def remoteGame(endpoint: str, **params) -> str:
+    """Starts a game on a running fake server
+
+    Args:
+        endpoint (str): The server's endpoint
+        **params: user (the bot playing it), color, fen, variant, limit, increment or days (see fakeLichess.startGame)
+
+    Returns:
+        str: The ID of the game
+    """
+    return _admin(endpoint,"/fake/game",params)["id"]
+
+def remoteChallenge(endpoint: str, **params) -> str:
+    """Sends the bot a challenge on a running fake server
+
+    Args:
+        endpoint (str): The server's endpoint
+        **params: user (the bot challenged), challenger, rating, title, variant, rated, color, fen, limit, increment or days
+
+    Returns:
+        str: The ID of the challenge
+    """
+    return _admin(endpoint,"/fake/challenge",params)["id"]
+
+def remoteStats(endpoint: str) -> dict:
+    """Gets the request and 429 counts per endpoint of a running fake server
+    """
+    return _admin(endpoint,"/fake/stats")
+
+def _serve(connection, options: dict) -> None:
+    server = fakeLichess(**options).start()
+    connection.send(server.endpoint)
+    connection.recv() #* wait for the parent to ask us to stop
+    server.stop()
+
+@contextmanager
+def spawn(**options):
+    """Runs a fakeLichess in a child process, so its work does not compete with the client for the GIL
+
+    Args:
+        **options: The fakeLichess options
+
+    Yields:
+        str: The endpoint of the server
+    """
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_serve,args=(child,options),daemon=True)
+    process.start()
+    try:
+        yield parent.recv()
+    finally:
+        parent.send(None)
+        process.join(5)
+        if process.is_alive():
+            process.terminate()
+
+if __name__ == "__main__":
+    server = fakeLichess(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8080).start()
+    print(f"Fake lichess running on {server.endpoint} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
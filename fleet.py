@@ -0,0 +1,208 @@
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+
+import metrics
+from main import botRuntime, challengeRules, engineHandler, lichessAccount, loadTokens
+
+#--------------------------------------------------------------#
+#Runs a fleet of bot accounts across a process pool
+#Searching is CPU bound and holds the GIL, so every worker process
+#plays its own shard of accounts on its own core.
+#Run with: python fleet.py (tokens from LICHESS_TOKENS or accounts.json)
+#--------------------------------------------------------------#
+
+def shard(tokens: list, workers: int) -> list:
+    """Splits tokens round-robin into one shard per worker (workers with no tokens are dropped)
+
+    Args:
+        tokens (list): The tokens
+        workers (int): How many workers there are
+
+    Returns:
+        list: A list of tokens per worker
+    """
+    return [shard for shard in [tokens[index::workers] for index in range(workers)] if shard]
+
+def _runShard(index: int, tokens: list, options: dict, pipe) -> None:
+    """Plays every account of a shard until the supervisor sends "stop" down its pipe, sending a report per account every reportInterval seconds
+    """
+    played, lock = {}, threading.Lock()
+    def counted(name: str) -> type:
+        class handler(options["handler"]): #* counts the games each account finishes
+            def play(self) -> None:
+                try:
+                    super().play()
+                finally:
+                    with lock:
+                        played[name] += 1
+        return handler
+    shards = [] #* (username, account, runtime, thread)
+    for token in tokens:
+        account = lichessAccount(token,options["endpoint"],poolSize=options["maxGames"]+4,metrics=metrics.requestMetrics())
+        name = account.accountinfo["username"]
+        played[name] = 0
+        runtime = botRuntime(account,counted(name),maxGames=options["maxGames"],acceptChallenge=challengeRules(**options["rules"]) if options["rules"] is not None else None)
+        thread = threading.Thread(target=runtime.run,name=f"runtime-{name}",daemon=True)
+        shards.append((name,account,runtime,thread))
+        thread.start()
+    def report() -> None:
+        for name, account, runtime, thread in shards:
+            recorder = account.metrics.snapshot()
+            with lock:
+                games = played[name]
+            pipe.send({"worker": index,"pid": os.getpid(),"username": name,"active": len(runtime.games),"played": games,
+                "requests": sum([endpoint["latency"]["count"] for endpoint in recorder["endpoints"].values()]),
+                "rateLimited": sum([endpoint["rateLimited"] for endpoint in recorder["endpoints"].values()]),
+                "moves": recorder["moveLatency"]["count"],"moveP50": recorder["moveLatency"]["p50"],"moveP99": recorder["moveLatency"]["p99"],
+                "triage": runtime.triage.stats(),"at": time.time()})
+    crashed = False
+    while not pipe.poll(options["reportInterval"]): #? a message instead of a shared Event, as a killed worker can die holding its lock
+        report()
+        if not all([thread.is_alive() for _, _, _, thread in shards]): #! a runtime died, so let the supervisor restart the whole shard
+            crashed = True
+            break
+    for _, _, runtime, _ in shards:
+        runtime.stop()
+    for _, account, _, thread in shards:
+        thread.join()
+        account.close()
+    report()
+    if crashed:
+        raise SystemExit(1)
+
+class fleetSupervisor:
+    def __init__(self, tokens: list, endpoint: str="https://lichess.org", *, workers: int|None=None, handler: type=engineHandler, maxGames: int=4, rules: dict|None=None, reportInterval: float=1.0, restartDelay: float=1.0, maxRestarts: int=10) -> None:
+        """Shards bot accounts across worker processes, restarts crashed workers and collects their stats
+
+        Args:
+            tokens (list): The token of every account (see main.loadTokens)
+            endpoint (str, optional): The endpoint of the lichess api. Defaults to "https://lichess.org".
+            workers (int, optional): How many worker processes to run. Defaults to one per core (never more than there are tokens).
+            handler (type, optional): The gameHandler class every account plays with. It must be importable by the workers. Defaults to engineHandler.
+            maxGames (int, optional): How many games each account plays at once. Defaults to 4.
+            rules (dict, optional): The challengeRules arguments every account answers challenges with (i.e. {"variants": ["standard"]}). Defaults to accepting every challenge.
+            reportInterval (float, optional): How often workers send their stats, in seconds. Defaults to 1.
+            restartDelay (float, optional): How long to wait before restarting a crashed worker, in seconds. Doubles with every restart of the same worker. Defaults to 1.
+            maxRestarts (int, optional): How many times a worker is restarted before its shard is given up on. Defaults to 10.
+        """
+        self.shards = shard(list(tokens),min(workers or os.cpu_count() or 1,len(tokens)))
+        self.options = {"endpoint": endpoint,"handler": handler,"maxGames": maxGames,"rules": rules,"reportInterval": reportInterval}
+        self.restartDelay = restartDelay
+        self.maxRestarts = maxRestarts
+        self.restarts = [0]*len(self.shards)
+        self.reports = {} #* (username, pid): latest report, so a restarted worker does not erase what it played before
+        self._context = multiprocessing.get_context("spawn") #? workers are started while the supervisor's threads run, and forking could copy their held locks
+        self._stopping = threading.Event()
+        self._processes = [None]*len(self.shards)
+        self._pipes = [None]*len(self.shards) #? one duplex pipe per worker, so killing a worker can't break a lock the others share
+        self._restartAt = [0.0]*len(self.shards)
+        self._lock = threading.Lock()
+        self._collecting = threading.Lock()
+    def _start(self, index: int) -> None:
+        supervisorEnd, workerEnd = self._context.Pipe()
+        process = self._context.Process(target=_runShard,args=(index,self.shards[index],self.options,workerEnd),name=f"lichess-shard-{index}",daemon=True)
+        process.start()
+        workerEnd.close() #* so the pipe reports EOF once the worker exits
+        self._processes[index] = process
+        self._pipes[index] = supervisorEnd
+    def start(self) -> None:
+        for index in range(len(self.shards)):
+            self._start(index)
+    def run(self) -> None:
+        """Starts every worker, then supervises them until stop() is called or every shard is given up on
+        """
+        self.start()
+        while not self._stopping.is_set():
+            self._collect(0.2)
+            if not self._supervise():
+                break
+        self._collect(0)
+    def _collect(self, timeout: float) -> None:
+        with self._collecting: #? run() and stop() both read the pipes
+            pipes = [pipe for pipe in self._pipes if pipe is not None]
+            if not pipes:
+                time.sleep(timeout)
+                return
+            for pipe in multiprocessing.connection.wait(pipes,timeout):
+                try:
+                    while pipe.poll(): #? drain whatever else is there without waiting
+                        report = pipe.recv()
+                        with self._lock:
+                            self.reports[(report["username"],report["pid"])] = report
+                except (EOFError,OSError): #* the worker exited
+                    self._pipes[self._pipes.index(pipe)] = None
+                    pipe.close()
+    def _supervise(self) -> bool:
+        """Restarts crashed workers
+
+        Returns:
+            bool: False once every shard has been given up on
+        """
+        now = time.monotonic()
+        running = False
+        for index, process in enumerate(self._processes):
+            if process is not None and process.is_alive():
+                running = True
+                continue
+            if self._stopping.is_set() or self.restarts[index] >= self.maxRestarts:
+                continue
+            running = True
+            if process is not None: #* it died, so schedule a restart
+                self._processes[index] = None
+                self._restartAt[index] = now+self.restartDelay*2**self.restarts[index]
+                self.restarts[index] += 1
+                if __debug__:
+                    print(f"Shard {index} exited with code {process.exitcode}, restarting")
+            elif now >= self._restartAt[index]:
+                self._start(index)
+        return running
+    def stop(self, timeout: float=30) -> None:
+        """Asks every worker to stop after its games' current moves, and waits for them
+        """
+        self._stopping.set()
+        for pipe in list(self._pipes):
+            if pipe is not None:
+                try:
+                    pipe.send("stop")
+                except OSError: #* it already exited
+                    pass
+        deadline = time.monotonic()+timeout
+        while any([process is not None and process.is_alive() for process in self._processes]) and time.monotonic() < deadline:
+            self._collect(0.1) #* keep reading, so no worker blocks sending its last report
+        for process in self._processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+        self._collect(0)
+    def stats(self) -> dict:
+        """Gets the latest stats of every account, added up over the restarts of its worker
+
+        Returns:
+            dict: {"accounts": {username: {"worker", "pid" (of the worker process), "active", "played", "requests", "rateLimited", "moves", "moveP99", "triage"}}, "total": {"accounts", "active", "played", "requests", "rateLimited", "moves"}, "restarts": list}
+        """
+        with self._lock:
+            reports = sorted(self.reports.values(),key=lambda report: report["at"])
+        accounts = {}
+        for report in reports: #* oldest first, so the latest report of each account wins the gauges
+            account = accounts.setdefault(report["username"],{"played": 0,"requests": 0,"rateLimited": 0,"moves": 0})
+            account.update({key: report[key] for key in ("worker","pid","active","moveP50","moveP99","triage")})
+        for report in reports: #* counters are added up over every worker process the account ran in
+            for key in ("played","requests","rateLimited","moves"):
+                accounts[report["username"]][key] += report[key]
+        total = {"accounts": len(accounts),**{key: sum([account[key] for account in accounts.values()]) for key in ("active","played","requests","rateLimited","moves")}}
+        return {"accounts": accounts,"total": total,"restarts": list(self.restarts)}
+
+if __name__ == "__main__":
+    supervisor = fleetSupervisor(loadTokens(),rules={"variants": ["standard","chess960","fromPosition"]})
+    thread = threading.Thread(target=supervisor.run,daemon=True)
+    thread.start()
+    try:
+        while thread.is_alive():
+            time.sleep(10)
+            print(supervisor.stats()["total"])
+    except KeyboardInterrupt:
+        print("Stopping")
+    finally:
+        supervisor.stop()
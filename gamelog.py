@@ -0,0 +1,383 @@
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import engine
+
+#--------------------------------------------------------------#
+#Append-only binary game logs, one file per game
+#Every streamed event and every move we send is appended as it
+#happens, so a crashed bot can pick its games back up from disk
+#Header: magic (8 bytes), then records, big-endian:
+#   m move (u16)                    a move of the game
+#   s ply (u16), move (u16)         a move we sent
+#   u ply (u16)                     moves were taken back down to ply
+#   t wtime (u32), btime (u32)      the clocks, in milliseconds
+#   k ply (u16), crc32 (u32)        a checkpoint of the moves so far
+#   e length (u32), json            any other event (gameFull without its state, chat, status changes)
+#Run with: python gamelog.py <log> [movetime] (replays a game through the engine)
+#--------------------------------------------------------------#
+
+magic = b"LCGLOG01"
+moveRecord = struct.Struct(">cH")
+sentRecord = struct.Struct(">cHH")
+undoRecord = struct.Struct(">cH")
+clockRecord = struct.Struct(">cII")
+checkpointRecord = struct.Struct(">cHI")
+eventRecord = struct.Struct(">cI")
+_clockLimit = (1 << 32)-1
+
+def encodeMove(uci: str) -> int:
+    """Packs a UCI move into 16 bits: from | to << 6 | promotion << 12, with bit 15 set for drops (from is then the piece)
+
+    Args:
+        uci (str): The move (i.e. e2e4, e7e8q, N@f3)
+
+    Raises:
+        ValueError: Raises if the move is invalid
+
+    Returns:
+        int: The move
+    """
+    try:
+        if uci[1] == "@": #? a crazyhouse drop
+            return engine.pieceLetters.index(uci[0].lower()) | (engine.squareNames.index(uci[2:4]) << 6) | 1 << 15
+        frm, to = engine.squareNames.index(uci[0:2]), engine.squareNames.index(uci[2:4])
+        promotion = engine.pieceLetters.index(uci[4]) if len(uci) > 4 else 0
+    except (ValueError,IndexError):
+        raise ValueError(f"Invalid move {uci}")
+    return frm | (to << 6) | (promotion << 12)
+
+def decodeMove(move: int) -> str:
+    """Unpacks a move packed by encodeMove
+
+    Args:
+        move (int): The move
+
+    Returns:
+        str: The move (UCI)
+    """
+    frm, to, promotion = move & 63, (move >> 6) & 63, (move >> 12) & 7
+    if move >> 15:
+        return f"{engine.pieceLetters[frm].upper()}@{engine.squareNames[to]}"
+    return engine.squareNames[frm]+engine.squareNames[to]+(engine.pieceLetters[promotion] if promotion else "")
+
+def _crc(moves: list, start: int=0, crc: int=0) -> int:
+    for ply in range(start,len(moves)):
+        crc = zlib.crc32(((" " if ply else "")+moves[ply]).encode(),crc)
+    return crc
+
+class gameLog:
+    def __init__(self, path: str) -> None:
+        """Reads a game log, memory-mapped from disk. A torn record at the end (the bot died mid-write) is ignored, as is everything after a checkpoint that does not match the moves before it
+
+        Args:
+            path (str): The path of the log
+
+        Raises:
+            ValueError: Raises if the file is not a game log
+            FileNotFoundError: Raises if the file does not exist
+        """
+        self.path = path
+        self._reset()
+        with open(path,"rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            if size < len(magic):
+                if size:
+                    raise ValueError("Invalid game log")
+                return
+            with mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ) as data:
+                if data[:len(magic)] != magic: #! check the header
+                    raise ValueError("Invalid game log")
+                self._parse(data,size)
+    def _reset(self) -> None:
+        self.full = None #* the gameFull event, without its state
+        self.moves = [] #* UCI
+        self.sent = [] #* (ply, UCI) of every move we sent
+        self.clocks = (None,None) #* (wtime, btime) in milliseconds
+        self.extra = {} #* the latest gameState fields other than moves and clocks (status, winc, wdraw, ...)
+        self.events = [] #* every other event, in order
+        self.checkpoints = [] #* (ply, offset just past the checkpoint)
+        self.validLength = len(magic) #* where the last intact record ends
+    def _parse(self, data: mmap.mmap, size: int) -> None:
+        offset, crc, checked = len(magic), 0, 0 #? crc covers moves[:checked]
+        while offset < size:
+            kind = data[offset:offset+1]
+            try:
+                if kind == b"m":
+                    _, move = moveRecord.unpack_from(data,offset)
+                    self.moves.append(decodeMove(move))
+                    offset += moveRecord.size
+                elif kind == b"s":
+                    _, ply, move = sentRecord.unpack_from(data,offset)
+                    self.sent.append((ply,decodeMove(move)))
+                    offset += sentRecord.size
+                elif kind == b"u":
+                    _, ply = undoRecord.unpack_from(data,offset)
+                    del self.moves[ply:]
+                    if checked > ply:
+                        crc, checked = _crc(self.moves), ply
+                    offset += undoRecord.size
+                elif kind == b"t":
+                    _, wtime, btime = clockRecord.unpack_from(data,offset)
+                    self.clocks = (wtime,btime)
+                    offset += clockRecord.size
+                elif kind == b"k":
+                    _, ply, expected = checkpointRecord.unpack_from(data,offset)
+                    crc, checked = _crc(self.moves[:ply],checked,crc), ply
+                    if ply != len(self.moves) or crc != expected: #! the moves since the last checkpoint are corrupt
+                        self._rewind(data)
+                        return
+                    offset += checkpointRecord.size
+                    self.checkpoints.append((ply,offset))
+                elif kind == b"e":
+                    _, length = eventRecord.unpack_from(data,offset)
+                    if offset+eventRecord.size+length > size:
+                        break
+                    event = json.loads(data[offset+eventRecord.size:offset+eventRecord.size+length])
+                    offset += eventRecord.size+length
+                    self._onEvent(event)
+                else: #! not a record, so the rest can't be trusted
+                    break
+            except (struct.error,ValueError,IndexError): #? a torn record at the end, or garbage
+                break
+            self.validLength = offset
+    def _rewind(self, data: mmap.mmap) -> None:
+        """Re-reads the log up to its last good checkpoint
+        """
+        end = self.checkpoints[-1][1] if self.checkpoints else len(magic)
+        self._reset()
+        self._parse(data,end)
+    def _onEvent(self, event: dict) -> None:
+        kind = event.get("type")
+        if kind == "gameFull":
+            self.full = event
+        elif kind == "gameState":
+            self.extra = {key: value for key, value in event.items() if key != "type"}
+        else:
+            self.events.append(event)
+    @property
+    def ply(self) -> int:
+        return len(self.moves)
+    @property
+    def status(self) -> str:
+        return self.extra.get("status","started")
+    @property
+    def finished(self) -> bool:
+        return self.status not in ("created","started")
+    def state(self) -> dict:
+        """Rebuilds the latest gameState event
+
+        Returns:
+            dict: The gameState, as lichess streams it
+        """
+        state = {"type": "gameState","moves": " ".join(self.moves)}
+        if self.clocks[0] is not None:
+            state |= {"wtime": self.clocks[0],"btime": self.clocks[1]}
+        return state | self.extra
+    def gameFull(self) -> dict|None:
+        """Rebuilds the latest gameFull event
+
+        Returns:
+            dict | None: The gameFull, as lichess streams it, or None if it was never logged
+        """
+        return self.full | {"state": self.state()} if self.full is not None else None
+
+class gameLogWriter:
+    def __init__(self, path: str, *, checkpointEvery: int=16, fsync: bool=False) -> None:
+        """Appends a game's events to its log. An existing log is read back, its torn end cut off, and appended to
+
+        Args:
+            path (str): The path of the log
+            checkpointEvery (int, optional): How many plies between checkpoints. Defaults to 16.
+            fsync (bool, optional): If checkpoints are flushed to the disk. Every record reaches the OS as it is written, which survives the bot crashing; this also survives the machine crashing. Defaults to False.
+
+        Raises:
+            ValueError: Raises if the file exists but is not a game log
+        """
+        self.path = path
+        self.checkpointEvery = checkpointEvery
+        self.fsync = fsync
+        self.recovered = gameLog(path) if os.path.exists(path) else None #* what a previous run logged
+        log = self.recovered
+        self.moves = list(log.moves) if log is not None else []
+        self.clocks = log.clocks if log is not None else (None,None)
+        self.extra = dict(log.extra) if log is not None else {}
+        self.full = log.full if log is not None else None
+        self.finished = log.finished if log is not None else False
+        self._checkpointed = log.checkpoints[-1][0] if log is not None and log.checkpoints else 0
+        self._file = open(path,"r+b" if log is not None else "wb",buffering=0) #? unbuffered, so every record reaches the OS straight away
+        if log is not None:
+            self._file.truncate(log.validLength) #* cut off a torn record
+            self._file.seek(log.validLength)
+        else:
+            self._file.write(magic)
+    @property
+    def ply(self) -> int:
+        return len(self.moves)
+    def record(self, event: dict) -> None:
+        """Logs an event from the game's stream. Moves already logged are not written again, so a reconnect only appends what changed
+
+        Args:
+            event (dict): The event
+        """
+        kind = event.get("type")
+        if kind == "gameFull":
+            full = {key: value for key, value in event.items() if key != "state"}
+            records = [self._event(full)] if full != self.full else []
+            self.full = full
+            self._write(records+self._state(event["state"]))
+        elif kind == "gameState":
+            self._write(self._state(event))
+        else:
+            self._write([self._event(event)])
+    def sent(self, move: str) -> None:
+        """Logs a move we sent
+
+        Args:
+            move (str): The move (UCI)
+        """
+        self._write([sentRecord.pack(b"s",self.ply,encodeMove(move))])
+    def _state(self, state: dict) -> list:
+        records = []
+        moves = state.get("moves","").split()
+        known = len(self.moves)
+        if len(moves) < known or (known and moves[known-1] != self.moves[-1]): #* a takeback
+            common = 0
+            while common < min(len(moves),known) and moves[common] == self.moves[common]:
+                common += 1
+            del self.moves[common:]
+            self._checkpointed = min(self._checkpointed,common)
+            records.append(undoRecord.pack(b"u",common))
+        for move in moves[len(self.moves):]:
+            records.append(moveRecord.pack(b"m",encodeMove(move)))
+            self.moves.append(move)
+        if "wtime" in state:
+            clocks = (min(max(int(state["wtime"]),0),_clockLimit),min(max(int(state["btime"]),0),_clockLimit))
+            if clocks != self.clocks:
+                records.append(clockRecord.pack(b"t",*clocks))
+                self.clocks = clocks
+        extra = {key: value for key, value in state.items() if key not in ("type","moves","wtime","btime")}
+        if extra != self.extra: #? status, increments, draw and takeback offers
+            records.append(self._event({"type": "gameState"} | extra))
+            self.extra = extra
+            self.finished = extra.get("status","started") not in ("created","started")
+        if self.ply-self._checkpointed >= self.checkpointEvery or (self.finished and self.ply != self._checkpointed):
+            records.append(checkpointRecord.pack(b"k",self.ply,_crc(self.moves)))
+            self._checkpointed = self.ply
+        return records
+    def _event(self, event: dict) -> bytes:
+        body = json.dumps(event,separators=(",",":")).encode()
+        return eventRecord.pack(b"e",len(body))+body
+    def _write(self, records: list) -> None:
+        if not records:
+            return
+        self._file.write(b"".join(records)) #* one write per event
+        if self.fsync and any([record[:1] == b"k" for record in records]):
+            os.fsync(self._file.fileno())
+    def close(self, status: str|None=None) -> None:
+        """Closes the log
+
+        Args:
+            status (str, optional): Marks an unfinished game as over (i.e. "aborted" if its stream can't be found), so it is not resumed. Defaults to leaving it as it is.
+        """
+        if self._file.closed:
+            return
+        if status is not None and not self.finished:
+            self._write(self._state({"moves": " ".join(self.moves)} | self.extra | {"status": status}))
+        self._file.close()
+    def __enter__(self) -> "gameLogWriter":
+        return self
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class gameStore:
+    def __init__(self, directory: str, *, checkpointEvery: int=16, fsync: bool=False) -> None:
+        """A directory of game logs. Finished games are moved into its "finished" subdirectory
+
+        Args:
+            directory (str): The directory (created if missing)
+            checkpointEvery (int, optional): See gameLogWriter. Defaults to 16.
+            fsync (bool, optional): See gameLogWriter. Defaults to False.
+        """
+        self.directory = directory
+        self.checkpointEvery = checkpointEvery
+        self.fsync = fsync
+        os.makedirs(os.path.join(directory,"finished"),exist_ok=True)
+    def path(self, gameid: str, finished: bool=False) -> str:
+        return os.path.join(self.directory,*(["finished"] if finished else []),f"{gameid}.log")
+    def open(self, gameid: str) -> gameLogWriter:
+        """Opens a game's log for appending (see gameLogWriter)
+        """
+        return gameLogWriter(self.path(gameid),checkpointEvery=self.checkpointEvery,fsync=self.fsync)
+    def read(self, gameid: str) -> gameLog:
+        """Reads a game's log, finished or not
+
+        Raises:
+            FileNotFoundError: Raises if the game was never logged
+        """
+        path = self.path(gameid)
+        return gameLog(path if os.path.exists(path) else self.path(gameid,True))
+    def archive(self, writer: gameLogWriter) -> None:
+        """Closes a log, moving it out of the way if its game is over
+        """
+        writer.close()
+        if writer.finished:
+            os.replace(writer.path,self.path(os.path.splitext(os.path.basename(writer.path))[0],True))
+    def openGames(self) -> list:
+        """Finds the games a previous run did not finish
+
+        Returns:
+            list: Their IDs
+        """
+        games = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".log"):
+                continue
+            try:
+                if not gameLog(os.path.join(self.directory,name)).finished:
+                    games.append(name[:-len(".log")])
+            except ValueError: #? not a game log
+                continue
+        return games
+
+def replay(log: gameLog, *, movetime: float=0.1, depth: int=64, table: engine.transpositionTable|None=None):
+    """Feeds a logged game back through the engine, position by position, for debugging
+
+    Args:
+        log (gameLog): The game
+        movetime (float, optional): How long to search each position, in seconds. Defaults to 0.1.
+        depth (int, optional): The deepest iteration to search. Defaults to 64.
+        table (engine.transpositionTable, optional): The table to search with. Defaults to a fresh 16 MB one.
+
+    Raises:
+        ValueError: Raises if the variant is not one the engine plays, or a logged move is illegal
+
+    Yields:
+        dict: {"ply", "played": the logged move, "ours": if we sent it, "search": what engine.searchEngine.search returns now} for every position
+    """
+    full = log.full or {}
+    variant = full.get("variant",{}).get("key","standard")
+    if variant not in engine.variants:
+        raise ValueError(f"The engine can't play {variant}")
+    board = engine.position(full.get("initialFen","startpos"),chess960=variant == "chess960")
+    searcher = engine.searchEngine(table or engine.transpositionTable(16))
+    sent = {ply: move for ply, move in log.sent}
+    history = []
+    for ply, move in enumerate(log.moves):
+        result = searcher.search(board,movetime=movetime,depth=depth,history=history)
+        yield {"ply": ply,"played": move,"ours": sent.get(ply) == move,"search": result}
+        history.append(board.key())
+        board = board.push(board.parseUci(move))
+
+if __name__ == "__main__":
+    log = gameLog(sys.argv[1])
+    full = log.full or {}
+    print(f"{full.get('id','?')}: {(full.get('white') or {}).get('name','?')} vs {(full.get('black') or {}).get('name','?')}, {log.ply} plies, {log.status}")
+    for step in replay(log,movetime=float(sys.argv[2]) if len(sys.argv) > 2 else 0.1):
+        search = step["search"]
+        marker = "*" if step["ours"] else " "
+        print(f"{step['ply']//2+1:>3}{'.' if step['ply'] % 2 == 0 else '...':<4}{step['played']:<6}{marker} engine {search['move']:<6} {search['score']:>6} cp  depth {search['depth']:>2}  {'' if search['move'] == step['played'] else 'differs'}")
@@ -1,9 +1,24 @@
 import datetime
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
 import os
 from typing import Literal
 
+import book
+import engine
+import gamelog
+import metrics
+import parallel
+import timemanager
+
 #--------------------------------------------------------------#
 #Comment Format (VSCode highlighting):
 #! Raises Error
@@ -14,33 +29,91 @@ from typing import Literal
 #** Debug
 #General Comment
 #--------------------------------------------------------------#
-#TODO Board
-#TODO lichessAccount.getGame()
-#--------------------------------------------------------------#
 
-#!load token
-try:
-    token = json.load(open("accounts.json","r"))["lichess"]["token"]
-except FileNotFoundError: #? if file is not found
-    accounts = {"lichess":{"token":input("Enter your lichess token: ")}} #* create file
-    json.dump(accounts,open("accounts.json","x"))
-except: #? if token is not found
-    try:
-        accounts = json.load(open("accounts.json","r"))
-    except:
-        accounts = {}
-    token = input("Enter your lichess token: ")
-    accounts["lichess"] = {"token": token}
-    json.dump(accounts,open("accounts.json","w"))
+#! All possible decline reasons (from https://github.com/lichess-org/lila/blob/master/translation/source/challenge.xml#L14)
+declineReasons = ["registerToSendChallenges","youCannotChallengeX","xDoesNotAcceptChallenges","yourXRatingIsTooFarFromY","cannotChallengeDueToProvisionalXRating","xOnlyAcceptsChallengesFromFriends","declineGeneric","declineLater","declineTooFast","declineTooSlow","declineTimeControl","declineRated","declineCasual","declineStandard","declineVariant","declineNoBot","declineOnlyBot"]
 
 class RateLimitedException(Exception): #! rate limited exception
     pass
 class TokenError(Exception): #! token error
     pass
+class StreamDroppedError(ConnectionError): #! the connection of a stream dropped (rather than the stream not existing)
+    pass
+
+def loadToken(path:str="accounts.json", *, prompt:bool=False) -> str:
+    """Loads the lichess token, from the LICHESS_TOKEN environment variable or from accounts.json. Never prompts unless asked to
+
+    Args:
+        path (str, optional): The accounts file. Defaults to "accounts.json".
+        prompt (bool, optional): If the token should be asked for (and saved to the file) when it is missing. Defaults to False.
+
+    Raises:
+        TokenError: Raises if there is no token and prompt is False
+
+    Returns:
+        str: The token
+    """
+    if os.environ.get("LICHESS_TOKEN"):
+        return os.environ["LICHESS_TOKEN"]
+    try:
+        with open(path,"r") as file:
+            accounts = json.load(file)
+    except (FileNotFoundError,json.JSONDecodeError): #? no file, or an unreadable one
+        accounts = {}
+    if isinstance(accounts.get("lichess"),dict) and accounts["lichess"].get("token"):
+        return accounts["lichess"]["token"]
+    if not prompt: #! never block a worker on input()
+        raise TokenError(f"No lichess token in {path} or LICHESS_TOKEN")
+    token = input("Enter your lichess token: ")
+    accounts["lichess"] = {"token": token}
+    with open(path,"w") as file:
+        json.dump(accounts,file)
+    return token
+
+
+def loadTokens(path:str="accounts.json") -> list:
+    """Loads every lichess token of a fleet of bots, from the LICHESS_TOKENS environment variable (comma separated) or from accounts.json, where "lichess" holds {"tokens": [...]}, {"token": ...} or a list of {"token": ...}
+
+    Args:
+        path (str, optional): The accounts file. Defaults to "accounts.json".
+
+    Raises:
+        TokenError: Raises if there are no tokens
+
+    Returns:
+        list: The tokens
+    """
+    if os.environ.get("LICHESS_TOKENS"):
+        return [token.strip() for token in os.environ["LICHESS_TOKENS"].split(",") if token.strip()]
+    try:
+        with open(path,"r") as file:
+            lichess = json.load(file).get("lichess")
+    except (FileNotFoundError,json.JSONDecodeError):
+        lichess = None
+    if isinstance(lichess,list):
+        tokens = [entry["token"] for entry in lichess if isinstance(entry,dict) and entry.get("token")]
+    elif isinstance(lichess,dict):
+        tokens = list(lichess.get("tokens",[])) or ([lichess["token"]] if lichess.get("token") else [])
+    else:
+        tokens = []
+    if not tokens:
+        raise TokenError(f"No lichess tokens in {path} or LICHESS_TOKENS")
+    return tokens
+
+def formFields(fields: dict) -> dict:
+    """Gets fields ready to send as a lichess form body: booleans as true/false (not Python's True/False) and None left out
+
+    Args:
+        fields (dict): The fields
+
+    Returns:
+        dict: The fields to send
+    """
+    return {key: (str(value).lower() if isinstance(value,bool) else value) for key, value in fields.items() if value is not None}
 
 #*Create Objects
 class gameSetup:
-    def __init__(self, color:str="random", variant:str="standard", *, correspondence:bool=True, days:int=7, initTime:int=180, incrementTime:int=0, position:str="rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", noAbort:bool=False, noRematch:bool=False, noGiveTime:bool=False, noClaimWin:bool=False) -> None:
+    def __init__(self, color:str="random", variant:str="standard", *, correspondence:bool=True, days:int=7, initTime:int=180, incrementTime:int=0, position:str|None=None, noAbort:bool=False, noRematch:bool=False, noGiveTime:bool=False, noClaimWin:bool=False) -> None:
         """The setup for a game
 
         Args:
@@ -50,7 +123,7 @@ class gameSetup:
             days (int, optional): If the game is a correspondence game, how many days should each move take. Can be 1, 2, 3, 5, 7, 10, or 14. Defaults to 7.
             initTime (int, optional): How much time each player should start with, in seconds. Can be from 1 to 10800. Defaults to 180.
             incrementTime (int, optional): How much time each player gets when they make a move, in seconds. Can be from 0 to 60. Defaults to 0.
-            position (str, optional): The starting position, in FEN notation. Defaults to "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1".
+            position (str, optional): The starting position, in FEN notation. Defaults to the standard one (for chess960, lichess then draws a random one).
             noAbort (bool, optional): If you or the opponent can abort the game. Defaults to False.
             noRematch (bool, optional): If you or the opponent can ask for a rematch. Defaults to False.
             noGiveTime (bool, optional): If you or the opponent can give the other more time. Defaults to False.
@@ -72,7 +145,8 @@ class gameSetup:
         if not variant in ["standard", "chess960", "crazyhouse", "antichess", "atomic", "horde", "kingOfTheHill", "racingKings", "threeCheck", "fromPosition"]:
             raise ValueError("Invalid variant")
         self.variant = variant
-        self.position = position
+        self.position = position or engine.startFen
+        self.fixedPosition = position is not None #? a fen makes lichess start there (and a chess960 game unrated), so only send one that was asked for
         self.args = {"noAbort": noAbort,"noRematch": noRematch,"noGiveTime": noGiveTime,"noClaimWin": noClaimWin}
         #! check if time control is valid
         if not isinstance(correspondence,bool):
@@ -93,13 +167,7 @@ class gameSetup:
         Returns:
             str: List of arguments, comma seperated (i.e. noAbort,noRematch)
         """
-        return  f"""{'noAbort' if self.args['noAbort'] else ''}
-                    {',' if (self.args['noAbort']) and (self.args['noRematch'] or self.args['noGiveTime'] or self.args['noClaimWin']) else ''}
-                    {'noRematch' if self.args['noRematch'] else ''}
-                    {',' if self.args['noRematch'] and (self.args['noGiveTime'] or self.args['noClaimWin']) else ''}
-                    {'noGiveTime' if self.args['noGiveTime'] else ''}
-                    {',' if self.args['noGiveTime'] and self.args['noClaimWin'] else ''}
-                    {'noClaimWin' if self.args['noClaimWin'] else ''}""" #? what is this
+        return ",".join([arg for arg, enabled in self.args.items() if enabled])
     def getPosition(self) -> tuple:
         """Gets the variant and starting position of the board
 
@@ -121,14 +189,253 @@ class gameSetup:
             str: The color of the bot
         """
         return self.color
+    def getSpeed(self) -> str:
+        """Gets the lichess time control category of the game
+
+        Returns:
+            str: "ultraBullet", "bullet", "blitz", "rapid", "classical" or "correspondence"
+        """
+        return timemanager.speedOf(self.initTime,self.incrementTime,self.correspondence)
+    def getWorkers(self, cores:int|None=None) -> int:
+        """Gets how many processes should search each move of a game with these rules (see timemanager.workersFor)
+
+        Args:
+            cores (int, optional): How many processes there are. Defaults to one per core.
+
+        Returns:
+            int: How many processes
+        """
+        return timemanager.workersFor(self.getSpeed(),cores or os.cpu_count() or 1,self.days if self.correspondence else None)
+    def getParams(self) -> dict:
+        """Gets the challenge parameters for these rules
+
+        Returns:
+            dict: The color, variant, rules, either days or clock.limit/clock.increment, and the fen if one is needed (fromPosition) or was given (chess960), as sent to the challenge endpoints
+        """
+        params = {"color": self.color, "variant": self.variant}
+        if self.variant == "fromPosition" or (self.variant == "chess960" and self.fixedPosition):
+            params["fen"] = self.position
+        rules = self.getArgs()
+        if rules != "":
+            params["rules"] = rules
+        if self.correspondence:
+            params["days"] = self.days
+        else:
+            params["clock.limit"] = self.initTime
+            params["clock.increment"] = self.incrementTime
+        return params
+
+class requestScheduler:
+    lanes = {"urgent": 0, "normal": 1, "low": 2} #* lower lanes are always served first
+    def __init__(self, rate:float=8, burst:int=20, cooldown:float=60, workers:int=4, maxRetries:int=2) -> None:
+        """Schedules requests through a token bucket, with priority lanes and a global cooldown after a 429
+
+        Args:
+            rate (float, optional): How many requests can be sent per second on average. Defaults to 8.
+            burst (int, optional): How many requests can be sent at once after being idle. Defaults to 20.
+            cooldown (float, optional): How long to stop sending anything after a 429, in seconds, unless the server sends Retry-After. Lichess asks for a full minute. Defaults to 60.
+            workers (int, optional): How many requests can be in flight at once. Defaults to 4.
+            maxRetries (int, optional): How many times a rate-limited request is sent again after the cooldown. Defaults to 2.
+        """
+        self.rate = rate
+        self.burst = burst
+        self.cooldown = cooldown
+        self.maxRetries = maxRetries
+        self.tokens = float(burst)
+        self.cooldownUntil = 0.0
+        self._updated = time.monotonic()
+        self._queue = [] #* heap of (lane, order, future, send, attempts)
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._workers = [threading.Thread(target=self._work,name=f"lichess-scheduler-{i}",daemon=True) for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+    def submit(self, send, priority:Literal["urgent","normal","low"]="normal") -> Future:
+        """Queues a request
+
+        Args:
+            send (callable): Sends the request and returns its requests.Response
+            priority (Literal["urgent","normal","low"], optional): The lane to queue the request in. Defaults to "normal".
+
+        Raises:
+            ValueError: Raises if the priority is invalid
+            RuntimeError: Raises if the scheduler is closed
+
+        Returns:
+            Future: Resolves to the response once the request has been sent
+        """
+        if priority not in self.lanes: #! check if priority is valid
+            raise ValueError("Invalid priority")
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The scheduler is closed")
+            heapq.heappush(self._queue,(self.lanes[priority],next(self._order),future,send,0))
+            self._condition.notify()
+        return future
+    def permit(self, priority:Literal["urgent","normal","low"]="normal") -> Future:
+        """Queues for a token without sending anything, for a request sent elsewhere (i.e. by the async client) that must stay within the same budget
+
+        Args:
+            priority (Literal["urgent","normal","low"], optional): The lane to queue in. Defaults to "normal".
+
+        Raises:
+            ValueError: Raises if the priority is invalid
+            RuntimeError: Raises if the scheduler is closed
+
+        Returns:
+            Future: Resolves to None once the request can be sent
+        """
+        return self.submit(None,priority)
+    def coolDown(self, seconds:float|None=None) -> None:
+        """Stops sending anything for a while, after a 429 answered to a request sent elsewhere
+
+        Args:
+            seconds (float, optional): How long, i.e. the 429's Retry-After. Defaults to the scheduler's cooldown.
+        """
+        with self._condition:
+            self.cooldownUntil = max(self.cooldownUntil,time.monotonic()+(seconds if seconds is not None else self.cooldown))
+    def pending(self) -> dict:
+        """Gets how many requests are waiting in each lane
+
+        Returns:
+            dict: The queue depth of each lane (i.e. {"urgent": 0, "normal": 3, "low": 12})
+        """
+        with self._condition:
+            depth = dict.fromkeys(self.lanes,0)
+            names = {lane: name for name, lane in self.lanes.items()}
+            for job in self._queue:
+                depth[names[job[0]]] += 1
+            return depth
+    def close(self) -> None:
+        """Sends every queued request, then stops the workers
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        for worker in self._workers:
+            if worker is not threading.current_thread():
+                worker.join()
+    def _wait(self) -> float:
+        """Refills the bucket and gets how long to wait before the next request can be sent (call with the lock held)
+        """
+        now = time.monotonic()
+        self.tokens = min(self.burst,self.tokens+(now-self._updated)*self.rate)
+        self._updated = now
+        if now < self.cooldownUntil: #? cooling down after a 429
+            return self.cooldownUntil-now
+        if self.tokens < 1:
+            return (1-self.tokens)/self.rate
+        return 0
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue: #* closed and drained
+                    return
+                delay = self._wait()
+                if delay > 0:
+                    self._condition.wait(delay)
+                    continue
+                lane, order, future, send, attempts = heapq.heappop(self._queue)
+                self.tokens -= 1
+            if attempts == 0 and not future.set_running_or_notify_cancel(): #? cancelled while queued
+                continue
+            if send is None: #* a permit: the token is all it needed
+                future.set_result(None)
+                continue
+            try:
+                response = send()
+            except BaseException as error:
+                future.set_exception(error)
+                continue
+            if response.status_code == 429:
+                with self._condition:
+                    try:
+                        wait = float(response.headers.get("Retry-After",self.cooldown))
+                    except ValueError:
+                        wait = self.cooldown
+                    self.cooldownUntil = max(self.cooldownUntil,time.monotonic()+wait) #! everyone waits
+                    if attempts < self.maxRetries: #* send it again after the cooldown, ahead of newer requests in its lane
+                        response.close()
+                        heapq.heappush(self._queue,(lane,order,future,send,attempts+1))
+                        self._condition.notify()
+                        continue
+            future.set_result(response)
+
+class ttlCache:
+    def __init__(self, ttl:float=60) -> None:
+        """A cache whose entries expire after a while. Concurrent misses for the same key share one fetch
+
+        Args:
+            ttl (float, optional): How long an entry stays fresh, in seconds. Defaults to 60.
+        """
+        self.ttl = ttl
+        self._entries = {} #* key: (value, time fetched)
+        self._inflight = {} #* key: Future of the running fetch
+        self._lock = threading.Lock()
+    def get(self, key: str, fetch, force:bool=False):
+        """Gets an entry, fetching it if it is missing or stale
+
+        Args:
+            key (str): The entry to get
+            fetch (callable): Gets a fresh value
+            force (bool, optional): If the entry should be fetched even if it is fresh. Defaults to False.
+
+        Returns:
+            any: The value. Raises what fetch raises if the fetch fails.
+        """
+        with self._lock:
+            if not force and key in self._entries and time.monotonic()-self._entries[key][1] < self.ttl:
+                return self._entries[key][0]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner: #* nobody is fetching this yet
+                future = self._inflight[key] = Future()
+        if not owner: #? share the running fetch
+            return future.result()
+        try:
+            value = fetch()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            self.set(key,value)
+            future.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = (value,time.monotonic())
+    def invalidate(self, key:str|None=None) -> None:
+        """Removes an entry, or every entry if key is None
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key,None)
 
 class lichessAccount:
-    def __init__(self,token: str,endpoint:str="https://lichess.org") -> None: #* initalize, get account info, upgrade to bot account
+    def __init__(self,token: str,endpoint:str="https://lichess.org",*,poolSize:int=10,keepAlive:bool=True,timeout:float|tuple=(3.05,30),retries:int=3,scheduler:requestScheduler|None=None,accountTTL:float=60,tableMB:float=64,lazy:bool=False,metrics:metrics.requestMetrics|None=None) -> None: #* initalize, get account info, upgrade to bot account
         """Initalize a bot account with a token
 
         Args:
             token (str): The token of the bot account
             endpoint (str, optional): The endpoint of the lichess api. Defaults to "https://lichess.org".
+            poolSize (int, optional): How many connections to keep open to the endpoint. Defaults to 10.
+            keepAlive (bool, optional): If connections should be reused between requests. Defaults to True.
+            timeout (float | tuple, optional): The request timeout in seconds, or a (connect, read) tuple. Defaults to (3.05, 30).
+            retries (int, optional): How many times to retry a request if the connection is reset. Defaults to 3.
+            scheduler (requestScheduler, optional): The scheduler every request goes through. Defaults to a new requestScheduler with one worker per pooled connection.
+            accountTTL (float, optional): How long the account info and email are cached for, in seconds. Defaults to 60.
+            tableMB (float, optional): The memory budget of the transposition table shared by the account's games, in MiB. It is only allocated once a game uses the engine. Defaults to 64.
+            lazy (bool, optional): If the token check and bot upgrade should wait for the first request instead of running now (see connect). Defaults to False.
+            metrics (requestMetrics, optional): Records every request and move (see metrics.py). Defaults to None (nothing is recorded).
 
         Raises:
             RateLimitedException: Raises if the account is rate-limited
@@ -136,60 +443,214 @@ class lichessAccount:
             ConnectionError: Raises if the endpoint is invalid
         """
         
-        if not endpoint.startswith("https://"): #! check if endpoint is valid
+        if not endpoint.startswith(("https://","http://localhost","http://127.0.0.1")): #! check if endpoint is valid (plain http is only allowed for local servers)
             raise ConnectionError("Endpoint must start with https://")
-        self.endpoint = endpoint #* set endpoint
+        self.endpoint = endpoint.rstrip("/") #* set endpoint
         self.token = token #* set token
-        accountinfo = requests.get(url=f"{self.endpoint}/api/account",headers={"Authorization": f"Bearer {self.token}"}) #? get account info
-        if accountinfo.status_code == 200:
-            pass
-        elif accountinfo.status_code == 429: #!raises if rate limited
-            raise RateLimitedException("You are being rate limited.")
-        else:
-            if __debug__:
-                print(accountinfo.status_code)
-                print(accountinfo.text)
-            raise TokenError("Invalid token")
-        if not __debug__: #** prints account info if debug mode is on (launched with -O)
-            print(accountinfo)
-        #! try to upgrade to bot account
-        try:
-            requests.post(url=f"{self.endpoint}/api/bot/account/upgrade",headers={"Authorization": f"Bearer {self.token}"})
-        except:
-            raise TokenError("This token is not a bot token.")
-        #// #* start the run loop
-        #// asyncio.run(self.runloop())
-    #//def runloop(self) -> None: #* main run loop
-        #//"""Main Run Loop (async)
-        #//""" #TODO: Add a way to stop the run loop
-        #//    #TODO: Add a way so the bot shows as online
-        pass
-    def getAccountInfo(self) -> dict:
-        """Gets account info. See https://lichess.org/api#/tag/Account for more info
+        self.timeout = timeout
+        #* one pooled session shared by every endpoint
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {self.token}"})
+        if not keepAlive:
+            self.session.headers.update({"Connection": "close"})
+        #? only connection errors are retried for POSTs, so a move is never sent twice
+        adapter = HTTPAdapter(pool_connections=1,pool_maxsize=poolSize,max_retries=Retry(total=retries,connect=retries,read=retries,status=0,allowed_methods=frozenset(["GET"]),backoff_factor=0.1,raise_on_status=False))
+        self.session.mount("https://",adapter)
+        self.session.mount("http://",adapter)
+        self.scheduler = scheduler if scheduler is not None else requestScheduler(workers=poolSize) #* every request is rate-limited and prioritized here
+        self._ownScheduler = scheduler is None #? a shared scheduler is closed by whoever made it
+        self._callers = None
+        self.cache = ttlCache(accountTTL) #* account info and email
+        self.tableMB = tableMB
+        self._table = None
+        self._tableLock = threading.Lock()
+        self._seeded = set() #* (variant, position) already seeded
+        self.metrics = metrics
+        self._connected = False
+        self._connectLock = threading.Lock()
+        if not lazy:
+            self.connect()
+    def connect(self) -> None:
+        """Checks the token and upgrades the account to a bot account, sending both requests at once. It only runs once, and runs by itself before the first request of a lazy account
 
         Raises:
             RateLimitedException: Raises if the account is rate-limited
-            ValueError: Raises if an error occurs
-            TokenError: Raises if the token is invalid
+            TokenError: Raises if the token is invalid or is not a bot token
+            ValueError: Raises if lichess refuses to upgrade the account (i.e. it has played games as a human)
+            ConnectionError: Raises if the upgrade request fails
+        """
+        with self._connectLock:
+            if self._connected:
+                return
+            #* the upgrade does not depend on the account info, so neither waits for the other
+            accountinfo = self.scheduler.submit(self._sender("GET","/api/account",timeout=self.timeout),"urgent")
+            upgrade = self.scheduler.submit(self._sender("POST","/api/bot/account/upgrade",timeout=self.timeout),"urgent")
+            accountinfo = accountinfo.result() #? get account info
+            if accountinfo.status_code == 200:
+                pass
+            elif accountinfo.status_code == 429: #!raises if rate limited
+                raise RateLimitedException("You are being rate limited.")
+            else:
+                if __debug__:
+                    print(accountinfo.status_code)
+                    print(accountinfo.text)
+                raise TokenError("Invalid token")
+            self.cache.set("account",accountinfo.json()) #* seed the cache
+            #! try to upgrade to bot account
+            try:
+                upgrade = upgrade.result()
+            except requests.RequestException as error:
+                raise ConnectionError(f"Could not upgrade to a bot account: {error}")
+            if upgrade.status_code == 429: #!raises if rate limited
+                raise RateLimitedException("You are being rate limited.")
+            elif upgrade.status_code != 200 and accountinfo.json().get("title") != "BOT": #? upgrading a bot account again may fail
+                if upgrade.status_code in (401,403): #! the token can't play as a bot (i.e. it is missing the bot:play scope)
+                    raise TokenError("This token is not a bot token.")
+                try:
+                    error = upgrade.json()["error"]
+                except (ValueError,KeyError,TypeError):
+                    error = upgrade.text
+                raise ValueError(f"Could not upgrade to a bot account: {error}")
+            self._connected = True
+    def _request(self, method: str, path: str, priority:Literal["urgent","normal","low"]="normal", **kwargs) -> requests.Response:
+        """Sends a request to the endpoint through the scheduler and the account's pooled session, and waits for it
+
+        Args:
+            method (str): The HTTP method (i.e. "GET")
+            path (str): The path of the API call (i.e. "/api/account")
+            priority (Literal["urgent","normal","low"], optional): The scheduler lane. Moves, resigns and aborts are urgent. Defaults to "normal".
 
         Returns:
-            dict: The account info
+            requests.Response: The response. If it is still rate-limited after the scheduler's retries, the status code is 429.
+        """
+        if not self._connected: #* a lazy account connects on its first request
+            self.connect()
+        kwargs.setdefault("timeout",self.timeout)
+        return self.scheduler.submit(self._sender(method,path,**kwargs),priority).result()
+    def _sender(self, method: str, path: str, **kwargs):
+        """Gets a callable that sends a request over the pooled session, recording it if the account has metrics
         """
-        response = requests.get(url=f"{self.endpoint}/api/account",headers={"Authorization": f"Bearer {self.token}"})
+        send = lambda: self.session.request(method,f"{self.endpoint}{path}",**kwargs)
+        if self.metrics is None: #? no wrapping at all when disabled
+            return send
+        return lambda: self.metrics.timeRequest(method,path,send,streamed=kwargs.get("stream",False))
+    def submit(self, function, *args, **kwargs) -> Future:
+        """Calls one of the account's methods in the background
+
+        Args:
+            function (callable): The method to call (i.e. account.makeMoveInGame)
+
+        Returns:
+            Future: Resolves to what the method returns, or raises what it raises
+        """
+        if self._callers is None:
+            self._callers = ThreadPoolExecutor(thread_name_prefix="lichess-caller")
+        return self._callers.submit(function,*args,**kwargs)
+    def close(self) -> None:
+        """Sends every queued request, then closes every pooled connection of the account. A scheduler that was passed in is left running for the accounts sharing it
+        """
+        if self._callers is not None:
+            self._callers.shutdown()
+        if self._ownScheduler:
+            self.scheduler.close()
+        self.session.close()
+    def __enter__(self) -> "lichessAccount":
+        return self
+    def __exit__(self, *exc) -> None:
+        self.close()
+    def _fetchAccountInfo(self) -> dict:
+        response = self._request("GET","/api/account",priority="low")
         if response.status_code == 200:
             return response.json()
         elif response.status_code == 429:
             raise RateLimitedException("You are being rate limited.")
         else:
             raise ValueError(response.json()["error"])
-    def getEmail(self) -> str:
-        response = requests.get(url=f"{self.endpoint}/api/account/email",headers={"Authorization": f"Bearer {self.token}"})
+    def _fetchEmail(self) -> str:
+        response = self._request("GET","/api/account/email",priority="low")
         if response.status_code == 200:
             return response.json()["email"]
         elif response.status_code == 429:
             raise RateLimitedException("You are being rate limited.")
         else:
             raise ValueError(response.json()["error"])
+    @property
+    def table(self) -> engine.transpositionTable:
+        """The transposition table shared by every game the account plays (created on first use)"""
+        with self._tableLock:
+            if self._table is None:
+                self._table = engine.transpositionTable(self.tableMB)
+            return self._table
+    def seedTable(self, rules: gameSetup, depth:int=4) -> None:
+        """Fills the shared transposition table with a shallow search of a game's starting position
+
+        Args:
+            rules (gameSetup): The rules of the game
+            depth (int, optional): How deep to search. Defaults to 4.
+        """
+        with self._tableLock:
+            if (rules.variant,rules.position) in self._seeded: #? a gauntlet sends the same rules many times
+                return
+            self._seeded.add((rules.variant,rules.position))
+        if rules.variant in engine.variants:
+            self.table.seed(engine.position(rules.position,chess960=rules.variant == "chess960"),depth)
+    def getAccountInfo(self) -> dict:
+        """Gets account info, from the cache if it is fresh. See https://lichess.org/api#/tag/Account for more info
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ValueError: Raises if an error occurs
+            TokenError: Raises if the token is invalid
+
+        Returns:
+            dict: The account info
+        """
+        if not self._connected: #? connecting fills the cache
+            self.connect()
+        return self.cache.get("account",self._fetchAccountInfo)
+    def updateAccountInfo(self) -> dict:
+        """Fetches the account info again, even if the cached copy is fresh
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ValueError: Raises if an error occurs
+
+        Returns:
+            dict: The account info
+        """
+        return self.cache.get("account",self._fetchAccountInfo,force=True)
+    def invalidateAccountInfo(self) -> None:
+        """Drops the cached account info and email, so the next call fetches them again
+        """
+        self.cache.invalidate()
+    @property
+    def accountinfo(self) -> dict:
+        """The account info, from the cache if it is fresh"""
+        return self.getAccountInfo()
+    def getEmail(self) -> str:
+        """Gets the email of the account, from the cache if it is fresh
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ValueError: Raises if an error occurs
+
+        Returns:
+            str: The email
+        """
+        return self.cache.get("email",self._fetchEmail)
+    def getCurrentGameId(self) -> str:
+        """Gets the ID of the game the bot is playing, from the cached account info
+
+        Raises:
+            ConnectionError: Raises if the bot is not playing a game
+
+        Returns:
+            str: The game ID
+        """
+        playing = self.getAccountInfo().get("playing")
+        if not playing: #! not in a game
+            raise ConnectionError("The bot is not playing a game")
+        return playing.replace(f"{self.endpoint}/","").replace("/black","").replace("/white","")
     def checkIfStreaming(self, gameid: str="") -> dict:
         """Check if a given game is being streamed
 
@@ -205,18 +666,157 @@ class lichessAccount:
             dict: The stream info. See https://lichess.org/api#tag/Bot/operation/botGameStream for more info
         """
         if gameid == "":
-            self.updateAccountInfo()
-            gameid = self.accountinfo["playing"].replace(f"{self.endpoint}/","").replace("/black","").replace("/white","")
-        response = requests.get(url=f"{self.endpoint}/api/bot/game/stream/{gameid}",headers={"Authorization": f"Bearer {self.token}"})
-        if response.status_code == 200:
-            return response.json()
-        elif response.status_code == 429:
-            raise RateLimitedException("You are being rate limited.")
-        else:
-            raise ValueError(response.json()["error"])
+            gameid = self.getCurrentGameId()
+        stream = self.streamGame(gameid,reconnect=False)
+        try:
+            return next(stream) #* the first event is always gameFull
+        except StopIteration:
+            raise ConnectionError("Game not found")
+        finally:
+            stream.close()
+    def _streamNDJSON(self, path: str, *, reconnect:bool=True, maxReconnects:int=5, maxLineBytes:int=1048576, stop:threading.Event|None=None, **kwargs):
+        """Reads a newline-delimited json stream, yielding each object as soon as its line arrives
+
+        Args:
+            path (str): The path of the API call (i.e. "/api/stream/event")
+            reconnect (bool, optional): If the stream should be reopened when the connection drops. Defaults to True.
+            maxReconnects (int, optional): How many times in a row to try reconnecting. Defaults to 5.
+            maxLineBytes (int, optional): The longest line that will be buffered. Defaults to 1048576 (1 MiB).
+            stop (threading.Event, optional): Ends the stream once set. It is checked whenever data (including a keep-alive newline) arrives. Defaults to None.
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ConnectionError: Raises if the stream is not found
+            StreamDroppedError: Raises if the stream keeps dropping (a ConnectionError)
+            ValueError: Raises if a line is longer than maxLineBytes
+            TokenError: Raises if the token is invalid
+
+        Yields:
+            dict: Each object in the stream. Keep-alive (empty) lines are skipped.
+        """
+        attempts = 0
+        while True:
+            try:
+                with self._request("GET",path,stream=True,**kwargs) as response:
+                    if response.status_code == 429: #! if rate limited
+                        raise RateLimitedException("You are being rate limited.")
+                    elif response.status_code == 404: #! if not found
+                        raise ConnectionError("Stream not found")
+                    elif response.status_code == 401: #! if token is invalid
+                        raise TokenError("Invalid token")
+                    elif response.status_code != 200:
+                        raise ValueError(response.json()["error"])
+                    attempts = 0
+                    buffer = b""
+                    for chunk in response.iter_content(chunk_size=None): #? yields each chunk as it arrives
+                        if stop is not None and stop.is_set():
+                            return
+                        if self.metrics is not None:
+                            self.metrics.addBytes("GET",path,len(chunk))
+                        buffer += chunk
+                        *lines, buffer = buffer.split(b"\n")
+                        if len(buffer) > maxLineBytes: #! never buffer an unbounded line
+                            raise ValueError(f"Stream line is longer than {maxLineBytes} bytes")
+                        for line in lines:
+                            if line.strip(): #? skip keep-alive newlines
+                                yield json.loads(line)
+                    if buffer.strip():
+                        yield json.loads(buffer)
+                    return #* the server closed the stream
+            except (requests.ConnectionError,requests.exceptions.ChunkedEncodingError,requests.Timeout) as error:
+                attempts += 1
+                if not reconnect or attempts > maxReconnects: #! give up
+                    raise StreamDroppedError(f"Stream {path} dropped: {error}")
+                delay = min(0.5*2**(attempts-1),10) #* back off before reconnecting
+                if stop is not None and stop.wait(delay):
+                    return
+                elif stop is None:
+                    time.sleep(delay)
+    def streamGame(self, gameid: str, *, reconnect:bool=True, maxLineBytes:int=1048576, stop:threading.Event|None=None):
+        """Streams a game the bot is playing. See https://lichess.org/api#tag/Bot/operation/botGameStream for more info
+
+        Args:
+            gameid (str): The ID of the game to stream
+            reconnect (bool, optional): If the stream should be reopened when the connection drops. A reopened stream starts again with gameFull. Defaults to True.
+            maxLineBytes (int, optional): The longest line that will be buffered. Defaults to 1048576 (1 MiB).
+            stop (threading.Event, optional): Ends the stream once set. Defaults to None.
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ConnectionError: Raises if the game is not found or the connection keeps dropping
+            TokenError: Raises if the token is invalid
+
+        Yields:
+            dict: Each gameFull, gameState, chatLine or opponentGone event, as soon as it arrives
+        """
+        for event in self._streamNDJSON(f"/api/bot/game/stream/{gameid}",reconnect=reconnect,maxLineBytes=maxLineBytes,stop=stop):
+            yield event
+            state = event["state"] if event.get("type") == "gameFull" else event
+            if state.get("type") == "gameState" and state.get("status") not in (None,"created","started"):
+                return #* the game is over
+    def streamEvents(self, *, reconnect:bool=True, stop:threading.Event|None=None):
+        """Streams incoming events. The bot shows as online while this stream is open. See https://lichess.org/api#tag/Bot/operation/apiStreamEvent for more info
+
+        Args:
+            reconnect (bool, optional): If the stream should be reopened when the connection drops. Defaults to True.
+            stop (threading.Event, optional): Ends the stream once set. Defaults to None.
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            TokenError: Raises if the token is invalid
+
+        Yields:
+            dict: Each challenge, challengeCanceled, challengeDeclined, gameStart or gameFinish event, as soon as it arrives
+        """
+        yield from self._streamNDJSON("/api/stream/event",reconnect=reconnect,stop=stop)
+    def exportGames(self, user: str="", *, since:int|None=None, until:int|None=None, limit:int|None=None, rated:bool|None=None, perfType:str|None=None, sort:Literal["dateAsc","dateDesc"]="dateDesc", clocks:bool=False, moves:bool=True, stop:threading.Event|None=None):
+        """Streams a user's finished games, one at a time, so any number of them can be read. See https://lichess.org/api#tag/Games/operation/apiGamesUser for more info
+
+        Args:
+            user (str, optional): The username. Defaults to the bot's.
+            since (int, optional): Only games created at or after this time, in ms since the epoch. Defaults to the account's creation.
+            until (int, optional): Only games created at or before this time, in ms since the epoch. Defaults to now.
+            limit (int, optional): The most games to export (lichess's max). Defaults to all of them.
+            rated (bool, optional): Only rated (True) or casual (False) games. Defaults to both.
+            perfType (str, optional): Only these time controls or variants, comma separated (i.e. "blitz,rapid"). Defaults to all of them.
+            sort (Literal["dateAsc","dateDesc"], optional): The order of the games. Defaults to "dateDesc".
+            clocks (bool, optional): If each game includes the clock after every move, in centiseconds. Defaults to False.
+            moves (bool, optional): If each game includes its moves, in SAN. Defaults to True.
+            stop (threading.Event, optional): Ends the export once set. Defaults to None.
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ConnectionError: Raises if the user is not found
+            StreamDroppedError: Raises if the connection drops (the export is not reopened, as it would start over)
+            TokenError: Raises if the token is invalid
+
+        Yields:
+            dict: Each game, as soon as it arrives
+        """
+        if user == "":
+            user = self.accountinfo["username"]
+        params = {"since": since,"until": until,"max": limit,"rated": None if rated is None else str(rated).lower(),"perfType": perfType,"sort": sort,"clocks": str(clocks).lower(),"moves": str(moves).lower()}
+        yield from self._streamNDJSON(f"/api/games/user/{user}",reconnect=False,stop=stop,params={key: value for key, value in params.items() if value is not None},headers={"Accept": "application/x-ndjson"},priority="low")
     def getGame(self, gameid: str="") -> dict:
-        raise NotImplementedError #TODO: Add a way to get a game
-        return {"board":None,"chat":self.getGameChat(gameid)}
+        """Gets a game the bot is playing
+
+        Args:
+            gameid (str, optional): the ID of the game. Defaults to the bot's current game.
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ConnectionError: Raises if the game is not found
+            TokenError: Raises if the token is invalid
+
+        Returns:
+            dict: {"game": the gameFull event, "board": a boardState at the latest move, "chat": the chat}
+        """
+        if gameid == "":
+            gameid = self.getCurrentGameId()
+        full = self.checkIfStreaming(gameid)
+        board = boardState(full.get("initialFen","startpos"),full.get("variant",{}).get("key","standard"))
+        board.update(full["state"])
+        return {"game": full,"board": board,"chat": self.getGameChat(gameid)}
     def makeMoveInGame(self, gameid: str, move: str, offerDraw:bool=False) -> None:
         """Makes a move in a game
 
@@ -234,7 +834,7 @@ class lichessAccount:
         Returns:
             None
         """
-        response = requests.post(f"{self.endpoint}/api/bot/{gameid}/move/{move}",headers={"Authorization": f"Bearer {self.token}"},params={"offeringDraw": offerDraw})
+        response = self._request("POST",f"/api/bot/game/{gameid}/move/{move}",priority="urgent",params={"offeringDraw": offerDraw})
         if response.status_code == 200:
             return
         elif response.status_code == 429:
@@ -256,7 +856,7 @@ class lichessAccount:
         Returns:
             None
         """
-        response = requests.post(f"{self.endpoint}/api/bot/{gameid}/abort",headers={"Authorization": f"Bearer {self.token}"})
+        response = self._request("POST",f"/api/bot/game/{gameid}/abort",priority="urgent")
         if response.status_code == 200:
             return
         elif response.status_code == 429:
@@ -281,7 +881,7 @@ class lichessAccount:
         Returns:
             list: A list of messages in the chat. See https://lichess.org/api#tag/Bot/operation/botGameChat for more info
         """
-        response = requests.get(f"{self.endpoint}/api/bot/{gameid}/chat") #* get chat
+        response = self._request("GET",f"/api/bot/game/{gameid}/chat") #* get chat
         if response.status_code == 200: #? if successful
             return response.json()
         elif response.status_code == 429: #! if rate limited
@@ -290,6 +890,28 @@ class lichessAccount:
             raise ConnectionError("Game not found")
         else: #! if token is invalid
             raise TokenError("Invalid token")
+    def writeInChat(self,gameid:str,text:str,room:Literal["player","spectator"]="player") -> None:
+        """Posts a message in the chat of a game
+
+        Args:
+            gameid (str): The game to post in
+            text (str): The message
+            room (Literal["player","spectator"], optional): Which chat room to post in. Defaults to "player".
+
+        Raises:
+            RateLimitedException: Raises if the account is rate-limited
+            ConnectionError: Raises if the game is not found
+            TokenError: Raises if the token is invalid
+        """
+        response = self._request("POST",f"/api/bot/game/{gameid}/chat",priority="low",data={"room": room,"text": text})
+        if response.status_code == 200:
+            return
+        elif response.status_code == 429:
+            raise RateLimitedException("You are being rate limited.")
+        elif response.status_code == 404:
+            raise ConnectionError("Game not found")
+        else:
+            raise TokenError("Invalid token")
     def resignGame(self,gameid: str) -> None:
         """Resigns a game
 
@@ -302,7 +924,7 @@ class lichessAccount:
             ValueError: Raises if the game has already ended
             TokenError: Raises if the token is invalid
         """
-        response = requests.post(f"{self.endpoint}/api/bot/game/{gameid}/resign",headers={"Authorization": f"Bearer {self.token}"})
+        response = self._request("POST",f"/api/bot/game/{gameid}/resign",priority="urgent")
         if response.status_code == 200:
             return
         elif response.status_code == 429:
@@ -314,7 +936,7 @@ class lichessAccount:
         else:
             raise TokenError("Invalid token")
     def getChallenges(self) -> tuple:
-        response = requests.get(f"{self.endpoint}/api/challenge",headers={"Authorization": f"Bearer {self.token}"})
+        response = self._request("GET","/api/challenge")
         if response.status_code == 200:
             return tuple([response.json()["in"], response.json()["out"]])
         elif response.status_code == 429:
@@ -340,32 +962,13 @@ class lichessAccount:
         Returns:
             json: The details of the accepted challenge. See https://lichess.org/api#tag/Challenges/operation/challengeCreate for more info.
         """
-        if acceptToken == "" or message == "":
-            message = "Your game with {opponent} is ready: {game}."
-        if rules.getTime()[0]: #* if correspondence
-            response = requests.post(f"{self.endpoint}/api/challenge/{user}",headers={"Authorization": f"Bearer {self.token}"},params={
-                "rated": rated,
-                "days": rules.getTime()[1],
-                "clock.limit": "",
-                "clock.increment": "",
-                "variant": rules.getPosition()[0],
-                "fen": rules.getPosition()[1],
-                "keepAliveStream": persistant,
-                "acceptByToken": acceptToken,
-                "message": message,
-                "rules": rules.getArgs(),
-                "color": rules.getColor()})
-        else: #* if real time
-            response = requests.post(f"{self.endpoint}/api/challenge/{user}",headers={"Authorization": f"Bearer {self.token}"},params={
-                "clock.limit": rules.getTime()[1],
-                "clock.increment": rules.getTime()[2],
-                "variant": rules.getPosition()[0],
-                "fen": rules.getPosition()[1],
-                "keepAliveStream": persistant,
-                "acceptByToken": acceptToken,
-                "message": message,
-                "rules": rules.getArgs(),
-                "color": rules.getColor()})
+        params = rules.getParams() | {"rated": rated,"keepAliveStream": persistant}
+        if acceptToken != "":
+            params["acceptByToken"] = acceptToken
+            params["message"] = message if message != "" else "Your game with {opponent} is ready: {game}."
+        response = self._request("POST",f"/api/challenge/{user}",priority="low",data=formFields(params))
+        if response.status_code == 200 and self._table is not None: #* the engine is in use, so warm the table up for this game
+            self.submit(self.seedTable,rules)
         if response.status_code == 200:
             return response.json()
         elif response.status_code == 429:
@@ -384,7 +987,7 @@ class lichessAccount:
             ConnectionError: Raises if the challenge is not found
             TokenError: Raises if the token is invalid
         """
-        response = requests.post(f"{self.endpoint}/api/challenge/{challengeid}/accept",headers={"Authorization": f"Bearer {self.token}"})
+        response = self._request("POST",f"/api/challenge/{challengeid}/accept")
         if response.status_code == 200:
             return
         elif response.status_code == 429:
@@ -403,9 +1006,9 @@ class lichessAccount:
             RateLimitedException: Raises if the account is rate-limited
             ConnectionError: Any other error
         """
-        if reason not in ["registerToSendChallenges","youCannotChallengeX","xDoesNotAcceptChallenges","yourXRatingIsTooFarFromY","cannotChallengeDueToProvisionalXRating","xOnlyAcceptsChallengesFromFriends","declineGeneric","declineLater","declineTooFast","declineTooSlow","declineTimeControl","declineRated","declineCasual","declineStandard","declineVariant","declineNoBot","declineOnlyBot"]: #! All possible decline reasons (from https://github.com/lichess-org/lila/blob/master/translation/source/challenge.xml#L14)
+        if reason not in declineReasons: #! check if reason is valid
             raise ValueError("Invalid reason")
-        response = requests.post(f"{self.endpoint}/api/challenge/{challengeid}/decline",headers={"Authorization": f"Bearer {self.token}"},params={"reason": reason})
+        response = self._request("POST",f"/api/challenge/{challengeid}/decline",data={"reason": reason})
         if response.status_code == 200:
             return
         elif response.status_code == 429:
@@ -413,7 +1016,7 @@ class lichessAccount:
         else:
             raise ConnectionError(response.json()["error"])
     def cancelChallenge(self,challengeid:str,opponentToken:str="") -> None:
-        response = requests.post(f"{self.endpoint}/api/challenge/{challengeid}/cancel",headers={"Authorization": f"Bearer {self.token}"},params=({"opponentToken":opponentToken} if not opponentToken == "" else None))
+        response = self._request("POST",f"/api/challenge/{challengeid}/cancel",params=({"opponentToken":opponentToken} if not opponentToken == "" else None))
         if response.status_code == 200:
             return
         elif response.status_code == 429:
@@ -423,24 +1026,11 @@ class lichessAccount:
     def challengeAI(self,AIlevel:int=8,rules:gameSetup=gameSetup()) -> dict:
         if not AIlevel in range(1,9):
             raise ValueError("Invalid AI level")
-        response = requests.post(
-            f"{self.endpoint}/api/challenge/ai",
-            headers={"Authorization": f"Bearer {self.token}"},
-            params=({
-                "level": AIlevel,
-                "color": rules.getColor(),
-                "variant": rules.getPosition()[0],
-                "fen": rules.getPosition()[1],
-                "days": rules.getTimeControl()[1]
-                } if rules.getTimeControl()[0] else {
-                "level": AIlevel,
-                "color": rules.getColor(),
-                "variant": rules.getPosition()[0],
-                "fen": rules.getPosition()[1],
-                "clock.limit": rules.getTimeControl()[1],
-                "clock.increment": rules.getTimeControl()[2]
-            })
-        )
+        params = rules.getParams() | {"level": AIlevel}
+        params.pop("rules",None) #? games against the AI have no rules
+        response = self._request("POST","/api/challenge/ai",priority="low",data=formFields(params))
+        if response.status_code == 200 and self._table is not None: #* the engine is in use, so warm the table up for this game
+            self.submit(self.seedTable,rules)
         if response.status_code == 200:
             return response.json()
         elif response.status_code == 429:
@@ -449,59 +1039,678 @@ class lichessAccount:
             raise ConnectionError(response.json()["error"])
     def openEndedChallenge(self,rated:bool=False,rules:gameSetup=gameSetup(),users:list=[],name:str="") -> dict:
         if name == "":
-            name == f"Challenge from {self.accountinfo['username']}"
-        if users == []:
-            response = requests.post(f"{self.endpoint}/api/challenge/open",headers={
-                "Authorization": f"Bearer {self.token}"},params={
-                "rated": rated,
-                "variant": rules.getPosition()[0],
-                "days": rules.getTimeControl()[1],
-                "fen": rules.getPosition()[1],
-                "name": name,
-                "rules": rules.getArgs(),
-                } if rules.getTimeControl()[0] else {
-                "rated": rated,
-                "variant": rules.getPosition()[0],
-                "clock.limit": rules.getTimeControl()[1],
-                "clock.increment": rules.getTimeControl()[2],
-                "fen": rules.getPosition()[1],
-                "name": name,
-                "rules": rules.getArgs(),
-                })
-        else:
-            allusers = ""
-            for user in users:
-                allusers += f",{user}"
-            allusers = allusers.removeprefix(",")
-            response = requests.post(f"{self.endpoint}/api/challenge/open",headers={
-                "Authorization": f"Bearer {self.token}"},params={
-                "rated": rated,
-                "variant": rules.getPosition()[0],
-                "days": rules.getTimeControl()[1],
-                "fen": rules.getPosition()[1],
-                "name": name,
-                "rules": rules.getArgs(),
-                "users": allusers
-                } if rules.getTimeControl()[0] else {
-                "rated": rated,
-                "variant": rules.getPosition()[0],
-                "clock.limit": rules.getTimeControl()[1],
-                "clock.increment": rules.getTimeControl()[2],
-                "fen": rules.getPosition()[1],
-                "name": name,
-                "rules": rules.getArgs(),
-                "users": allusers
-                })
+            name = f"Challenge from {self.accountinfo['username']}"
+        params = rules.getParams() | {"rated": rated,"name": name}
+        params.pop("color",None) #? whoever accepts an open challenge gets a random color
+        if users != []:
+            params["users"] = ",".join(users)
+        response = self._request("POST","/api/challenge/open",priority="low",data=formFields(params))
+        if response.status_code == 200 and self._table is not None: #* the engine is in use, so warm the table up for this game
+            self.submit(self.seedTable,rules)
         if response.status_code == 200:
             return response.json()
         elif response.status_code == 429:
             raise RateLimitedException("You are being rate limited.")
         else:
-            return ConnectionError(response.json()["error"])
+            raise ConnectionError(response.json()["error"])
+
+    def challengeMany(self, targets: list, rules:gameSetup|list=gameSetup(), *, rated:bool=False):
+        """Sends many challenges at once (i.e. for a gauntlet), within the scheduler's rate budget. One failed challenge never stops the others
+
+        Args:
+            targets (list): Who to challenge: a username for challengeUser, an AI level (1 to 8) for challengeAI, or None for openEndedChallenge
+            rules (gameSetup | list, optional): The rules to challenge every target with, or a list of them to send one challenge per target and rules. Defaults to gameSetup().
+            rated (bool, optional): Whether the games should be rated (ignored for AI challenges). Defaults to False.
+
+        Yields:
+            dict: A progress report as each challenge is answered: "target", "rules", "done" and "total", and either "result" (what the challenge call returned) or "error" (the exception it raised)
+        """
+        setups = rules if isinstance(rules,list) else [rules]
+        def send(target, setup: gameSetup) -> dict:
+            if target is None:
+                return self.openEndedChallenge(rated=rated,rules=setup)
+            elif isinstance(target,int):
+                return self.challengeAI(target,rules=setup)
+            return self.challengeUser(target,rated=rated,persistant=False,rules=setup) #? a kept-alive challenge would hold its request open until it is answered
+        futures = {self.submit(send,target,setup): (target,setup) for target in targets for setup in setups}
+        for done, future in enumerate(as_completed(futures),1):
+            target, setup = futures[future]
+            report = {"target": target,"rules": setup,"done": done,"total": len(futures)}
+            if future.exception() is not None:
+                report["error"] = future.exception()
+            else:
+                report["result"] = future.result()
+            yield report
+
+#* Runtime
+class boardState:
+    def __init__(self, initialFen:str="startpos", variant:str="standard") -> None:
+        """A game's board, kept up to date from its gameState events. Only the moves after the last applied ply are played, as every event repeats the whole game
+
+        Args:
+            initialFen (str, optional): The starting position. Defaults to "startpos".
+            variant (str, optional): The variant key. Variants the engine does not know only have their moves tracked (position is None). Defaults to "standard".
+        """
+        self.initialFen = initialFen
+        self.variant = variant
+        self.moves = [] #* UCI
+        self.resyncs = 0 #* how many times the moves had to be replayed from the start
+        self._text = "" #* the moves string the board is at
+        self._positions = None #* the position after each ply (the first is the starting position)
+        self._keys = [] #* the Zobrist key of each of those
+        if variant in engine.variants:
+            start = engine.position(initialFen,chess960=variant == "chess960")
+            self._positions = [start]
+            self._keys = [start.key()]
+    @property
+    def ply(self) -> int:
+        return len(self.moves)
+    @property
+    def position(self) -> engine.position|None:
+        """The current position, or None if the engine does not know the variant
+        """
+        return self._positions[-1] if self._positions is not None else None
+    def history(self) -> list:
+        """Gets the keys of every position before the current one, for repetition detection (see engine.searchEngine.search)
+        """
+        return self._keys[:-1]
+    def update(self, state: dict) -> list:
+        """Applies a gameState (or gameFull state)
+
+        Args:
+            state (dict): The state
+
+        Raises:
+            ValueError: Raises if a move is illegal even when replayed from the start
+
+        Returns:
+            list: The moves that were new (UCI). After a takeback or a divergence, every move from where it differed.
+        """
+        text = state.get("moves","")
+        known = len(self._text)
+        if text.startswith(self._text) and (not known or text[known:known+1] in ("", " ")): #* the usual case: only new moves were added
+            return self._apply(text[known:].split(),text)
+        moves = text.split()
+        common = 0 #! a takeback, or the board diverged
+        while common < min(len(moves),self.ply) and moves[common] == self.moves[common]:
+            common += 1
+        self._truncate(common)
+        return self._apply(moves[common:],text)
+    def _truncate(self, ply: int) -> None:
+        del self.moves[ply:]
+        if self._positions is not None:
+            del self._positions[ply+1:]
+            del self._keys[ply+1:]
+        self._text = " ".join(self.moves)
+    def _apply(self, moves: list, text: str) -> list:
+        if self._positions is not None:
+            board, positions = self._positions[-1], []
+            try:
+                for uci in moves: #? staged, so a bad delta leaves the board as it was if the resync fails too
+                    board = board.push(board.parseUci(uci)) #? push updates the Zobrist key incrementally
+                    positions.append(board)
+            except ValueError: #* the board is out of sync, so replay every move
+                return self.resync(text)
+            self._positions += positions
+            self._keys += [position.key() for position in positions]
+            self.moves += moves
+        else:
+            self.moves += moves
+        self._text = text
+        return moves
+    def resync(self, text: str) -> list:
+        """Replays every move from the starting position
+
+        Args:
+            text (str): The moves (space separated UCI)
+
+        Raises:
+            ValueError: Raises if a move is illegal
+
+        Returns:
+            list: Every move
+        """
+        self.resyncs += 1
+        moves = text.split()
+        if self._positions is not None:
+            board = self._positions[0]
+            positions, keys = [board], [board.key()]
+            for uci in moves: #? built aside, so an illegal move leaves the board as it was
+                board = board.push(board.parseUci(uci))
+                positions.append(board)
+                keys.append(board.key())
+            self._positions, self._keys = positions, keys
+        self.moves = moves
+        self._text = text
+        return moves
+
+class gameHandler:
+    def __init__(self, account: lichessAccount, gameid: str, stop: threading.Event) -> None:
+        """Plays one game. Subclass it and override chooseMove (and any on* method) to attach move logic
+
+        Args:
+            account (lichessAccount): The account playing the game
+            gameid (str): The ID of the game
+            stop (threading.Event): Set when the runtime is shutting down
+        """
+        self.account = account
+        self.gameid = gameid
+        self.stop = stop
+        self.color = None
+        self.initialFen = "startpos"
+        self.received = 0.0 #* when the latest event arrived (perf_counter)
+        self.log = None #* a gamelog.gameLogWriter every event and sent move is appended to (set by botRuntime when it has a store)
+        self.board = None #* a boardState, created by onGameFull and brought up to date before every onGameState
+    def play(self) -> None:
+        """Streams the game and dispatches its events until it ends or the runtime stops
+        """
+        for event in self.account.streamGame(self.gameid,stop=self.stop):
+            self.received = time.perf_counter()
+            if self.log is not None:
+                self.log.record(event)
+            kind = event.get("type")
+            if kind == "gameFull":
+                self.onGameFull(event)
+                if self.board is not None:
+                    self.board.update(event["state"])
+                self.onGameState(event["state"])
+            elif kind == "gameState":
+                if self.board is not None:
+                    self.board.update(event)
+                self.onGameState(event)
+            elif kind == "chatLine":
+                self.onChatLine(event)
+            elif kind == "opponentGone":
+                self.onOpponentGone(event)
+    def isMyTurn(self, state: dict) -> bool:
+        """Checks if the bot is to move
+
+        Args:
+            state (dict): A gameState event
+
+        Returns:
+            bool: True if it is the bot's turn
+        """
+        whiteStarts = self.initialFen == "startpos" or self.initialFen.split()[1] == "w"
+        plies = self.board.ply if self.board is not None else len(state["moves"].split()) #? the board is already at this state
+        whiteToMove = (plies % 2 == 0) == whiteStarts
+        return whiteToMove == (self.color == "white")
+    def onGameFull(self, event: dict) -> None:
+        self.color = "white" if event["white"].get("id") == self.account.accountinfo["id"] else "black"
+        self.initialFen = event.get("initialFen","startpos")
+        variant = event.get("variant",{}).get("key","standard")
+        if self.board is None or (self.board.initialFen,self.board.variant) != (self.initialFen,variant): #? a reconnect keeps the board, so only new moves are applied
+            self.board = boardState(self.initialFen,variant)
+    def resume(self, log: gamelog.gameLog) -> None:
+        """Picks a game back up from what a previous run logged, before its stream reconnects
+
+        Args:
+            log (gamelog.gameLog): The game's log
+        """
+        if log.full is not None:
+            self.onGameFull(log.gameFull())
+            self.board.update(log.state())
+    def onGameState(self, state: dict) -> None:
+        if state.get("status") in ("created","started") and self.isMyTurn(state):
+            move = self.chooseMove(state)
+            if move is not None:
+                self.account.makeMoveInGame(self.gameid,move)
+                self.moved(move)
+    def moved(self, move: str|None=None) -> None:
+        """Call after a move is acknowledged. Logs it and records the time from the opponent's move arriving, if the account has metrics
+
+        Args:
+            move (str, optional): The move (UCI). Defaults to not logging it.
+        """
+        if self.log is not None and move is not None:
+            self.log.sent(move)
+        if self.account.metrics is not None:
+            self.account.metrics.recordMove(self.gameid,time.perf_counter()-self.received)
+    def chooseMove(self, state: dict) -> str|None:
+        """Chooses the bot's next move. Override this
+
+        Args:
+            state (dict): The latest gameState event
+
+        Returns:
+            str | None: The move in UCI format (i.e. e2e4), or None to not move
+        """
+        return None
+    def onChatLine(self, event: dict) -> None:
+        pass
+    def onOpponentGone(self, event: dict) -> None:
+        pass
+    def onGameFinish(self, game: dict) -> None:
+        pass
+
+class engineHandler(gameHandler):
+    book = None #* an openingBook shared by every game (i.e. engineHandler.book = book.openingBook("book.bin"))
+    clock = timemanager.timeManager() #* shared by every game, so its stats cover them all
+    ponder = True #* search the expected reply during the opponent's turn
+    maxPondering = 1 #* how many games may ponder at once. Under the GIL every ponder thread takes CPU from the games on move
+    _ponders = {} #* game ID -> stop event of each running ponder search
+    _pondersLock = threading.Lock()
+    parallel = None #* a parallel.parallelSearch shared by every game, to search each move on several cores (i.e. engineHandler.parallel = parallel.parallelSearch())
+    def __init__(self, account: lichessAccount, gameid: str, stop: threading.Event) -> None:
+        """Plays a game with the built-in engine. Variants the engine does not know are left alone
+
+        Args:
+            account (lichessAccount): The account playing the game
+            gameid (str): The ID of the game
+            stop (threading.Event): Set when the runtime is shutting down
+        """
+        super().__init__(account,gameid,stop)
+        self.engine = engine.searchEngine(self.parallel.table if self.parallel is not None else account.table) #* every game of the account shares one table
+        self.variant = "standard"
+        self.speed = "blitz"
+        self.workers = 1 #* how many processes search each move
+        self._after = None #* (position after our last move, its history, our last principal variation)
+        self._pondering = None #* (thread, stop event, key of the pondered position, result)
+        self._pondered = None #* (key of the pondered position, result) once pondering has stopped
+        self._leftBook = None #* the ply where the book stopped covering the game
+    def play(self) -> None:
+        try:
+            super().play()
+        finally:
+            self._stopPondering()
+    def onGameFull(self, event: dict) -> None:
+        super().onGameFull(event)
+        self.variant = event.get("variant",{}).get("key","standard")
+        self.speed = event.get("speed") if event.get("speed") in timemanager.speeds else "blitz"
+        if self.parallel is not None:
+            self.workers = timemanager.workersFor(self.speed,self.parallel.workers,event.get("daysPerTurn"))
+    def onGameState(self, state: dict) -> None:
+        over = state.get("status") not in ("created","started")
+        if over or self.isMyTurn(state): #? our own move is echoed back as a gameState, which must not stop pondering
+            self._stopPondering()
+        if over or not self.isMyTurn(state):
+            return
+        move = self.chooseMove(state)
+        if move is None:
+            return
+        sent = time.perf_counter()
+        self.account.makeMoveInGame(self.gameid,move)
+        self.clock.recordLatency(time.perf_counter()-sent)
+        self.moved(move)
+        if self.ponder:
+            self._startPondering()
+    def chooseMove(self, state: dict) -> str|None:
+        if self.variant not in engine.variants: #? the engine can't play this variant
+            return None
+        board, history = self.board.position, self.board.history()
+        self._after = None
+        if self.book is not None and (self._leftBook is None or self.board.ply < self._leftBook): #? once out of book, later moves skip the lookup (unless moves are taken back)
+            if self.book.covers(self.variant,board):
+                move = self.book.choose(board,self.variant)
+                if move is not None: #* straight from the book, no search
+                    return move
+            else:
+                self._leftBook = self.board.ply
+        remaining = state.get("wtime" if self.color == "white" else "btime",60000)/1000
+        increment = state.get("winc" if self.color == "white" else "binc",0)/1000
+        budget = self.clock.budget(remaining,increment,ply=len(history),speed=self.speed)
+        start = time.perf_counter()
+        result = None
+        if self._pondered is not None:
+            key, pondered = self._pondered
+            self._pondered = None
+            hit = key == board.key() and pondered is not None
+            self.clock.recordPonder(self.speed,hit)
+            if hit and pondered["time"] >= budget: #* the ponder search already thought long enough
+                result = pondered
+            elif hit: #? the table is warm, so only the rest of the budget is needed
+                budget = max(self.clock.minThink,budget-pondered["time"])
+        if result is None:
+            self._preemptPondering()
+        if result is None and self.workers > 1:
+            result = self.parallel.search(board,movetime=budget,history=history,workers=self.workers,searcher=self.engine)
+        elif result is None:
+            result = self.engine.search(board,movetime=budget,history=history)
+        self.clock.recordMove(self.speed,time.perf_counter()-start)
+        self._after = (board.push(board.parseUci(result["move"])),history+[board.key()],result["pv"])
+        return result["move"]
+    def _startPondering(self) -> None:
+        """Searches the reply the last search expects, on a background thread, until the opponent moves
+        """
+        if self._after is None or len(self._after[2]) < 2:
+            return
+        board, history, pv = self._after
+        try:
+            expected = board.push(board.parseUci(pv[1]))
+        except ValueError:
+            return
+        if not expected.legalMoves():
+            return
+        stop, result = threading.Event(), {}
+        with self._pondersLock:
+            if len(self._ponders) >= self.maxPondering: #? another game is already pondering
+                return
+            self._ponders[self.gameid] = stop
+        thread = threading.Thread(target=lambda: result.update(self.engine.search(expected,history=history+[board.key()],stop=stop)),name=f"ponder-{self.gameid}",daemon=True)
+        self._pondering = (thread,stop,expected.key(),result)
+        thread.start()
+    def _stopPondering(self) -> None:
+        if self._pondering is None:
+            return
+        thread, stop, key, result = self._pondering
+        self._pondering = None
+        stop.set()
+        thread.join()
+        with self._pondersLock:
+            self._ponders.pop(self.gameid,None)
+        self._pondered = (key,result or None)
+    def _preemptPondering(self) -> None:
+        """Stops every other game's ponder search, so the search of the game on move (which has a fixed time budget) gets the CPU
+        """
+        with self._pondersLock:
+            for gameid, stop in self._ponders.items():
+                if gameid != self.gameid:
+                    stop.set()
+
+class challengeRules:
+    def __init__(self, *, variants:list|None=None, speeds:list|None=None, minInitial:float|None=None, maxInitial:float|None=None, rated:bool|None=None, minRating:int|None=None, maxRating:int|None=None, bots:bool=True, humans:bool=True) -> None:
+        """Declarative accept/decline rules for incoming challenges. Filters are compiled once, so deciding is a few set lookups
+
+        Args:
+            variants (list, optional): The variants to accept (i.e. ["standard","chess960"]). Defaults to every variant.
+            speeds (list, optional): The time controls to accept (see timemanager.speeds). Defaults to every time control.
+            minInitial (float, optional): The shortest initial clock to accept, in seconds. Defaults to None.
+            maxInitial (float, optional): The longest initial clock to accept, in seconds. Defaults to None.
+            rated (bool, optional): Only accept rated (True) or casual (False) games. Defaults to both.
+            minRating (int, optional): The lowest challenger rating to accept. With minRating or maxRating, challengers without a rating are declined. Defaults to None.
+            maxRating (int, optional): The highest challenger rating to accept. Defaults to None.
+            bots (bool, optional): Whether to accept challenges from bots. Defaults to True.
+            humans (bool, optional): Whether to accept challenges from humans. Defaults to True.
+        """
+        self._checks = [] #* (check, reason), run in order, so the first failing check picks the reason
+        if variants is not None:
+            acceptedVariants = frozenset(variants)
+            self._checks.append((lambda challenge: challenge["variant"]["key"] in acceptedVariants,"declineStandard" if acceptedVariants == {"standard"} else "declineVariant")) #? declineStandard is lichess's "I'm not accepting variant challenges right now"
+        if speeds is not None:
+            acceptedSpeeds = frozenset(speeds)
+            order = [timemanager.speeds.index(speed) for speed in speeds]
+            fastest, slowest = min(order), max(order)
+            def speedReason(challenge: dict) -> str|None:
+                speed = challenge.get("speed")
+                if speed in acceptedSpeeds:
+                    return None
+                index = timemanager.speeds.index(speed) if speed in timemanager.speeds else -1
+                return "declineTooFast" if index < fastest else "declineTooSlow" if index > slowest else "declineTimeControl"
+            self._checks.append((speedReason,None))
+        if minInitial is not None or maxInitial is not None:
+            def initialReason(challenge: dict) -> str|None:
+                control = challenge.get("timeControl",{})
+                if control.get("type") != "clock": #? correspondence and unlimited games have no clock
+                    return None if maxInitial is None else "declineTooSlow"
+                if minInitial is not None and control["limit"] < minInitial:
+                    return "declineTooFast"
+                if maxInitial is not None and control["limit"] > maxInitial:
+                    return "declineTooSlow"
+                return None
+            self._checks.append((initialReason,None))
+        if rated is not None:
+            self._checks.append((lambda challenge: bool(challenge.get("rated")) == rated,"declineCasual" if rated else "declineRated"))
+        if minRating is not None or maxRating is not None:
+            low, high = minRating if minRating is not None else float("-inf"), maxRating if maxRating is not None else float("inf")
+            def ratingReason(challenge: dict) -> str|None:
+                rating = (challenge.get("challenger") or {}).get("rating")
+                if rating is None: #! a challenger without a rating can't be checked, so it is declined
+                    return "declineGeneric"
+                return None if low <= rating <= high else "yourXRatingIsTooFarFromY"
+            self._checks.append((ratingReason,None))
+        if not bots:
+            self._checks.append((lambda challenge: (challenge.get("challenger") or {}).get("title") != "BOT","declineNoBot"))
+        if not humans:
+            self._checks.append((lambda challenge: (challenge.get("challenger") or {}).get("title") == "BOT","declineOnlyBot"))
+    def __call__(self, challenge: dict) -> str|None:
+        """Decides a challenge
+
+        Args:
+            challenge (dict): The challenge, as sent in a challenge event
+
+        Returns:
+            str | None: None to accept it, or the reason to decline it with (one of declineReasons)
+        """
+        for check, reason in self._checks:
+            result = check(challenge)
+            if reason is None: #? the check returns its own reason
+                if result is not None:
+                    return result
+            elif not result:
+                return reason
+        return None
+
+class challengeTriage:
+    def __init__(self, account: lichessAccount, rules=None, *, maxGames:int=8, active=None, batchSize:int=32, batchWindow:float=0.02, reserveFor:float=30) -> None:
+        """Answers incoming challenges in batches: decides each one with the rules, then sends every accept and decline at once through the account's scheduler
+
+        Args:
+            account (lichessAccount): The bot account
+            rules (callable, optional): Gets a challenge and returns None to accept it or a decline reason (i.e. a challengeRules). Defaults to accepting every challenge.
+            maxGames (int, optional): How many games can be played at once. Challenges over the cap are declined with "declineLater". Defaults to 8.
+            active (callable, optional): Returns how many games are being played. Defaults to counting accepted challenges only.
+            batchSize (int, optional): The most challenges decided at once. Defaults to 32.
+            batchWindow (float, optional): How long to wait for more challenges once one arrives, in seconds. Defaults to 0.02.
+            reserveFor (float, optional): How long an accepted challenge holds a game slot if its game never starts, in seconds. Defaults to 30.
+        """
+        self.account = account
+        self.rules = rules
+        self.maxGames = maxGames
+        self.active = active
+        self.batchSize = batchSize
+        self.batchWindow = batchWindow
+        self.reserveFor = reserveFor
+        self.counts = {"accepted": 0,"declined": 0,"failed": 0}
+        self._queue = [] #* (arrival, challenge)
+        self._reserved = {} #* challengeid: when it was accepted (the game has the challenge's ID)
+        self._decisionLatency = deque(maxlen=1024) #* arrival until the answer is sent, in seconds
+        self._answerLatency = deque(maxlen=1024) #* arrival until the answer is acknowledged, in seconds
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._work,name="lichess-triage",daemon=True)
+        self._thread.start()
+    def put(self, challenge: dict) -> None:
+        """Queues an incoming challenge
+
+        Args:
+            challenge (dict): The challenge, as sent in a challenge event
+        """
+        with self._condition:
+            self._queue.append((time.monotonic(),challenge))
+            self._condition.notify()
+    def poll(self) -> int:
+        """Queues every challenge waiting for the bot (i.e. the ones sent while it was offline)
+
+        Returns:
+            int: How many challenges were queued
+        """
+        incoming = self.account.getChallenges()[0]
+        for challenge in incoming:
+            self.put(challenge)
+        return len(incoming)
+    def started(self, gameid: str) -> None:
+        """Frees the slot reserved by an accepted challenge once its game starts (and is counted by active)
+        """
+        with self._condition:
+            self._reserved.pop(gameid,None)
+    def queueDepth(self) -> int:
+        """Gets how many challenges are waiting for a decision"""
+        with self._condition:
+            return len(self._queue)
+    def stats(self) -> dict:
+        """Gets the triage counters and latencies
+
+        Returns:
+            dict: "queued", "reserved", "accepted", "declined" and "failed" counts, and p50/p99 "decision" (until the answer is sent) and "answer" (until it is acknowledged) latencies in milliseconds
+        """
+        with self._condition:
+            report = {"queued": len(self._queue),"reserved": len(self._reserved),**self.counts}
+            latencies = {"decision": sorted(self._decisionLatency),"answer": sorted(self._answerLatency)}
+        for name, values in latencies.items():
+            report[f"{name}P50"] = values[len(values)//2]*1000 if values else 0.0
+            report[f"{name}P99"] = values[min(len(values)-1,len(values)*99//100)]*1000 if values else 0.0
+        return report
+    def close(self) -> None:
+        """Answers every queued challenge, then stops
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._queue and not self._closed:
+                    self._condition.wait()
+                if not self._queue: #* closed and drained
+                    return
+                deadline = time.monotonic()+self.batchWindow
+                while len(self._queue) < self.batchSize and not self._closed: #* gather a batch
+                    left = deadline-time.monotonic()
+                    if left <= 0:
+                        break
+                    self._condition.wait(left)
+                batch, self._queue = self._queue[:self.batchSize], self._queue[self.batchSize:]
+            self._answer(batch)
+    def _answer(self, batch: list) -> None:
+        now = time.monotonic()
+        with self._condition:
+            for challengeid, accepted in list(self._reserved.items()): #? the game never started
+                if now-accepted > self.reserveFor:
+                    del self._reserved[challengeid]
+            free = self.maxGames-len(self._reserved)-(self.active() if self.active is not None else 0)
+        for arrival, challenge in batch:
+            reason = self.rules(challenge) if self.rules is not None else None
+            if reason is None and free <= 0:
+                reason = "declineLater"
+            if reason is None:
+                free -= 1
+                with self._condition:
+                    self._reserved[challenge["id"]] = now
+                future = self.account.submit(self.account.acceptChallenge,challenge["id"])
+            else:
+                future = self.account.submit(self.account.declineChallenge,challenge["id"],reason)
+            with self._condition:
+                self._decisionLatency.append(time.monotonic()-arrival)
+            future.add_done_callback(lambda future, arrival=arrival, challengeid=challenge["id"], accepted=reason is None: self._answered(future,arrival,challengeid,accepted))
+    def _answered(self, future: Future, arrival: float, challengeid: str, accepted: bool) -> None:
+        with self._condition:
+            self._answerLatency.append(time.monotonic()-arrival)
+            if future.exception() is not None: #? the challenge may already be gone
+                self.counts["failed"] += 1
+                self._reserved.pop(challengeid,None)
+            else:
+                self.counts["accepted" if accepted else "declined"] += 1
+
+class botRuntime:
+    def __init__(self, account: lichessAccount, handler: type=gameHandler, *, maxGames:int=8, acceptChallenge=None, store:gamelog.gameStore|None=None) -> None:
+        """Runs a bot: reads the event stream, answers challenges and plays every game on a bounded worker pool
+
+        Args:
+            account (lichessAccount): The bot account. Its poolSize should be above maxGames, as every game holds a connection open.
+            handler (type, optional): Called as handler(account, gameid, stop) for every game, then its play() method is run on the pool. Defaults to gameHandler.
+            maxGames (int, optional): How many games can be played at once. Challenges are declined with "declineLater" while every slot is taken. Defaults to 8.
+            acceptChallenge (callable, optional): Gets a challenge and returns None to accept it or a decline reason (i.e. a challengeRules). Defaults to accepting every challenge.
+            store (gamelog.gameStore, optional): Logs every game, so the games a crashed run was playing are resumed by the next one. Defaults to not logging.
+        """
+        self.account = account
+        self.store = store
+        self.handler = handler
+        self.maxGames = maxGames
+        self.acceptChallenge = acceptChallenge
+        self.stopping = threading.Event()
+        self.games = {} #* gameid: (handler, future)
+        self._slots = threading.BoundedSemaphore(maxGames)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=maxGames,thread_name_prefix="lichess-game")
+        self.triage = challengeTriage(account,acceptChallenge,maxGames=maxGames,active=lambda: len(self.games)) #* challenges are answered in batches, off the event stream's thread
+    def run(self) -> None:
+        """Runs until the event stream ends or stop() is called, then waits for the running games to finish their current move
+        """
+        try:
+            if self.store is not None:
+                for gameid in self.store.openGames(): #* resume from the logs, without waiting for the event stream to announce them
+                    self._onGameStart({"gameId": gameid})
+            for event in self.account.streamEvents(stop=self.stopping): #* keeps the bot online
+                self.dispatch(event)
+        except BaseException:
+            self.stopping.set()
+            raise
+        finally:
+            self.triage.close()
+            self._pool.shutdown(wait=True) #* drain
+    def stop(self) -> None:
+        """Stops reading events and asks every game to stop after its current move
+        """
+        self.stopping.set()
+    def full(self) -> bool:
+        with self._lock:
+            return len(self.games) >= self.maxGames
+    def dispatch(self, event: dict) -> None:
+        """Routes an event from the event stream
+
+        Args:
+            event (dict): The event
+        """
+        kind = event.get("type")
+        if kind == "challenge":
+            self._onChallenge(event["challenge"])
+        elif kind == "gameStart":
+            self._onGameStart(event["game"])
+        elif kind == "gameFinish":
+            self._onGameFinish(event["game"])
+    def _onChallenge(self, challenge: dict) -> None:
+        if (challenge.get("challenger") or {}).get("id") == self.account.accountinfo["id"]: #? our own challenge
+            return
+        self.triage.put(challenge)
+    def _onGameStart(self, game: dict) -> None:
+        gameid = game.get("gameId",game.get("id"))
+        with self._lock:
+            if gameid in self.games: #? already playing it (the stream was reopened)
+                return
+        while not self._slots.acquire(timeout=0.5): #* backpressure: stop reading events until a slot is free
+            if self.stopping.is_set():
+                return
+        handler = self.handler(self.account,gameid,self.stopping)
+        if self.store is not None:
+            handler.log = self.store.open(gameid)
+            if handler.log.recovered is not None: #? its stream's gameFull only appends what changed while we were gone
+                handler.resume(handler.log.recovered)
+        with self._lock:
+            self.games[gameid] = (handler,self._pool.submit(self._play,handler))
+        self.triage.started(gameid)
+    def _play(self, handler: gameHandler) -> None:
+        try:
+            handler.play()
+        except Exception as error:
+            if __debug__:
+                print(f"Game {handler.gameid} crashed: {error!r}")
+            if handler.log is not None and isinstance(error,ConnectionError) and not isinstance(error,StreamDroppedError): #? the game's stream was not found, so the next run does not resume it. A dropped stream or a crashed handler leaves the game live, to be resumed
+                handler.log.close(status="aborted")
+        finally:
+            if handler.log is not None:
+                self.store.archive(handler.log)
+            with self._lock:
+                self.games.pop(handler.gameid,None)
+            self._slots.release()
+    def _onGameFinish(self, game: dict) -> None:
+        with self._lock:
+            entry = self.games.get(game.get("gameId",game.get("id")))
+        if entry is not None:
+            entry[0].onGameFinish(game)
 
 #* CUI Interface
 if __name__ == "__main__":
-    account = lichessAccount(token)
-    #print(account.getAccountInfo())
-    print(account.getEmail())
-    #// asyncio.run(account.updateAccountInfo())
\ No newline at end of file
+    account = lichessAccount(loadToken(prompt=True),poolSize=16)
+    print(f"Logged in as {account.accountinfo['username']}")
+    if os.path.exists("book.bin"): #* use an opening book if there is one
+        engineHandler.book = book.openingBook("book.bin")
+    if (os.cpu_count() or 1) > 1: #* search longer games' moves on several cores
+        engineHandler.parallel = parallel.parallelSearch()
+    runtime = botRuntime(account,engineHandler,acceptChallenge=challengeRules(variants=engine.variants),store=gamelog.gameStore("games")) #* games are resumed from ./games after a crash
+    try:
+        runtime.run()
+    except KeyboardInterrupt:
+        print("Stopped")
+    finally:
+        account.close()
\ No newline at end of file
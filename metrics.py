@@ -0,0 +1,223 @@
+import bisect
+import json
+import re
+import threading
+import time
+
+#--------------------------------------------------------------#
+#Per-endpoint request metrics and game timings
+#Pass a requestMetrics to lichessAccount(metrics=...). Without one,
+#requests are not wrapped at all.
+#--------------------------------------------------------------#
+
+latencyBuckets = [0.001,0.0025,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10] #* histogram upper bounds, in seconds (the last bucket is +Inf)
+
+#* paths with IDs in them, grouped into one endpoint each
+endpointPatterns = [(re.compile(pattern),template) for pattern, template in [
+    (r"/api/bot/game/stream/[^/]+","/api/bot/game/stream/{id}"),
+    (r"/api/bot/game/[^/]+/move/[^/]+","/api/bot/game/{id}/move/{move}"),
+    (r"/api/bot/game/[^/]+/(abort|resign|chat)",r"/api/bot/game/{id}/\1"),
+    (r"/api/challenge/(ai|open)",r"/api/challenge/\1"),
+    (r"/api/challenge/[^/]+/(accept|decline|cancel)",r"/api/challenge/{id}/\1"),
+    (r"/api/challenge/[^/]+","/api/challenge/{user}"),
+    (r"/api/games/user/[^/]+","/api/games/user/{user}"),
+]]
+
+class histogram:
+    def __init__(self, buckets: list=latencyBuckets) -> None:
+        """A cumulative-on-export latency histogram
+
+        Args:
+            buckets (list, optional): The bucket upper bounds, in seconds. Defaults to latencyBuckets.
+        """
+        self.buckets = buckets
+        self.counts = [0]*(len(buckets)+1) #* the last count is +Inf
+        self.sum = 0.0
+        self.count = 0
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets,seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+    def quantile(self, q: float) -> float:
+        """Estimates a quantile from the buckets (the upper bound of the bucket it falls in)
+
+        Args:
+            q (float): The quantile (i.e. 0.99)
+
+        Returns:
+            float: The estimate, in seconds (inf if it is past the last bucket)
+        """
+        if not self.count:
+            return 0.0
+        rank, seen = q*self.count, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+    def snapshot(self) -> dict:
+        return {"count": self.count,"sum": self.sum,"buckets": dict(zip([str(bound) for bound in self.buckets]+["+Inf"],self.counts)),"p50": self.quantile(0.5),"p99": self.quantile(0.99)}
+
+class requestMetrics:
+    def __init__(self) -> None:
+        """Records per-endpoint latency histograms, status codes, 429s, bytes and in-flight requests, plus game timings
+
+        Callbacks (see addCallback) are called on the thread that made the request, so they should be quick:
+            "start": called with (method, endpoint) when a request is sent. What it returns (i.e. a tracer span) is passed on in the record's "contexts"
+            "finish": called with a record when the request completes: method, endpoint, path, status (0 if it failed), seconds, bytesIn, bytesOut, error and contexts
+            "move": called with (gameid, seconds) when a move is acknowledged, seconds being from the opponent's move arriving
+        """
+        self._lock = threading.Lock()
+        self._endpoints = {} #* path: endpoint, so each path is only matched once
+        self.latency = {} #* (method, endpoint): histogram
+        self.statuses = {} #* (method, endpoint, status): count
+        self.rateLimited = {} #* (method, endpoint): count
+        self.bytesIn = {} #* (method, endpoint): bytes
+        self.bytesOut = {} #* (method, endpoint): bytes
+        self.inFlight = {} #* (method, endpoint): requests being sent
+        self.moveLatency = histogram()
+        self.callbacks = {"start": [],"finish": [],"move": []}
+    def addCallback(self, kind: str, callback) -> None:
+        """Adds a callback (i.e. to feed our own tracer)
+
+        Args:
+            kind (str): "start", "finish" or "move"
+            callback (callable): See help(requestMetrics)
+
+        Raises:
+            ValueError: Raises if the kind is invalid
+        """
+        if kind not in self.callbacks:
+            raise ValueError("Invalid callback kind")
+        self.callbacks[kind].append(callback)
+    def endpointOf(self, path: str) -> str:
+        """Gets the endpoint of a path, with its IDs replaced (i.e. /api/bot/game/{id}/move/{move})
+        """
+        endpoint = self._endpoints.get(path)
+        if endpoint is None:
+            endpoint = path.split("?")[0]
+            for pattern, template in endpointPatterns:
+                if pattern.fullmatch(endpoint):
+                    endpoint = pattern.sub(template,endpoint)
+                    break
+            if len(self._endpoints) < 4096: #? game IDs make paths unbounded
+                self._endpoints[path] = endpoint
+        return endpoint
+    def timeRequest(self, method: str, path: str, send, *, streamed: bool=False):
+        """Sends a request, recording it
+
+        Args:
+            method (str): The HTTP method (i.e. "GET")
+            path (str): The path of the API call (i.e. "/api/account")
+            send (callable): Sends the request and returns a requests.Response
+            streamed (bool, optional): If the body is streamed, so it is not read here (count it with addBytes). Defaults to False.
+
+        Returns:
+            requests.Response: What send returned
+        """
+        key = (method,self.endpointOf(path))
+        contexts = [callback(*key) for callback in self.callbacks["start"]]
+        with self._lock:
+            self.inFlight[key] = self.inFlight.get(key,0)+1
+        start = time.perf_counter()
+        response, error = None, None
+        try:
+            response = send()
+            return response
+        except Exception as exception:
+            error = exception
+            raise
+        finally:
+            seconds = time.perf_counter()-start
+            status = response.status_code if response is not None else 0 #* 0 if the request failed
+            received = (len(response.content) if not streamed else 0) if response is not None else 0
+            body = response.request.body if response is not None else None
+            sent = len(body) if body else 0
+            with self._lock:
+                self.inFlight[key] -= 1
+                if key not in self.latency:
+                    self.latency[key] = histogram()
+                self.latency[key].observe(seconds)
+                self.statuses[key+(status,)] = self.statuses.get(key+(status,),0)+1
+                if status == 429:
+                    self.rateLimited[key] = self.rateLimited.get(key,0)+1
+                self.bytesIn[key] = self.bytesIn.get(key,0)+received
+                self.bytesOut[key] = self.bytesOut.get(key,0)+sent
+            if self.callbacks["finish"]:
+                record = {"method": method,"endpoint": key[1],"path": path,"status": status,"seconds": seconds,"bytesIn": received,"bytesOut": sent,"error": error,"contexts": contexts}
+                for callback in self.callbacks["finish"]:
+                    callback(record)
+    def addBytes(self, method: str, path: str, received: int) -> None:
+        """Counts bytes read from a streamed body
+        """
+        key = (method,self.endpointOf(path))
+        with self._lock:
+            self.bytesIn[key] = self.bytesIn.get(key,0)+received
+    def recordMove(self, gameid: str, seconds: float) -> None:
+        """Records the time from the opponent's move arriving to ours being acknowledged
+
+        Args:
+            gameid (str): The game
+            seconds (float): The time
+        """
+        with self._lock:
+            self.moveLatency.observe(seconds)
+        for callback in self.callbacks["move"]:
+            callback(gameid,seconds)
+    def snapshot(self) -> dict:
+        """Gets every metric as plain data
+
+        Returns:
+            dict: {"endpoints": {"METHOD endpoint": {"latency", "statuses", "rateLimited", "bytesIn", "bytesOut", "inFlight"}}, "moveLatency": histogram}
+        """
+        with self._lock:
+            keys = set(self.latency) | set(self.inFlight) | set(self.bytesIn)
+            endpoints = {}
+            for key in sorted(keys):
+                endpoints[" ".join(key)] = {
+                    "latency": self.latency[key].snapshot() if key in self.latency else histogram().snapshot(),
+                    "statuses": {str(status): count for (method, endpoint, status), count in self.statuses.items() if (method,endpoint) == key},
+                    "rateLimited": self.rateLimited.get(key,0),
+                    "bytesIn": self.bytesIn.get(key,0),
+                    "bytesOut": self.bytesOut.get(key,0),
+                    "inFlight": self.inFlight.get(key,0)}
+            return {"endpoints": endpoints,"moveLatency": self.moveLatency.snapshot()}
+    def toJSON(self) -> str:
+        return json.dumps(self.snapshot())
+    def toPrometheus(self, prefix: str="lichess") -> str:
+        """Gets every metric in the Prometheus text exposition format
+
+        Args:
+            prefix (str, optional): Prepended to every metric name. Defaults to "lichess".
+
+        Returns:
+            str: The snapshot
+        """
+        def labels(method: str, endpoint: str, **extra) -> str:
+            pairs = {"method": method,"endpoint": endpoint} | extra
+            return ",".join([f'{name}="{value}"' for name, value in pairs.items()])
+        def histogramLines(name: str, values: histogram, label: str) -> list:
+            lines, cumulative = [], 0
+            for bound, count in zip([str(bound) for bound in values.buckets]+["+Inf"],values.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label}{"," if label else ""}le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{label}}} {values.sum}")
+            lines.append(f"{name}_count{{{label}}} {values.count}")
+            return lines
+        with self._lock:
+            lines = [f"# TYPE {prefix}_request_seconds histogram"]
+            for key, values in sorted(self.latency.items()):
+                lines += histogramLines(f"{prefix}_request_seconds",values,labels(*key))
+            lines.append(f"# TYPE {prefix}_responses_total counter")
+            lines += [f"{prefix}_responses_total{{{labels(method,endpoint,status=status)}}} {count}" for (method, endpoint, status), count in sorted(self.statuses.items())]
+            lines.append(f"# TYPE {prefix}_rate_limited_total counter")
+            lines += [f"{prefix}_rate_limited_total{{{labels(*key)}}} {count}" for key, count in sorted(self.rateLimited.items())]
+            lines.append(f"# TYPE {prefix}_received_bytes_total counter")
+            lines += [f"{prefix}_received_bytes_total{{{labels(*key)}}} {count}" for key, count in sorted(self.bytesIn.items())]
+            lines.append(f"# TYPE {prefix}_sent_bytes_total counter")
+            lines += [f"{prefix}_sent_bytes_total{{{labels(*key)}}} {count}" for key, count in sorted(self.bytesOut.items())]
+            lines.append(f"# TYPE {prefix}_requests_in_flight gauge")
+            lines += [f"{prefix}_requests_in_flight{{{labels(*key)}}} {count}" for key, count in sorted(self.inFlight.items())]
+            lines.append(f"# TYPE {prefix}_move_seconds histogram")
+            lines += histogramLines(f"{prefix}_move_seconds",self.moveLatency,"")
+        return "\n".join(lines)+"\n"
@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import engine
+
+#--------------------------------------------------------------#
+#Lazy SMP: one position searched by several processes at once
+#Every process runs the normal search on the same position and
+#they share one transposition table in shared memory, so each
+#finds the others' results. The main search runs in the calling
+#thread; helpers start a depth deeper every other process.
+#--------------------------------------------------------------#
+
+flagSlots = 64 #* how many parallel searches can run at once (each has a stop flag in the shared memory)
+
+class sharedTable(engine.transpositionTable):
+    def __init__(self, sizeMB: float=64, *, name: str|None=None) -> None:
+        """A transposition table in shared memory, so searches in other processes can use it (see engine.transpositionTable)
+
+        Entries are written without locks: a torn entry fails the table's key check. Probe and store counts are per process.
+
+        Args:
+            sizeMB (float, optional): The memory budget in MiB. Defaults to 64.
+            name (str, optional): Attaches to the table with this name (created by another process) instead of creating one. Defaults to creating one.
+
+        Raises:
+            ValueError: Raises if the size is too small
+            FileNotFoundError: Raises if there is no table with that name
+        """
+        entries = int(sizeMB*1024*1024) // self.entryBytes // 2*2
+        if entries < 2:
+            raise ValueError("Invalid table size")
+        self.sizeMB = sizeMB
+        self.buckets = entries // 2
+        self.owner = name is None #* the process that created the table frees it
+        self._memory = shared_memory.SharedMemory(name=name,create=self.owner,size=16*entries+flagSlots) #? helpers share their parent's resource tracker, so it is freed once, by the owner
+        self.name = self._memory.name
+        self.keys = self._memory.buf[:8*entries].cast("Q")
+        self.data = self._memory.buf[8*entries:16*entries].cast("Q") #* move:16 | score+2^23:24 | depth:8 | bound:2 | generation:6 | used:1
+        self.flags = self._memory.buf[16*entries:16*entries+flagSlots] #* one stop flag per running search
+        self.generation = 0
+        self.probes = self.hits = self.stores = self.replacements = 0
+    def clear(self) -> None:
+        self._memory.buf[:16*self.buckets*2] = bytes(16*self.buckets*2) #? in place, as other processes hold views of it
+        self.probes = self.hits = self.stores = self.replacements = 0
+    def close(self) -> None:
+        """Detaches from the table, freeing it if this process created it
+        """
+        if self._memory is None:
+            return
+        for view in (self.keys,self.data,self.flags):
+            view.release()
+        self._memory.close()
+        if self.owner:
+            self._memory.unlink()
+        self._memory = None
+    def __enter__(self) -> "sharedTable":
+        return self
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class _flag:
+    def __init__(self, table: sharedTable, slot: int) -> None:
+        """A stop flag in a shared table, for engine.searchEngine.search(stop=...)
+        """
+        self.table = table
+        self.slot = slot
+    def is_set(self) -> bool:
+        return bool(self.table.flags[self.slot])
+
+_helper = None #* this helper process's searchEngine, on the shared table
+
+def _attach(name: str, sizeMB: float) -> None:
+    global _helper
+    _helper = engine.searchEngine(sharedTable(sizeMB,name=name))
+
+def _helpSearch(board: engine.position, history: list, depth: int, deadline: float|None, generation: int, slot: int, startDepth: int) -> int:
+    """Searches a position in a helper process until the main search is done
+
+    Returns:
+        int: The nodes searched
+    """
+    table = _helper.table
+    if table.flags[slot]: #? the main search already finished
+        return 0
+    movetime = deadline-time.time() if deadline is not None else None
+    if movetime is not None and movetime <= 0:
+        return 0
+    table.generation = (generation-1) & 63 #? search() ages the table once, which brings it to the main search's generation
+    try:
+        return _helper.search(board,depth=depth,movetime=movetime,history=history,stop=_flag(table,slot),startDepth=startDepth)["nodes"]
+    except ValueError: #* no legal move
+        return 0
+
+class parallelSearch:
+    def __init__(self, workers: int|None=None, *, tableMB: float=64) -> None:
+        """Searches positions across a pool of helper processes that share a transposition table (Lazy SMP)
+
+        Args:
+            workers (int, optional): The most processes a search can use, counting the calling one. Defaults to one per core.
+            tableMB (float, optional): The size of the shared transposition table, in MiB. Defaults to 64.
+        """
+        self.workers = max(1,workers or os.cpu_count() or 1)
+        self.table = sharedTable(tableMB)
+        self._slots = list(range(flagSlots))
+        self._lock = threading.Lock()
+        self._pool = None
+        if self.workers > 1: #? spawned, as forking a process with running threads can copy held locks
+            self._pool = ProcessPoolExecutor(max_workers=self.workers-1,mp_context=multiprocessing.get_context("spawn"),initializer=_attach,initargs=(self.table.name,tableMB))
+    def search(self, board: engine.position, *, depth: int=64, movetime: float|None=None, history: list=[], workers: int|None=None, searcher: engine.searchEngine|None=None) -> dict:
+        """Finds the best move, using up to workers processes
+
+        Args:
+            board (engine.position): The position to search
+            depth (int, optional): The deepest iteration to search. Defaults to 64.
+            movetime (float, optional): How long to search, in seconds. Defaults to no limit.
+            history (list, optional): The keys of the positions before this one in the game, to detect repetitions. Defaults to [].
+            workers (int, optional): How many processes to search with, counting this one (see timemanager.workersFor). Defaults to all of them.
+            searcher (engine.searchEngine, optional): The main search's engine (it should use this table). Defaults to a new one.
+
+        Raises:
+            ValueError: Raises if there is no legal move
+
+        Returns:
+            dict: What engine.searchEngine.search returns for the main search, with "nodes" counting every process, plus "workers"
+        """
+        searcher = searcher if searcher is not None else engine.searchEngine(self.table)
+        workers = min(workers or self.workers,self.workers)
+        if workers <= 1 or self._pool is None:
+            return searcher.search(board,depth=depth,movetime=movetime,history=history) | {"workers": 1}
+        with self._lock:
+            slot = self._slots.pop() if self._slots else None
+        if slot is None: #? too many searches at once, so this one runs alone
+            return searcher.search(board,depth=depth,movetime=movetime,history=history) | {"workers": 1}
+        self.table.flags[slot] = 0
+        try:
+            generation = (self.table.generation+1) & 63 #* what the main search will age the table to
+            deadline = time.time()+movetime if movetime is not None else None
+            helpers = [self._pool.submit(_helpSearch,board,list(history),depth,deadline,generation,slot,1+helper % 2) for helper in range(1,workers)]
+            result = searcher.search(board,depth=depth,movetime=movetime,history=history)
+            self.table.flags[slot] = 1 #* stop the helpers
+            result["nodes"] += sum([helper.result() for helper in helpers])
+        finally:
+            self.table.flags[slot] = 1
+            with self._lock:
+                self._slots.append(slot)
+        return result | {"workers": workers}
+    def warm(self) -> None:
+        """Starts every helper process now, rather than on the first search
+        """
+        if self._pool is not None:
+            for helper in [self._pool.submit(time.sleep,0) for _ in range(self.workers-1)]:
+                helper.result()
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        self.table.close()
+    def __enter__(self) -> "parallelSearch":
+        return self
+    def __exit__(self, *exc) -> None:
+        self.close()
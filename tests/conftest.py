@@ -0,0 +1,4 @@
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #* the modules live at the top of the repository
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+import archive
+import fakeserver
+from benchmark import unthrottled
+from main import lichessAccount
+
+#--------------------------------------------------------------#
+#gameArchive exports from a local fake lichess (see fakeserver.py)
+#Run with: python -m pytest tests
+#--------------------------------------------------------------#
+
+def exported(fake: fakeserver.fakeLichess, directory: str, **options) -> int:
+    """Exports the account's games into an archive
+
+    Returns:
+        int: How many games were added
+    """
+    account = lichessAccount("test",fake.endpoint,scheduler=unthrottled())
+    try:
+        with archive.gameArchive(directory,chunkRows=256) as games:
+            return games.export(account,**options)
+    finally:
+        account.close()
+
+def test_export_archives_every_game(tmp_path):
+    with fakeserver.fakeLichess(history=1000,seed=1) as fake:
+        assert exported(fake,str(tmp_path)) == 1000
+    with archive.gameArchive(str(tmp_path)) as games:
+        assert len(games) == 1000 and len(np.unique(games.column("id"))) == 1000
+        assert (np.diff(games.column("createdAt")) >= 0).all()
+        assert games.column("plies").sum() == games.totals["moves"]
+        assert all([len(games.movesOf(index)) == games.column("plies")[index] for index in (0,500,-1)])
+
+def test_export_picks_up_where_it_stopped(tmp_path):
+    with fakeserver.fakeLichess(history=1000,seed=1) as fake:
+        assert exported(fake,str(tmp_path),limit=300) == 300
+        assert exported(fake,str(tmp_path)) == 700
+        assert exported(fake,str(tmp_path)) == 0
+    with archive.gameArchive(str(tmp_path)) as games:
+        assert len(games) == 1000 and len(np.unique(games.column("id"))) == 1000
+
+def test_dropped_export_is_resumed(tmp_path):
+    with fakeserver.fakeLichess(history=1000,seed=1,dropExports=1) as fake:
+        assert exported(fake,str(tmp_path)) == 1000
+        assert fake.requests["exportGames"] == 2
+    with archive.gameArchive(str(tmp_path)) as games:
+        assert len(np.unique(games.column("id"))) == 1000
+
+def test_archive_keeps_one_user(tmp_path):
+    with fakeserver.fakeLichess(history=10,seed=1) as fake:
+        exported(fake,str(tmp_path))
+        with pytest.raises(ValueError):
+            exported(fake,str(tmp_path),user="someoneElse")
+
+def test_winRate_leaves_out_unplayed_games(tmp_path):
+    with fakeserver.fakeLichess(history=1000,seed=1) as fake:
+        exported(fake,str(tmp_path))
+    with archive.gameArchive(str(tmp_path)) as games:
+        statuses = games.labels("status")
+        aborted = int((statuses == "aborted").sum())
+        assert aborted > 0
+        played = games.winRate(("speed",))
+        everything = games.winRate(("speed",),played=False)
+        assert sum([stats["games"] for stats in played.values()]) == len(games)-aborted
+        assert sum([stats["games"] for stats in everything.values()]) == len(games)
+        results = games.column("result")[statuses != "aborted"]
+        assert sum([stats["draws"] for stats in played.values()]) == int((results == 0).sum())
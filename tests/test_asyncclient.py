@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import pytest
+
+import fakeserver
+from asyncclient import asyncLichessAccount
+from benchmark import playGame
+from main import StreamDroppedError, TokenError
+
+#--------------------------------------------------------------#
+#asyncLichessAccount against a local fake lichess (see fakeserver.py)
+#Run with: python -m pytest tests
+#--------------------------------------------------------------#
+
+def test_connect_rejects_bad_token():
+    async def connect(endpoint: str) -> None:
+        async with asyncLichessAccount("revoked",endpoint):
+            pass
+    with fakeserver.fakeLichess(badTokens=["revoked"]) as fake:
+        with pytest.raises(TokenError):
+            asyncio.run(connect(fake.endpoint))
+
+def test_concurrent_games_finish_without_errors(games: int=50):
+    async def play(endpoint: str) -> tuple:
+        async with asyncLichessAccount("test",endpoint,poolSize=20) as account:
+            latencies = []
+            gameids = [fakeserver.remoteGame(endpoint,color="white",limit=180) for _ in range(games)]
+            results = await asyncio.gather(*[playGame(account,gameid,latencies) for gameid in gameids],return_exceptions=True)
+            return results, latencies
+    with fakeserver.spawn(maxPlies=20) as endpoint:
+        results, latencies = asyncio.run(play(endpoint))
+    assert [result for result in results if isinstance(result,BaseException)] == []
+    assert len(latencies) == games*10 #* white moves on every other of the 20 plies
+
+def test_unknown_stream_fails_at_once():
+    async def stream(endpoint: str) -> None:
+        async with asyncLichessAccount("test",endpoint) as account:
+            async for _ in account.streamGame("nosuchgame"):
+                pass
+    with fakeserver.fakeLichess() as fake:
+        start = time.perf_counter()
+        with pytest.raises(ConnectionError) as error:
+            asyncio.run(stream(fake.endpoint))
+        assert not isinstance(error.value,StreamDroppedError) and time.perf_counter()-start < 1
+        assert fake.requests["gameStream"] == 1 #? a 404 is never retried
+
+def test_dropped_stream_reconnects():
+    async def play(endpoint: str, gameid: str) -> list:
+        async with asyncLichessAccount("test",endpoint) as account:
+            latencies = []
+            await playGame(account,gameid,latencies)
+            return latencies
+    with fakeserver.fakeLichess(maxPlies=10,dropStreams=1) as fake:
+        game = fake.startGame("white")
+        latencies = asyncio.run(play(fake.endpoint,game.id))
+        assert fake.requests["gameStream"] == 2 and game.status != "started" and len(latencies) == 5
+
+def test_move_resent_only_when_unanswered():
+    async def move(fake: fakeserver.fakeLichess, timeout: float) -> Exception|None:
+        async with asyncLichessAccount("test",fake.endpoint,timeout=timeout) as account: #? connecting leaves pooled connections, so the move goes out on a reused one
+            game = fake.startGame("white",limit=None,days=3)
+            try:
+                await account.makeMoveInGame(game.id,"e2e4")
+            except ConnectionError as error:
+                return error
+    with fakeserver.fakeLichess(dropMoves=1) as fake:
+        assert asyncio.run(move(fake,5)) is None
+        assert fake.requests["move"] == 1 and list(fake.games.values())[0].moves[:1] == ["e2e4"]
+    with fakeserver.fakeLichess(stallMoves=1,stall=1) as fake:
+        assert asyncio.run(move(fake,0.3)) is not None #! a move that may have been played is never sent twice
+        assert fake.requests["move"] == 1
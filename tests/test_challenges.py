@@ -0,0 +1,41 @@
+import asyncio
+
+import fakeserver
+from asyncclient import asyncLichessAccount
+from main import RateLimitedException, gameSetup, lichessAccount, requestScheduler
+
+#--------------------------------------------------------------#
+#Bulk challenges (challengeMany) against a local fake lichess (see fakeserver.py)
+#Run with: python -m pytest tests
+#--------------------------------------------------------------#
+
+targets = ["alice","closed","busy","bob",3]
+rules = gameSetup(correspondence=False,initTime=180)
+
+def checkReports(reports: list) -> None:
+    """Checks one failed challenge didn't stop the others, and that every target's outcome is in its report
+    """
+    assert [report["done"] for report in reports] == list(range(1,len(targets)+1))
+    assert all([report["total"] == len(targets) for report in reports])
+    byTarget = {report["target"]: report for report in reports}
+    assert sorted(byTarget,key=str) == sorted(targets,key=str)
+    assert isinstance(byTarget["closed"]["error"],ConnectionError) and "result" not in byTarget["closed"]
+    assert isinstance(byTarget["busy"]["error"],RateLimitedException) and "result" not in byTarget["busy"]
+    for target in ("alice","bob",3):
+        assert "error" not in byTarget[target] and byTarget[target]["result"]
+
+def test_challengeMany_survives_failed_targets():
+    with fakeserver.fakeLichess(refuseChallenges={"closed": 400,"busy": 429},retryAfter=0.05) as fake:
+        account = lichessAccount("test",fake.endpoint,scheduler=requestScheduler(workers=4,maxRetries=1))
+        try:
+            checkReports(list(account.challengeMany(targets,rules)))
+        finally:
+            account.close()
+        assert fake.requests["challengeUser"] == 5 #* alice, bob, closed once and busy twice (retried once after its Retry-After)
+
+def test_async_challengeMany_survives_failed_targets():
+    async def send(endpoint: str) -> list:
+        async with asyncLichessAccount("test",endpoint) as account:
+            return [report async for report in account.challengeMany(targets,rules)]
+    with fakeserver.fakeLichess(refuseChallenges={"closed": 400,"busy": 429},retryAfter=0.05) as fake:
+        checkReports(asyncio.run(send(fake.endpoint)))
@@ -0,0 +1,122 @@
+import random
+import threading
+import time
+
+import fakeserver
+from benchmark import randomHandler, unthrottled
+from main import botRuntime, lichessAccount
+
+#--------------------------------------------------------------#
+#botRuntime against a local fake lichess (see fakeserver.py)
+#Run with: python -m pytest tests
+#--------------------------------------------------------------#
+
+def trackedHandler(games: int) -> type:
+    """Makes a handler that records the games it plays and how many play at once, stopping the runtime after the given number of games
+    """
+    class tracked(randomHandler):
+        played, active, peak, lock = [], [0], [0], threading.Lock()
+        runtime = None
+        def play(self) -> None:
+            with self.lock:
+                self.active[0] += 1
+                self.peak[0] = max(self.peak[0],self.active[0])
+            try:
+                super().play()
+            finally:
+                with self.lock:
+                    self.active[0] -= 1
+                    self.played.append(self.gameid)
+                    if len(self.played) == games:
+                        self.runtime.stop()
+    return tracked
+
+def runFor(runtime: botRuntime, timeout: float) -> float:
+    """Runs a runtime on a thread, failing if it hasn't returned after timeout seconds
+
+    Returns:
+        float: How long it ran, in seconds
+    """
+    thread = threading.Thread(target=runtime.run,daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"botRuntime.run did not return within {timeout} s"
+    return time.perf_counter()-start
+
+def test_dispatch_plays_every_game_once():
+    handler = trackedHandler(12)
+    with fakeserver.fakeLichess(maxPlies=10,keepAlive=0.2) as fake:
+        account = lichessAccount("test",fake.endpoint,scheduler=unthrottled(8))
+        handler.runtime = botRuntime(account,handler,maxGames=4)
+        started = [fake.startGame(random.choice(["white","black"])).id for _ in range(12)]
+        runFor(handler.runtime,60)
+        account.close()
+        assert sorted(handler.played) == sorted(started)
+        assert all([fake.games[gameid].status != "started" for gameid in started])
+
+def test_maxGames_bounds_concurrent_games():
+    handler = trackedHandler(12)
+    with fakeserver.fakeLichess(maxPlies=10,keepAlive=0.2,opponentDelay=0.02) as fake:
+        account = lichessAccount("test",fake.endpoint,scheduler=unthrottled(8))
+        handler.runtime = botRuntime(account,handler,maxGames=3)
+        for _ in range(12):
+            fake.startGame("white")
+        runFor(handler.runtime,60)
+        account.close()
+    assert len(handler.played) == 12
+    assert handler.peak[0] == 3 #? every slot was used, and never more
+
+def test_challenges_declined_while_full():
+    handler = trackedHandler(1)
+    with fakeserver.fakeLichess(keepAlive=0.2,opponentDelay=60) as fake: #* the opponent doesn't move while the test runs
+        account = lichessAccount("test",fake.endpoint,scheduler=unthrottled(4))
+        handler.runtime = runtime = botRuntime(account,handler,maxGames=1)
+        fake.startGame("black",limit=None,days=3,gameid="busygame") #* fills the only slot
+        thread = threading.Thread(target=runtime.run,daemon=True)
+        thread.start()
+        deadline = time.monotonic()+10
+        while "busygame" not in runtime.games and time.monotonic() < deadline:
+            time.sleep(0.01)
+        fakeserver.remoteChallenge(fake.endpoint,limit=180)
+        while runtime.triage.counts["declined"] < 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        runtime.stop()
+        thread.join(10)
+        account.close()
+    assert runtime.triage.counts["declined"] == 1 and runtime.triage.counts["accepted"] == 0
+    assert not thread.is_alive()
+
+def test_stop_shuts_down_cleanly():
+    handler = trackedHandler(-1) #* never stops the runtime by itself
+    with fakeserver.fakeLichess(keepAlive=0.2,opponentDelay=60) as fake: #* every game is still waiting on the opponent when stop() is called
+        account = lichessAccount("test",fake.endpoint,scheduler=unthrottled(8))
+        handler.runtime = runtime = botRuntime(account,handler,maxGames=4)
+        for _ in range(4):
+            fake.startGame("black",limit=None,days=3)
+        thread = threading.Thread(target=runtime.run,daemon=True)
+        thread.start()
+        deadline = time.monotonic()+10
+        while len(runtime.games) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(runtime.games) == 4
+        start = time.perf_counter()
+        runtime.stop()
+        thread.join(10)
+        elapsed = time.perf_counter()-start
+        account.close()
+    assert not thread.is_alive() and elapsed < 5, "stop() did not end the runtime promptly"
+    assert runtime.games == {} and len(handler.played) == 4
+    assert not [thread for thread in threading.enumerate() if thread.name.startswith("lichess-game")]
+
+def test_throughput_floor(games: int=60, maxGames: int=16, floor: float=5):
+    handler = trackedHandler(games)
+    with fakeserver.spawn(maxPlies=20,keepAlive=0.2) as endpoint: #? in its own process, as in benchmark.benchRuntime
+        account = lichessAccount("test",endpoint,poolSize=maxGames+4,scheduler=unthrottled(maxGames+4))
+        handler.runtime = botRuntime(account,handler,maxGames=maxGames)
+        for _ in range(games):
+            fakeserver.remoteGame(endpoint,color=random.choice(["white","black"]),limit=180)
+        elapsed = runFor(handler.runtime,60)
+        account.close()
+    assert len(handler.played) == games
+    assert games/elapsed >= floor, f"{games/elapsed:.1f} games/s is under the {floor} games/s floor"
@@ -0,0 +1,121 @@
+import threading
+
+#--------------------------------------------------------------#
+#Turns a live clock into a per-move search budget
+#and keeps think-time / ponder statistics per time control
+#--------------------------------------------------------------#
+
+speeds = ["ultraBullet","bullet","blitz","rapid","classical","correspondence"]
+
+def speedOf(initTime: float, incrementTime: float, correspondence: bool=False) -> str:
+    """Gets the lichess time control category of a clock (estimated game length = initial time + 40 increments)
+
+    Args:
+        initTime (float): The initial time, in seconds
+        incrementTime (float): The increment, in seconds
+        correspondence (bool, optional): If the game is correspondence. Defaults to False.
+
+    Returns:
+        str: "ultraBullet", "bullet", "blitz", "rapid", "classical" or "correspondence"
+    """
+    if correspondence:
+        return "correspondence"
+    estimate = initTime+40*incrementTime
+    if estimate < 30:
+        return "ultraBullet"
+    elif estimate < 180:
+        return "bullet"
+    elif estimate < 480:
+        return "blitz"
+    elif estimate < 1500:
+        return "rapid"
+    return "classical"
+
+workerShares = {"ultraBullet": 0.0,"bullet": 0.0,"blitz": 0.25,"rapid": 0.5,"classical": 1.0,"correspondence": 1.0} #* the share of the cores one search gets (at least one)
+
+def workersFor(speed: str, cores: int, days: int|None=None) -> int:
+    """Gets how many processes to search a game's moves with: one for bullet, where starting helpers costs more than they find, up to every core for classical and correspondence
+
+    Args:
+        speed (str): The time control category (see speedOf)
+        cores (int): How many processes there are
+        days (int, optional): The days per move of a correspondence game. Under 3 days, several are likely to be played at once, so they get half the cores. Defaults to None.
+
+    Returns:
+        int: How many processes, counting the calling one
+    """
+    share = workerShares.get(speed,0.25)
+    if speed == "correspondence" and days is not None and days < 3:
+        share = 0.5
+    return max(1,min(cores,int(cores*share)))
+
+class timeManager:
+    def __init__(self, *, overhead: float=0.05, minThink: float=0.02, maxShare: float=0.2, correspondenceThink: float=30) -> None:
+        """Budgets search time from the clock, keeping a safety margin for the measured network latency
+
+        Args:
+            overhead (float, optional): Fixed time kept back for every move, in seconds. Defaults to 0.05.
+            minThink (float, optional): The shortest search, in seconds. Defaults to 0.02.
+            maxShare (float, optional): The largest share of the remaining time one move can use. Defaults to 0.2.
+            correspondenceThink (float, optional): How long to search in correspondence games, in seconds. Defaults to 30.
+        """
+        self.overhead = overhead
+        self.minThink = minThink
+        self.maxShare = maxShare
+        self.correspondenceThink = correspondenceThink
+        self.latency = 0.1 #* smoothed move round trip, in seconds
+        self.jitter = 0.05 #* smoothed deviation of the round trip
+        self._lock = threading.Lock()
+        self._stats = {speed: {"moves": 0,"thinkTime": 0.0,"ponders": 0,"ponderHits": 0} for speed in speeds}
+    def recordLatency(self, seconds: float) -> None:
+        """Adds a measured move round trip (sending a move until it is acknowledged)
+
+        Args:
+            seconds (float): The round trip
+        """
+        with self._lock:
+            self.jitter += (abs(seconds-self.latency)-self.jitter)/8
+            self.latency += (seconds-self.latency)/8
+    def margin(self) -> float:
+        """Gets the time kept back for every move: the overhead plus the expected latency and its jitter
+        """
+        return self.overhead+self.latency+2*self.jitter
+    def budget(self, remaining: float, increment: float=0, *, ply: int=0, speed: str="blitz") -> float:
+        """Gets how long to search for the next move
+
+        Args:
+            remaining (float): The bot's remaining clock, in seconds
+            increment (float, optional): The bot's increment, in seconds. Defaults to 0.
+            ply (int, optional): How many plies have been played. Defaults to 0.
+            speed (str, optional): The time control category (see speedOf). Defaults to "blitz".
+
+        Returns:
+            float: The search time, in seconds
+        """
+        if speed == "correspondence":
+            return max(self.minThink,min(self.correspondenceThink,remaining/10))
+        usable = remaining-self.margin()
+        if usable <= self.minThink:
+            return self.minThink
+        movesToGo = max(20,50-ply//2) #? expect the game to last a bit longer than it has
+        think = usable/movesToGo+increment*0.75
+        return max(self.minThink,min(think,usable*self.maxShare))
+    def recordMove(self, speed: str, thinkTime: float) -> None:
+        with self._lock:
+            self._stats[speed]["moves"] += 1
+            self._stats[speed]["thinkTime"] += thinkTime
+    def recordPonder(self, speed: str, hit: bool) -> None:
+        with self._lock:
+            self._stats[speed]["ponders"] += 1
+            self._stats[speed]["ponderHits"] += hit
+    def stats(self) -> dict:
+        """Gets the think time and ponder hits per time control
+
+        Returns:
+            dict: {speed: {"moves", "avgThink" (seconds), "ponders", "ponderHitRate"}} for every time control that has moves, plus "latency" and "margin" in seconds
+        """
+        with self._lock:
+            report = {speed: {"moves": stats["moves"],"avgThink": stats["thinkTime"]/stats["moves"],"ponders": stats["ponders"],"ponderHitRate": stats["ponderHits"]/stats["ponders"] if stats["ponders"] else 0.0} for speed, stats in self._stats.items() if stats["moves"]}
+            report["latency"] = self.latency
+            report["margin"] = self.overhead+self.latency+2*self.jitter
+        return report